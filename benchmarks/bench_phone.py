@@ -0,0 +1,141 @@
+"""Times connect, navigation and full reset flows against simulated phones.
+
+    python benchmarks/bench_phone.py --phones 20 --latency 0.02 --output bench.json
+    python benchmarks/bench_phone.py --baseline bench.json
+
+With --baseline, exits non-zero if any flow's median got slower than the
+baseline by more than --tolerance.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+# * simulated phones must never teach real phones' stores anything: plans,
+# * settle times, font sizes and inventory go to a throwaway user folder
+os.environ["CISCORESET_USER_DIR"] = USER_DIR = tempfile.mkdtemp(
+    prefix="ciscoreset-bench-"
+)
+atexit.register(shutil.rmtree, USER_DIR, ignore_errors=True)  # * runs after the saves
+
+from ciscoreset.phone import PhoneConnection
+from ciscoreset.simulator import SimulatedCUCM, SimulatedPhone, simulated_fleet
+from contextlib import redirect_stdout
+from statistics import median, quantiles
+from time import perf_counter
+from typing import Callable
+import concurrent.futures
+import argparse
+import json
+import io
+import sys
+
+
+FLOWS = ("connect", "navigate", "reset")
+
+
+def connect(sim: SimulatedPhone, ucm: SimulatedCUCM) -> PhoneConnection:
+    return PhoneConnection(
+        sim.ip,
+        "",
+        username="bench",
+        password="bench",
+        phone_port=sim.port,
+        ucm=ucm,
+    )
+
+
+def time_flow(sim: SimulatedPhone, ucm: SimulatedCUCM) -> dict:
+    timings = {}
+    start = perf_counter()
+    phone = connect(sim, ucm)
+    timings["connect"] = perf_counter() - start
+    with phone:
+        start = perf_counter()
+        phone._to_reset_settings_menu()
+        timings["navigate"] = perf_counter() - start
+
+        start = perf_counter()
+        phone.send_reset("network")
+        timings["reset"] = perf_counter() - start
+    return timings
+
+
+def summarize(samples: list[float]) -> dict:
+    p95 = quantiles(samples, n=20)[-1] if len(samples) > 1 else samples[0]
+    return {
+        "median": round(median(samples), 4),
+        "p95": round(p95, 4),
+        "max": round(max(samples), 4),
+    }
+
+
+def run_benchmark(phones: int, workers: int, **sim_options) -> dict:
+    sims = simulated_fleet(phones, **sim_options)
+    for sim in sims:
+        sim.start()
+    ucm = SimulatedCUCM(sims)
+
+    try:
+        start = perf_counter()
+        # * PhoneConnection narrates every step, keep that out of the report
+        with redirect_stdout(io.StringIO()), concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers
+        ) as ex:
+            results = list(ex.map(lambda s: time_flow(s, ucm), sims))
+        wall = perf_counter() - start
+    finally:
+        for sim in sims:
+            sim.stop()
+
+    report = {flow: summarize([r[flow] for r in results]) for flow in FLOWS}
+    report["wall"] = round(wall, 4)
+    report["requests_per_phone"] = sum(s.requests for s in sims) / phones
+    return report
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for flow in FLOWS:
+        old, new = baseline[flow]["median"], report[flow]["median"]
+        if new > old * (1 + tolerance):
+            regressions.append(f"{flow}: {old:.3f}s -> {new:.3f}s")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--phones", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--redraw", type=float, default=0.1)
+    parser.add_argument("--font", default="regular")
+    parser.add_argument("--output", default="", help="save the report as JSON")
+    parser.add_argument("--baseline", default="", help="JSON report to compare to")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        args.phones,
+        args.workers,
+        latency=args.latency,
+        redraw=args.redraw,
+        font=args.font,
+        reboot=1.0,
+    )
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(report, out, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
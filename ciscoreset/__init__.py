@@ -1,9 +1,11 @@
 import toml
 
-from .axl import CUCM
+from .axl import CUCM, get_cucm
 from .credentials import get_credentials
-from .keys import KEY_SUPPORT
+from .keys import KEY_SUPPORT, KEY_TABLES
 from .vision import get_menu_position, get_list_position
 from .xml import XMLPhone
 from .phone import PhoneConnection
+from .xml_async import AsyncXMLPhone
+from .phone_async import AsyncPhoneConnection
 from .configs import ROOT_DIR, TOOL_VERSION
@@ -0,0 +1,159 @@
+"""Shared bookkeeping of the devices associated to the admin user.
+
+Phones only take XML commands from a user they're associated to, so every
+PhoneConnection needs its phone in the user's associatedDevices while it's
+open. Connections ask an AssociationManager instead of rewriting the list
+themselves; it counts references per device and folds every add and remove
+made within a short window into a single updateUser.
+"""
+from collections import Counter
+from typing import Any, Tuple
+import threading
+import atexit
+
+
+FLUSH_WINDOW = 0.25  # seconds to gather adds/removes into one updateUser
+
+
+class AssociationManager:
+    def __init__(self, ucm: Any, userid: str, flush_window=FLUSH_WINDOW) -> None:
+        """
+        Args:
+            ucm (CUCM): Anything with get_user_devices/update_user_devices
+
+            flush_window (float, optional): Seconds to wait for more adds and
+            removes before writing. Defaults to 0.25.
+        """
+        self.ucm = ucm
+        self.userid = userid
+        self.flush_window = flush_window
+        self.writes = 0
+        self.__refs: Counter = Counter()
+        self.__owned: set[str] = set()  # added by us, so ours to remove
+        self.__ready: set[str] = set()  # known to be associated right now
+        self.__snapshots = 0  # flushes started
+        self.__generation = 0  # flushes finished
+        self.__error: Exception = None
+        self.__timer: threading.Timer = None
+        self.__cond = threading.Condition()
+        self.__flush_lock = threading.Lock()
+
+    def acquire(self, device: str) -> None:
+        """Blocks until `device` is associated to the user.
+
+        Raises:
+            Exception: The user's devices couldn't be updated
+        """
+        with self.__cond:
+            self.__refs[device] += 1
+            while device not in self.__ready:
+                self.__wait_for_flush()
+                if self.__error is not None and device not in self.__ready:
+                    self.__refs[device] -= 1
+                    if not self.__refs[device]:
+                        del self.__refs[device]
+                    raise self.__error
+
+    def release(self, device: str, wait=True) -> None:
+        """Drops a reference; the device is unassociated in the next flush
+        once nothing holds it, unless it was associated before we came along.
+
+        Args:
+            wait (bool, optional): Block until that flush is done. Defaults to True.
+
+        Raises:
+            Exception: The user's devices couldn't be updated (only when waiting);
+            the device stays owned, so a later flush or close removes it
+        """
+        with self.__cond:
+            if self.__refs[device] <= 0:
+                return
+            self.__refs[device] -= 1
+            if self.__refs[device]:
+                return
+            del self.__refs[device]
+            if not wait:
+                self.__schedule()
+                return
+            self.__wait_for_flush()
+            if self.__error is not None and device in self.__owned:
+                raise self.__error
+
+    def __schedule(self) -> None:
+        if self.__timer is None:
+            self.__timer = threading.Timer(self.flush_window, self.flush)
+            self.__timer.daemon = True
+            self.__timer.start()
+
+    def __wait_for_flush(self) -> None:
+        """Waits (holding __cond) for a flush that sees the current state."""
+        target = self.__snapshots + 1
+        self.__schedule()
+        while self.__generation < target:
+            self.__cond.wait()
+
+    def flush(self) -> None:
+        """Writes every pending add and remove in one updateUser."""
+        with self.__flush_lock:
+            with self.__cond:
+                self.__timer = None
+                self.__snapshots += 1
+                snapshot = self.__snapshots
+                wanted = set(self.__refs)
+
+            error: Exception = None
+            try:
+                current: list[str] = list(self.ucm.get_user_devices(self.userid) or [])
+                # * only undo what we added; others' associations are left alone
+                released = (self.__owned - wanted) & set(current)
+                added = [d for d in sorted(wanted) if d not in current]
+                devices = [d for d in current if d not in released] + added
+                if devices != current:
+                    self.ucm.update_user_devices(self.userid, devices)
+                    self.writes += 1
+            except Exception as e:
+                error = e
+
+            with self.__cond:
+                if error is None:
+                    self.__owned = (self.__owned - released) | set(added)
+                    self.__ready = wanted
+                self.__error = error
+                self.__generation = snapshot
+                self.__cond.notify_all()
+
+    def close(self) -> None:
+        """Puts the user's devices back as we found them, whatever is still
+        held."""
+        with self.__cond:
+            pending = self.__timer is not None
+            if pending:
+                self.__timer.cancel()
+                self.__timer = None
+            self.__refs.clear()
+        if pending or self.__owned:
+            self.flush()
+
+
+_managers: dict[Tuple[int, str], AssociationManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_association_manager(ucm: Any, userid: str) -> AssociationManager:
+    """The one manager for a user on a CUCM client."""
+    key = (id(ucm), userid.lower())
+    with _managers_lock:
+        if key not in _managers:
+            _managers[key] = AssociationManager(ucm, userid)
+        return _managers[key]
+
+
+@atexit.register
+def restore_associations() -> None:
+    with _managers_lock:
+        managers = list(_managers.values())
+    for manager in managers:
+        try:
+            manager.close()
+        except Exception:
+            pass  # * nothing left to report it to at exit
@@ -1,8 +1,28 @@
 from cucm import Axl
 from cucm.axl.configs import turn_off_serializer
+from ciscoreset.axl_scheduler import AXLScheduler, ScheduledClient
 from zeep.exceptions import Fault
+from collections import namedtuple
+from time import monotonic
+import threading
 import re
-from typing import Any, Tuple
+from typing import Any, Iterator, Tuple
+
+
+PhoneRecord = namedtuple("PhoneRecord", ["name", "model", "description", "lines"])
+Change = namedtuple("Change", ["type", "uuid", "action"])
+PhoneSummary = namedtuple(
+    "PhoneSummary", ["name", "model", "description", "device_pool"]
+)
+
+PHONE_RECORD_TTL = 300.0  # seconds
+# * only what the phone accessors need, instead of the whole phone object
+PHONE_RECORD_TAGS = {
+    "name": "",
+    "model": "",
+    "description": "",
+    "lines": {"line": {"index": "", "dirn": {"pattern": "", "routePartitionName": ""}}},
+}
 
 
 def check_output(query) -> Any:
@@ -12,10 +32,157 @@ def check_output(query) -> Any:
         return None
 
 
+LIST_PAGE_SIZE = 1000
+LIST_PHONE_TAGS = {"name": "", "model": "", "description": "", "devicePoolName": ""}
+
+LINE_GROUP_MEMBERS_SQL = """
+select lg.name as linegroup, n.dnorpattern as pattern, rp.name as partition
+from linegroup as lg
+left outer join linegroupnumplanmap as lgm on lgm.fklinegroup = lg.pkid
+left outer join numplan as n on n.pkid = lgm.fknumplan
+left outer join routepartition as rp on rp.pkid = n.fkroutepartition
+order by lg.name, lgm.lineselectionorder
+"""
+
+# partitions a DN is looked for in, in order of preference
+DN_PARTITIONS = ("Phones-PT", "ALLiphones", "Staging-PT")
+DN_INDEX_TTL = 600.0  # seconds
+DN_INDEX_SQL = """
+select n.dnorpattern as pattern, rp.name as partition, d.name as device
+from numplan as n
+inner join routepartition as rp on rp.pkid = n.fkroutepartition
+left outer join devicenumplanmap as dnm on dnm.fknumplan = n.pkid
+left outer join device as d on d.pkid = dnm.fkdevice
+where rp.name in ({partitions})
+order by n.dnorpattern, d.name
+"""
+DN_LOOKUP_SQL = """
+select n.dnorpattern as pattern, rp.name as partition, d.name as device
+from numplan as n
+inner join routepartition as rp on rp.pkid = n.fkroutepartition
+left outer join devicenumplanmap as dnm on dnm.fknumplan = n.pkid
+left outer join device as d on d.pkid = dnm.fkdevice
+where n.dnorpattern = {dn} and rp.name in ({partitions})
+order by d.name
+"""
+LIST_LINE_TAGS = {"pattern": "", "routePartitionName": "", "associatedDevices": ""}
+
+
+def sql_list(values: list[str]) -> str:
+    return ", ".join("'" + v.replace("'", "''") + "'" for v in values)
+
+
+class DNIndex:
+    """Which partitions each DN is in, and the devices on it there."""
+
+    def __init__(self, partitions: Tuple[str, ...]) -> None:
+        self.partitions = tuple(partitions)
+        self.__lines: dict[str, dict[str, list[str]]] = {}
+
+    def add(self, pattern: str, partition: str, device="") -> None:
+        devices = self.__lines.setdefault(pattern, {}).setdefault(partition, [])
+        if device and device not in devices:
+            devices.append(device)
+
+    def __contains__(self, dn: str) -> bool:
+        return dn in self.__lines
+
+    def __len__(self) -> int:
+        return len(self.__lines)
+
+    def covers(self, partition: str) -> bool:
+        return partition in self.partitions
+
+    def partitions_of(self, dn: str) -> list[str]:
+        """Partitions `dn` is in, most preferred first."""
+        found = self.__lines.get(dn, {})
+        return [p for p in self.partitions if p in found]
+
+    def devices(self, dn: str, partition: str) -> list[str]:
+        return list(self.__lines.get(dn, {}).get(partition, []))
+
+    def patterns(self) -> list[str]:
+        return list(self.__lines)
+
+
+def ref_name(ref) -> str:
+    """Name out of a reference tag (routePartitionName, devicePoolName...)"""
+    return ref["_value_1"] if ref is not None else ""
+
+
+def to_phone_record(phone: dict) -> PhoneRecord:
+    lines = phone["lines"]["line"] if phone["lines"] is not None else []
+    lines = sorted(lines or [], key=lambda l: int(l["index"] or 0))
+    return PhoneRecord(
+        phone["name"],
+        phone["model"].split(" ")[-1],
+        phone["description"] or "",
+        [
+            (l["dirn"]["pattern"], ref_name(l["dirn"]["routePartitionName"]))
+            for l in lines
+        ],
+    )
+
+
 class CUCM(Axl):
-    def __init__(self, username: str, password: str, cucm_address: str, port="8443"):
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        cucm_address: str,
+        port="8443",
+        record_ttl=PHONE_RECORD_TTL,
+        dn_partitions: Tuple[str, ...] = DN_PARTITIONS,
+        scheduler: AXLScheduler = None,
+    ):
         turn_off_serializer()
         super().__init__(username, password, cucm_address, port=port)
+        # * every AXL call, ours or cucm-py's, is paced by the scheduler
+        self.scheduler = scheduler if scheduler is not None else AXLScheduler()
+        self.client = ScheduledClient(self.client, self.scheduler)
+        self.record_ttl = record_ttl
+        self.__records: dict[str, tuple[float, PhoneRecord]] = {}
+        self.__records_lock = threading.Lock()
+        self.dn_partitions = tuple(dn_partitions)
+        self.__dn_index: DNIndex = None
+        self.__dn_index_time = 0.0
+        self.__dn_lookups: dict[str, tuple[float, DNIndex]] = {}
+        self.__dn_index_lock = threading.Lock()
+
+    def get_phone_record(self, name: str, refresh=False) -> PhoneRecord:
+        """Model, description and lines of a phone, fetched with one trimmed
+        getPhone and reused for `record_ttl` seconds.
+
+        Args:
+            refresh (bool, optional): Skip the cache. Defaults to False.
+
+        Raises:
+            Exception: No phone found with that name
+        """
+        with self.__records_lock:
+            entry = self.__records.get(name, None)
+        if not refresh and entry and monotonic() - entry[0] < self.record_ttl:
+            return entry[1]
+
+        try:
+            phone: dict = self.client.getPhone(
+                name=name, returnedTags=PHONE_RECORD_TAGS
+            )["return"]["phone"]
+        except Fault:
+            raise Exception(f"No phone found with name {name}")
+
+        record = to_phone_record(phone)
+        with self.__records_lock:
+            self.__records[name] = (monotonic(), record)
+        return record
+
+    def invalidate_phone_record(self, name="") -> None:
+        """Forgets the cached record of one phone, or of every phone."""
+        with self.__records_lock:
+            if name:
+                self.__records.pop(name, None)
+            else:
+                self.__records.clear()
 
     def get_user_devices(self, userid: str) -> list:
         dev_list = self.get_user(userid).associatedDevices.device
@@ -23,16 +190,117 @@ class CUCM(Axl):
             raise Exception(f"Could not get user devices from user {userid}")
         return dev_list
 
-    def get_dn_devices(self, dn: str, partition="Phones-PT") -> list[str]:
+    def get_dn_index(self, refresh=False) -> DNIndex:
+        """Every DN in `dn_partitions` with its devices, loaded in bulk and
+        reused for DN_INDEX_TTL seconds.
+
+        The load runs without holding the lock, so single DN lookups made
+        meanwhile aren't held up behind it.
+        """
+        with self.__dn_index_lock:
+            fresh = monotonic() - self.__dn_index_time < DN_INDEX_TTL
+            if not refresh and self.__dn_index is not None and fresh:
+                return self.__dn_index
+        index = self.__load_dn_index()
+        with self.__dn_index_lock:
+            self.__dn_index = index
+            self.__dn_index_time = monotonic()
+            self.__dn_lookups.clear()
+        return index
+
+    def __dn_lines(self, dn: str) -> DNIndex:
+        """The DN index if it's loaded, otherwise `dn` looked up on its own."""
+        with self.__dn_index_lock:
+            now = monotonic()
+            if (
+                self.__dn_index is not None
+                and now - self.__dn_index_time < DN_INDEX_TTL
+            ):
+                return self.__dn_index
+            entry = self.__dn_lookups.get(dn, None)
+        if entry is not None and now - entry[0] < DN_INDEX_TTL:
+            return entry[1]
+
+        index = self.__lookup_dn(dn)
+        with self.__dn_index_lock:
+            self.__dn_lookups[dn] = (monotonic(), index)
+        return index
+
+    def __lookup_dn(self, dn: str) -> DNIndex:
+        index = DNIndex(self.dn_partitions)
+        try:
+            sql = DN_LOOKUP_SQL.format(
+                dn=sql_list([dn]), partitions=sql_list(self.dn_partitions)
+            )
+            for row in self.execute_sql(sql):
+                index.add(row["pattern"], row["partition"], row["device"])
+            return index
+        except Fault:
+            pass  # * no SQL rights, a getLine per partition instead
+
+        for partition in self.dn_partitions:
+            if (devices := self.__line_devices(dn, partition)) is not None:
+                for device in devices or [""]:
+                    index.add(dn, partition, device)
+        return index
+
+    def __line_devices(self, dn: str, partition: str) -> list[str]:
+        """Devices on one line, None if there's no such line."""
         dn_info = check_output(
             self.get_directory_number(pattern=dn, routePartitionName=partition)
         )
         if dn_info is None:
-            return []
+            return None
         elif (devices := dn_info["return"]["line"]["associatedDevices"]) is None:
             return []
         else:
-            return devices["device"]
+            return list(devices["device"] or [])
+
+    def __load_dn_index(self) -> DNIndex:
+        index = DNIndex(self.dn_partitions)
+        try:
+            sql = DN_INDEX_SQL.format(partitions=sql_list(self.dn_partitions))
+            for row in self.execute_sql(sql):
+                index.add(row["pattern"], row["partition"], row["device"])
+            return index
+        except Fault:
+            pass  # * no SQL rights, page through listLine instead
+
+        index = DNIndex(self.dn_partitions)
+        for partition in self.dn_partitions:
+            skip = 0
+            while True:
+                result = self.client.listLine(
+                    searchCriteria={"pattern": "%", "routePartitionName": partition},
+                    returnedTags=LIST_LINE_TAGS,
+                    first=LIST_PAGE_SIZE,
+                    skip=skip,
+                )["return"]
+                lines: list[dict] = (result["line"] if result is not None else []) or []
+                for line in lines:
+                    devices = line["associatedDevices"]
+                    for device in (devices["device"] if devices else None) or [""]:
+                        index.add(line["pattern"], partition, device)
+                if len(lines) < LIST_PAGE_SIZE:
+                    break
+                skip += LIST_PAGE_SIZE
+        return index
+
+    def get_dn_devices(self, dn: str, partition: str = None) -> list[str]:
+        """Devices on `dn` in `partition`.
+
+        Args:
+            partition (str, optional): "" is the null partition. Without one,
+            the first of `dn_partitions` the DN is found in.
+        """
+        if partition is None:
+            index = self.__dn_lines(dn)
+            partitions = index.partitions_of(dn)
+            return index.devices(dn, partitions[0]) if partitions else []
+        elif partition in self.dn_partitions:
+            return self.__dn_lines(dn).devices(dn, partition)
+        # * not an indexed partition, look the line up on its own
+        return self.__line_devices(dn, partition) or []
 
     def get_user_ipcc(self, userid: str) -> str:
         result = check_output(self.get_user(userid))
@@ -52,11 +320,9 @@ class CUCM(Axl):
             )
 
     def get_dn_partition(self, dn: str) -> str:
-        for partition in ["Phones-PT", "ALLiphones", "Staging-PT"]:
-            result = self.get_directory_number(pattern=dn, routePartitionName=partition)
-            if not issubclass(type(result), Fault):
-                return partition
-        return ""
+        if not (partitions := self.__dn_lines(dn).partitions_of(dn)):
+            return ""
+        return partitions[0]
 
     def does_dn_exist(self, dn: str) -> bool:
         if not self.get_dn_partition(dn):
@@ -75,25 +341,75 @@ class CUCM(Axl):
             return True
 
     def get_phone_description(self, name: str) -> str:
-        if (phone := check_output(self.get_phone(name=name))) is None:
-            raise Exception(f"No phone found with name {name}")
-        return phone["description"]
+        return self.get_phone_record(name).description
 
     def get_phone_main_line(self, name: str) -> str:
-        if (phone := check_output(self.get_phone(name=name))) is None:
-            raise Exception(f"No phone found with name {name}")
-        if not phone["lines"]["line"]:
+        if not (lines := self.get_phone_record(name).lines):
             return ""
         else:
-            return phone["lines"]["line"][0]["dirn"]["pattern"]
+            return lines[0][0]
 
     def get_phone_model(self, name: str) -> str:
         if not name.startswith("SEP"):
             raise Exception(f"Sorry, this method only works on desk phones ({name=})")
-        if (phone := check_output(self.get_phone(name=name))) is None:
-            raise Exception(f"No phone found with name {name}")
-        model_name: str = phone["model"]
-        return model_name.split(" ")[-1]
+        return self.get_phone_record(name).model
+
+    def iter_phones(
+        self,
+        name="%",
+        description="",
+        device_pool="",
+        model="",
+        page_size=LIST_PAGE_SIZE,
+    ) -> Iterator[PhoneSummary]:
+        """Pages through listPhone, yielding phones as they arrive.
+
+        Args:
+            name (str, optional): Device name pattern, "%" as the wildcard.
+            Defaults to "%".
+
+            description (str, optional): Description pattern. Defaults to "".
+
+            device_pool (str, optional): Device pool name. Defaults to "".
+
+            model (str, optional): Only phones of this model ("8841"). AXL
+            can't search on model, so this is checked as results come in.
+
+            page_size (int, optional): Phones per listPhone call. Defaults to 1000.
+        """
+        criteria = {"name": name}
+        if description:
+            criteria["description"] = description
+        if device_pool:
+            criteria["devicePoolName"] = device_pool
+
+        skip = 0
+        while True:
+            result = self.client.listPhone(
+                searchCriteria=criteria,
+                returnedTags=LIST_PHONE_TAGS,
+                first=page_size,
+                skip=skip,
+            )["return"]
+            phones: list[dict] = (result["phone"] if result is not None else []) or []
+
+            for phone in phones:
+                summary = PhoneSummary(
+                    phone["name"],
+                    phone["model"].split(" ")[-1],
+                    phone["description"] or "",
+                    ref_name(phone["devicePoolName"]),
+                )
+                if not model or summary.model.upper() == model.upper():
+                    yield summary
+
+            if len(phones) < page_size:
+                return
+            skip += page_size
+
+    def list_phones(self, **criteria) -> list[PhoneSummary]:
+        """Every phone matching `criteria` (see `iter_phones`)."""
+        return list(self.iter_phones(**criteria))
 
     def get_line_group_members(self, name: str) -> list[Tuple[str, str]]:
         line_group: dict = self.client.getLineGroup(name=name)["return"]["lineGroup"]
@@ -106,12 +422,65 @@ class CUCM(Axl):
         return [
             (
                 d["directoryNumber"]["pattern"],
-                d["directoryNumber"]["routePartitionName"]["_value_1"],
+                ref_name(d["directoryNumber"]["routePartitionName"]),
             )
             for d in members
         ]
 
-    def get_all_line_group_members(self) -> dict:
+    def list_changes(
+        self, cursor: Tuple[str, str] = None, objects=("Phone", "Line")
+    ) -> Tuple[Tuple[str, str], list[Change]]:
+        """Configuration changes since `cursor`, from the AXL change
+        notification queue (CUCM 12.5+).
+
+        Args:
+            cursor (Tuple[str, str], optional): (queue ID, change ID) returned
+            by the previous call. Without one, only a cursor is fetched.
+
+        Raises:
+            Fault: The cursor is too old or from another queue, or the
+            server has no change queue; a full reload is needed
+
+        Returns:
+            Tuple[Tuple[str, str], list[Change]]: The cursor to pass next time
+            and the changes, with UUIDs lower-cased and without braces
+        """
+        if cursor is None:
+            result = self.client.listChange()
+        else:
+            result = self.client.listChange(
+                startChangeId={"queueId": cursor[0], "_value_1": cursor[1]},
+                objectList={"object": list(objects)},
+            )
+        queue = result["queueInfo"]
+        next_cursor = (queue["queueId"], str(queue["nextStartChangeId"]))
+        if cursor is None or result["changes"] is None:
+            return next_cursor, []
+        return next_cursor, [
+            Change(c["type"], c["uuid"].strip("{}").lower(), c["action"])
+            for c in result["changes"]["change"] or []
+        ]
+
+    def execute_sql(self, sql: str) -> list[dict]:
+        """Runs a read-only SQL query, returning each row as {column: value}."""
+        result = self.client.executeSQLQuery(sql=sql)["return"]
+        rows = (result["row"] if result is not None else []) or []
+        return [{col.tag: col.text or "" for col in row} for row in rows]
+
+    def get_all_line_group_members(self, use_sql=True) -> dict:
+        """Every line group's members as {name: [(pattern, partition), ...]}.
+
+        Args:
+            use_sql (bool, optional): Pull everything in one SQL query, falling
+            back to a getLineGroup per group if the query is refused.
+            Defaults to True.
+        """
+        if use_sql:
+            try:
+                return self.get_all_line_group_members_sql()
+            except Fault:
+                pass
+
         line_groups: list[dict] = self.client.listLineGroup(
             searchCriteria={"name": "%"}, returnedTags={"name": ""}
         )["return"]["lineGroup"]
@@ -119,3 +488,44 @@ class CUCM(Axl):
         return {
             lg["name"]: self.get_line_group_members(lg["name"]) for lg in line_groups
         }
+
+    def get_all_line_group_members_sql(self) -> dict:
+        line_groups: dict[str, list[Tuple[str, str]]] = {}
+        for row in self.execute_sql(LINE_GROUP_MEMBERS_SQL):
+            members = line_groups.setdefault(row["linegroup"], [])
+            if row["pattern"]:  # * empty groups still get a row from the join
+                members.append((row["pattern"], row["partition"]))
+        return line_groups
+
+
+_clients: dict[Tuple[str, str, str], Tuple[str, CUCM]] = {}
+_client_locks: dict[Tuple[str, str, str], threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+
+def get_cucm(username: str, password: str, cucm_address: str, port="8443") -> CUCM:
+    """Shared CUCM client for a (cluster, port, user), built the first time
+    it's asked for and reused by every connection after that.
+
+    Building a client parses the whole AXL schema, so this is what keeps
+    per-phone connects and GUI reconnects quick. Safe to call from any thread;
+    concurrent callers for the same cluster wait on a single build.
+    """
+    key = (cucm_address.lower(), str(port), username.lower())
+    with _registry_lock:
+        lock = _client_locks.setdefault(key, threading.Lock())
+    with lock:
+        if (entry := _clients.get(key, None)) is not None and entry[0] == password:
+            return entry[1]
+        ucm = CUCM(username, password, cucm_address, port=port)
+        _clients[key] = (password, ucm)
+        return ucm
+
+
+def forget_cucm(cucm_address="", port="8443", username="") -> None:
+    """Drops a shared client (or all of them) so the next `get_cucm` rebuilds it."""
+    with _registry_lock:
+        if cucm_address:
+            _clients.pop((cucm_address.lower(), str(port), username.lower()), None)
+        else:
+            _clients.clear()
@@ -0,0 +1,201 @@
+"""Paces AXL requests so CUCM is worked as hard as it will tolerate.
+
+Every call goes through a token bucket (requests per second) and an AIMD
+concurrency limit (requests in flight), with separate budgets for reads and
+writes. A throttled call halves that budget's concurrency and is retried after
+a backoff; every success grows it back by a fraction of a slot.
+"""
+from zeep.exceptions import Fault, TransportError
+from time import monotonic, sleep
+from typing import Any, Callable
+import threading
+import random
+
+
+READ_PREFIXES = ("get", "list", "executeSQLQuery")
+THROTTLE_STATUS = (429, 503)
+THROTTLE_MESSAGES = ("throttl", "maximum axl", "try again")
+
+READ_RATE = 15.0  # requests per second
+WRITE_RATE = 5.0
+READ_CONCURRENCY = (4, 1, 16)  # start, min, max
+WRITE_CONCURRENCY = (2, 1, 8)
+THROTTLE_RETRIES = 4
+THROTTLE_BACKOFF = 1.0  # seconds, doubled every retry
+
+
+def is_read(operation: str) -> bool:
+    return operation.startswith(READ_PREFIXES)
+
+
+def is_throttle(e: Exception) -> bool:
+    if isinstance(e, TransportError):
+        return e.status_code in THROTTLE_STATUS
+    if isinstance(e, Fault):
+        message = str(e.message or "").lower()
+        return any(m in message for m in THROTTLE_MESSAGES)
+    return False
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float = None) -> None:
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self.__tokens = self.burst
+        self.__updated = monotonic()
+        self.__lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blocks until a token is free, then takes it."""
+        while True:
+            with self.__lock:
+                now = monotonic()
+                self.__tokens = min(
+                    self.burst, self.__tokens + (now - self.__updated) * self.rate
+                )
+                self.__updated = now
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return
+                wait = (1 - self.__tokens) / self.rate
+            sleep(wait)
+
+
+class AIMDLimiter:
+    """Concurrency limit that grows additively on success and halves when
+    the server pushes back."""
+
+    def __init__(self, initial: int, minimum: int, maximum: int) -> None:
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(initial)
+        self.in_flight = 0
+        self.waiting = 0
+        self.__cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self.__cond:
+            self.waiting += 1
+            while self.in_flight >= int(self.limit):
+                self.__cond.wait()
+            self.waiting -= 1
+            self.in_flight += 1
+
+    def release(self, throttled=False) -> None:
+        with self.__cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.__cond.notify_all()
+
+
+class Budget:
+    def __init__(self, rate: float, concurrency: tuple[int, int, int]) -> None:
+        self.bucket = TokenBucket(rate)
+        self.limiter = AIMDLimiter(*concurrency)
+        self.completed = 0
+        self.throttled = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    def metrics(self) -> dict:
+        return {
+            "queued": self.limiter.waiting,
+            "in_flight": self.limiter.in_flight,
+            "concurrency": round(self.limiter.limit, 2),
+            "completed": self.completed,
+            "throttled": self.throttled,
+            "failed": self.failed,
+            "busy_seconds": round(self.busy_seconds, 3),
+        }
+
+
+class AXLScheduler:
+    def __init__(
+        self,
+        read_rate=READ_RATE,
+        write_rate=WRITE_RATE,
+        read_concurrency=READ_CONCURRENCY,
+        write_concurrency=WRITE_CONCURRENCY,
+        retries=THROTTLE_RETRIES,
+        backoff=THROTTLE_BACKOFF,
+    ) -> None:
+        """Central pacing for all AXL calls made against one CUCM cluster.
+
+        Args:
+            read_rate (float, optional): get/list/SQL query calls per second.
+            Defaults to 15.
+
+            write_rate (float, optional): Every other call, per second.
+            Defaults to 5.
+
+            read_concurrency (tuple[int, int, int], optional): Starting, lowest
+            and highest number of reads in flight. Defaults to (4, 1, 16).
+
+            write_concurrency (tuple[int, int, int], optional): Same, for
+            writes. Defaults to (2, 1, 8).
+
+            retries (int, optional): Times a throttled call is retried before
+            its error is raised. Defaults to 4.
+        """
+        self.budgets = {
+            "read": Budget(read_rate, read_concurrency),
+            "write": Budget(write_rate, write_concurrency),
+        }
+        self.retries = retries
+        self.backoff = backoff
+        self.__lock = threading.Lock()
+
+    def call(self, operation: str, func: Callable, *args, **kwargs) -> Any:
+        budget = self.budgets["read" if is_read(operation) else "write"]
+        attempt = 0
+        while True:
+            budget.limiter.acquire()
+            budget.bucket.acquire()
+            start = monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                throttled = is_throttle(e)
+                budget.limiter.release(throttled=throttled)
+                with self.__lock:
+                    budget.busy_seconds += monotonic() - start
+                    if throttled:
+                        budget.throttled += 1
+                    else:
+                        budget.failed += 1
+                if not throttled or attempt >= self.retries:
+                    raise
+                sleep(self.backoff * 2 ** attempt + random.uniform(0, self.backoff))
+                attempt += 1
+            else:
+                budget.limiter.release()
+                with self.__lock:
+                    budget.busy_seconds += monotonic() - start
+                    budget.completed += 1
+                return result
+
+    def metrics(self) -> dict:
+        """Queue depth, in-flight calls, current concurrency and counters
+        for the "read" and "write" budgets."""
+        with self.__lock:
+            return {name: b.metrics() for name, b in self.budgets.items()}
+
+
+class ScheduledClient:
+    """Stands in for a zeep service, sending every operation through the
+    scheduler."""
+
+    def __init__(self, service, scheduler: AXLScheduler) -> None:
+        self.service = service
+        self.scheduler = scheduler
+
+    def __getattr__(self, operation: str) -> Callable:
+        func = getattr(self.service, operation)
+
+        def scheduled(*args, **kwargs):
+            return self.scheduler.call(operation, func, *args, **kwargs)
+
+        return scheduled
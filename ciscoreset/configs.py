@@ -1,7 +1,10 @@
 from pathlib import Path
 import toml
+import os
 
 ROOT_DIR: Path = Path(__file__).parent
+# * where credentials and learned data live, CISCORESET_USER_DIR moves it
+USER_DIR: Path = Path(os.environ.get("CISCORESET_USER_DIR", ROOT_DIR / "user"))
 TOOL_VERSION: str = toml.load(str(ROOT_DIR.parent / "pyproject.toml"))["tool"][
     "poetry"
 ]["version"]
@@ -1,4 +1,4 @@
-from ciscoreset.configs import ROOT_DIR, USERNAME_MAGIC_KEY, TOOL_VERSION
+from ciscoreset.configs import ROOT_DIR, USER_DIR, USERNAME_MAGIC_KEY, TOOL_VERSION
 from requests.adapters import ConnectTimeout, ConnectionError
 from stdiomask import getpass
 from cryptography.fernet import Fernet, InvalidToken
@@ -13,7 +13,7 @@ import keyring.errors
 
 
 KEY_LOC = ROOT_DIR.parent / ".ciscoreset_passkey"
-CREDS = ROOT_DIR / "user" / "pass.log"
+CREDS = USER_DIR / "pass.log"
 
 
 def get_credentials(enable_manual_entry=True, quiet=True) -> Tuple[str, str]:
@@ -0,0 +1,359 @@
+from ciscoreset.axl import CUCM, get_cucm
+from ciscoreset.credentials import get_credentials
+from ciscoreset.phone import PhoneConnection, RESET_COMMANDS, REBOOT_RESETS
+from ciscoreset.inventory import get_inventory
+from ciscoreset.reachability import MONITOR, ReachabilityEvent, UP_TIMEOUT
+from ciscoreset.targets import TargetSelector
+from ciscoreset.xml import r_ip
+from ciscoreset.exceptions import *
+from collections import deque, namedtuple
+from pathlib import Path
+from time import monotonic, sleep
+from typing import Callable, Iterable
+from concurrent.futures import Future
+import concurrent.futures
+import threading
+import argparse
+import random
+import json
+import csv
+
+
+FleetTarget = namedtuple("FleetTarget", ["ip", "name"])
+FleetResult = namedtuple(
+    "FleetResult",
+    ["ip", "name", "model", "status", "attempts", "error", "seconds"],
+)
+
+# these won't get better by trying again
+NO_RETRY_EXCEPTIONS = (UnsupportedDeviceError, ResetException)
+
+
+def load_targets(path: str) -> list[FleetTarget]:
+    """Reads phones to reset from a JSON or CSV file.
+
+    JSON files hold a list of IPs/device names, or of objects with "ip" and/or
+    "name" keys. CSV files either have an "ip" and/or "name" header, or no
+    header and one IP/device name per row.
+    """
+    p = Path(path)
+    if p.suffix.lower() == ".json":
+        entries = json.loads(p.read_text())
+    else:
+        with p.open(newline="") as csv_file:
+            rows = [r for r in csv.reader(csv_file) if any(c.strip() for c in r)]
+        header = [h.strip().lower() for h in rows[0]] if rows else []
+        if "ip" in header or "name" in header:
+            entries = [dict(zip(header, [c.strip() for c in r])) for r in rows[1:]]
+        else:
+            entries = [r[0].strip() for r in rows]
+
+    targets: list[FleetTarget] = []
+    for entry in entries:
+        if isinstance(entry, dict):
+            targets.append(FleetTarget(entry.get("ip", ""), entry.get("name", "")))
+        elif r_ip.match(entry):
+            targets.append(FleetTarget(entry, ""))
+        else:
+            targets.append(FleetTarget("", entry))
+    return targets
+
+
+def select_targets(ucm: CUCM, expression: str) -> list[FleetTarget]:
+    """Targets for every device matched by a target expression (see `targets`)."""
+    return [FleetTarget("", name) for name in TargetSelector(ucm).select(expression)]
+
+
+def subnet_of(ip: str) -> str:
+    return ip.rsplit(".", 1)[0] + ".0/24"
+
+
+class FleetReset:
+    def __init__(
+        self,
+        cucm_url: str,
+        username: str,
+        password: str,
+        port="8443",
+        workers=8,
+        per_subnet=4,
+        retries=2,
+        backoff=5.0,
+        resolver: Callable[[str], str] = None,
+        dry_run=False,
+        wait_for_reboot=False,
+        reboot_timeout=UP_TIMEOUT,
+        phone_port=80,
+        ucm: CUCM = None,
+    ) -> None:
+        """Runs the same reset across many phones.
+
+        Args:
+            workers (int, optional): Phones worked on at once. Defaults to 8.
+
+            per_subnet (int, optional): Phones worked on at once in a single /24,
+            so one access switch isn't flooded. Defaults to 4.
+
+            retries (int, optional): Extra attempts per phone. Defaults to 2.
+
+            backoff (float, optional): Seconds before the first retry, doubled
+            for every retry after. Defaults to 5.0.
+
+            resolver (Callable[[str], str], optional): Turns a device name into
+            an IP address ("" if unknown). Targets without an IP fail without one.
+
+            wait_for_reboot (bool, optional): For resets that reboot the phone,
+            only count it done once it's back on the network, failing it if not
+            back within `reboot_timeout` seconds. Defaults to False.
+
+            ucm (CUCM, optional): AXL client shared by every phone, instead of
+            one per phone from `cucm_url`.
+        """
+        self.cucm_url = cucm_url
+        self.username = username
+        self.password = password
+        self.port = port
+        self.workers = workers
+        self.per_subnet = per_subnet
+        self.retries = retries
+        self.backoff = backoff
+        self.resolver = resolver
+        self.dry_run = dry_run
+        self.wait_for_reboot = wait_for_reboot
+        self.reboot_timeout = reboot_timeout
+        self.phone_port = phone_port
+        self.ucm = ucm
+
+    def resolve(self, target: FleetTarget) -> FleetTarget:
+        """Fills in the IP of a target given by device name, when known."""
+        if not target.ip and target.name and self.resolver is not None:
+            return target._replace(ip=self.resolver(target.name))
+        return target
+
+    def unresolved(self, targets: Iterable[FleetTarget]) -> list[FleetTarget]:
+        """Targets whose IP isn't given or known, which can only fail."""
+        return [t for t in targets if not self.resolve(t).ip]
+
+    def reset_one(self, target: FleetTarget, reset_type: str) -> FleetResult:
+        start = monotonic()
+        ip, name = self.resolve(target)
+        if not ip:
+            return FleetResult(
+                ip, name, "", "failed", 0, "No IP address for device", 0.0
+            )
+
+        model, error, attempt = "", "", 0
+        while attempt <= self.retries:
+            if attempt:
+                sleep(self.backoff * 2 ** (attempt - 1) + random.uniform(0, 1))
+            attempt += 1
+            phone: PhoneConnection = None
+            try:
+                with PhoneConnection(
+                    ip,
+                    self.cucm_url,
+                    port=self.port,
+                    username=self.username,
+                    password=self.password,
+                    phone_port=self.phone_port,
+                    ucm=self.ucm,
+                ) as phone:
+                    name, model = phone.device_name, phone.device_model
+                    phone.send_reset(reset_type, dry_run=self.dry_run)
+            except NO_RETRY_EXCEPTIONS as e:
+                error = str(e)
+                break
+            except Exception as e:
+                if phone is not None and phone.reset_sent:
+                    # * the phone is resetting; going through it again would
+                    # * reset it twice or fail on a rebooting phone
+                    return FleetResult(
+                        ip,
+                        name,
+                        model,
+                        "ok",
+                        attempt,
+                        f"Reset sent, cleanup failed: {e}",
+                        monotonic() - start,
+                    )
+                error = str(e)
+            else:
+                return FleetResult(
+                    ip, name, model, "ok", attempt, "", monotonic() - start
+                )
+
+        return FleetResult(
+            ip, name, model, "failed", attempt, error, monotonic() - start
+        )
+
+    def __then_wait(self, reset: "Future[FleetResult]") -> "Future[FleetResult]":
+        """Chains a wait for the phone to come back onto a reset, without
+        holding on to a worker thread while the phone reboots."""
+        done: Future = Future()
+
+        def came_back(watch: Future, result: FleetResult, start: float) -> None:
+            event: ReachabilityEvent = watch.result()
+            seconds = result.seconds + monotonic() - start
+            if event.kind == "up":
+                done.set_result(result._replace(seconds=seconds))
+            else:
+                done.set_result(
+                    result._replace(
+                        status="failed",
+                        error="Phone did not come back online",
+                        seconds=seconds,
+                    )
+                )
+
+        def reset_done(f: Future) -> None:
+            if (e := f.exception()) is not None:
+                done.set_exception(e)
+                return
+            result: FleetResult = f.result()
+            if result.status != "ok":
+                done.set_result(result)
+                return
+            start = monotonic()
+            MONITOR.watch_reboot(
+                result.ip, self.phone_port, up_timeout=self.reboot_timeout
+            ).add_done_callback(lambda w: came_back(w, result, start))
+
+        reset.add_done_callback(reset_done)
+        return done
+
+    def __submit(
+        self,
+        ex: concurrent.futures.Executor,
+        targets: Iterable[FleetTarget],
+        reset_type: str,
+    ) -> "list[Future[FleetResult]]":
+        """Submits resets so that no more than `per_subnet` phones of a /24 are
+        queued or worked on at once. The rest wait here rather than holding a
+        worker thread, so phones of other subnets aren't held up behind them."""
+        results: "list[Future[FleetResult]]" = []
+        waiting: dict[str, deque] = {}
+        for target in targets:
+            target = self.resolve(target)
+            results.append(done := Future())
+            waiting.setdefault(subnet_of(target.ip), deque()).append((target, done))
+        lock = threading.Lock()
+
+        def submit_next(subnet: str) -> None:
+            with lock:
+                if not waiting[subnet]:
+                    return
+                target, done = waiting[subnet].popleft()
+
+            def finished(f: Future) -> None:
+                if (e := f.exception()) is not None:
+                    done.set_exception(e)
+                else:
+                    done.set_result(f.result())
+                submit_next(subnet)
+
+            ex.submit(self.reset_one, target, reset_type).add_done_callback(finished)
+
+        for subnet in list(waiting):
+            for _ in range(self.per_subnet):
+                submit_next(subnet)
+        return results
+
+    def run(
+        self,
+        targets: Iterable[FleetTarget],
+        reset_type: str,
+        on_result: Callable[[FleetResult], None] = None,
+    ) -> list[FleetResult]:
+        if reset_type.lower() not in RESET_COMMANDS:
+            raise ResetException(f"{reset_type} is not a valid reset type")
+
+        waits = (
+            self.wait_for_reboot
+            and not self.dry_run
+            and reset_type.lower() in REBOOT_RESETS
+        )
+        results: list[FleetResult] = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as ex:
+            futures = self.__submit(ex, targets, reset_type)
+            if waits:
+                futures = [self.__then_wait(f) for f in futures]
+            for future in concurrent.futures.as_completed(futures):
+                result: FleetResult = future.result()
+                results.append(result)
+                if on_result is not None:
+                    on_result(result)
+        return results
+
+
+def write_results(results: list[FleetResult], path: str) -> None:
+    with open(path, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(FleetResult._fields)
+        writer.writerows(results)
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(description="Reset many Cisco phones at once")
+    parser.add_argument(
+        "targets",
+        help="CSV or JSON file of phone IPs/device names, or a target expression"
+        ' like "pool:Main-DP !dn:5xxx" (see ciscoreset.targets)',
+    )
+    parser.add_argument("reset", choices=sorted(RESET_COMMANDS), help="reset type")
+    parser.add_argument("--cucm", required=True, help="CUCM server address")
+    parser.add_argument("--port", default="8443", help="AXL port")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--per-subnet", type=int, default=4)
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--backoff", type=float, default=5.0)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument(
+        "--wait", action="store_true", help="wait for rebooted phones to come back"
+    )
+    parser.add_argument("--output", default="", help="write results to this CSV")
+    args = parser.parse_args()
+
+    username, password = get_credentials()
+    fleet = FleetReset(
+        args.cucm,
+        username,
+        password,
+        port=args.port,
+        workers=args.workers,
+        per_subnet=args.per_subnet,
+        retries=args.retries,
+        backoff=args.backoff,
+        resolver=get_inventory().resolve_ip,
+        dry_run=args.dry_run,
+        wait_for_reboot=args.wait,
+    )
+
+    def report(result: FleetResult) -> None:
+        device = result.name or result.ip
+        if result.status == "ok":
+            print(f"{device} ({result.ip}) complete in {result.seconds:.1f}s")
+        else:
+            print(f"{device} ({result.ip}) FAILED: {result.error}")
+
+    if Path(args.targets).is_file():
+        targets = load_targets(args.targets)
+    else:
+        ucm = get_cucm(username, password, args.cucm, port=args.port)
+        targets = select_targets(ucm, args.targets)
+        print(f"{len(targets)} devices selected")
+    if unknown := fleet.unresolved(targets):
+        # * the inventory only learns an IP once a phone is connected to by
+        # * IP, an AXL sync doesn't bring any
+        print(
+            f"No known IP for {len(unknown)} devices, these will fail: "
+            + ", ".join(t.name for t in unknown)
+        )
+    results = fleet.run(targets, args.reset, on_result=report)
+    failed = [r for r in results if r.status != "ok"]
+    print(f"\n{len(results) - len(failed)}/{len(results)} phones reset")
+    if args.output:
+        write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    run()
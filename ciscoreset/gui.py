@@ -2,7 +2,8 @@ from ciscoreset import PhoneConnection
 from ciscoreset.configs import ROOT_DIR
 from ciscoreset.gui_popups import popup_get_login_details, popup_not_supported
 from ciscoreset.gui_bgtasks import BGTasks
-from ciscoreset.keys import KEY_SUPPORT
+from ciscoreset.keys import KEY_TABLES
+from ciscoreset.inventory import get_inventory
 from ciscoreset.layouts import main_window_blueprint, image_to_base64, should_exit
 from ciscoreset.exceptions import *
 from PySimpleGUI.PySimpleGUI import DEFAULT_TEXT_COLOR
@@ -10,6 +11,8 @@ import PySimpleGUI as sg
 from PIL import UnidentifiedImageError
 from pathlib import Path
 from concurrent.futures import Future
+from typing import Tuple
+import sqlite3
 import re
 import traceback
 
@@ -35,9 +38,9 @@ def run() -> None:
     phone: PhoneConnection = None
     bg: BGTasks = BGTasks(window)
 
-    def reload_screenshot(scr_path="", dl_msg=True) -> None:
-        if scr_path:
-            window["-SCREENSHOT-"].update(image_to_base64(scr_path, (400, 240)))
+    def reload_screenshot(scr=b"", dl_msg=True) -> None:
+        if scr:
+            window["-SCREENSHOT-"].update(image_to_base64(scr, (400, 240)))
         else:
             window["-SCREENSHOT-"].update()
 
@@ -48,24 +51,29 @@ def run() -> None:
 
         window.refresh()
 
+    def lookup_phone_ip(text: str) -> Tuple[str, str]:
+        """IP of the one phone in the inventory matching `text`, or "" and
+        why not."""
+        try:
+            found = get_inventory().find(text)
+        except sqlite3.Error:
+            found = []
+        if not found:
+            return "", f"No phone found for {text}"
+        elif len(found) > 1:
+            names = ", ".join(r.name for r in found[:3])
+            return "", f"{len(found)} phones match {text} ({names}...)"
+        elif not found[0].ip:
+            return "", f"No known IP for {found[0].name}, enter its IP once"
+        return found[0].ip, ""
+
     def clear_tmp_dir() -> None:
         temp_dir: Path = ROOT_DIR / "tmp"
         for pic_path in temp_dir.glob("**/*"):
             pic_path.unlink()
 
     def gen_button_list(model: str) -> list[str]:
-        s_list = KEY_SUPPORT[model]["standard"]
-        n_list = []
-
-        for n_set in KEY_SUPPORT[model]["numeric"]:
-            parts = n_set.split("-")
-            start = int(parts[0][-1])
-            stop = int(parts[-1])
-            name = parts[0][:-1]
-            for i in range(start, stop + 1, 1):
-                n_list.append(f"{name}{i}")
-
-        return s_list + n_list
+        return list(KEY_TABLES[model].buttons)
 
     def disable_unsupported_buttons(buttons: list[str], w: sg.Window):
         for key, element in w.AllKeysDict.items():
@@ -92,7 +100,7 @@ def run() -> None:
 
     refresh_screenshot = False
     dl_fut: Future = None
-    dl_path: str = ""
+    shown_frame: bytes = b""
     r_ip = re.compile(r"^((25[0-5]|(2[0-4]|1\d|[1-9]|)\d)(\.(?!$)|$)){4}$")
 
     button_list: list[str] = []
@@ -101,12 +109,14 @@ def run() -> None:
         while True:
             if refresh_screenshot:
                 if dl_fut.done():
-                    reload_screenshot(dl_path, dl_msg=False)
+                    reload_screenshot(phone.last_screenshot, dl_msg=False)
                     refresh_screenshot = False
                     dl_fut = None
-                elif Path(dl_path).is_file():
+                elif phone.last_screenshot is not shown_frame:
+                    # * show each step of the reset as the phone takes it
+                    shown_frame = phone.last_screenshot
                     try:
-                        reload_screenshot(dl_path)
+                        reload_screenshot(shown_frame)
                     except UnidentifiedImageError:
                         pass
 
@@ -122,11 +132,16 @@ def run() -> None:
                 window.refresh()
 
             elif event == "Connect":
-                if not r_ip.match(values["-IP-"]):
+                if not (phone_ip := values["-IP-"].strip()):
                     window["-STATUS-"].update(
                         "Please enter an IP address", text_color="orange"
                     )
                     continue
+                elif not r_ip.match(phone_ip):
+                    phone_ip, lookup_msg = lookup_phone_ip(phone_ip)
+                    if not phone_ip:
+                        window["-STATUS-"].update(lookup_msg, text_color="orange")
+                        continue
 
                 window["-INFO-"].update("", text_color=DEFAULT_TEXT_COLOR)
                 window["-STATUS-"].update(
@@ -137,7 +152,7 @@ def run() -> None:
                 try:
                     phone = None
                     phone = PhoneConnection(
-                        values["-IP-"],
+                        phone_ip,
                         url,
                         port=port,
                         username=username,
@@ -184,9 +199,6 @@ def run() -> None:
                     button_list = gen_button_list(phone.device_model)
                     disable_unsupported_buttons(button_list, window)
                     dl_fut: Future = bg.update_screenshot(phone)
-                    dl_path = str(
-                        ROOT_DIR / "tmp" / (phone.device_ip.replace(".", "-") + ".bmp")
-                    )
 
             elif phone is not None and event in button_list:
                 print("button pressed")
@@ -1,6 +1,9 @@
 from ciscoreset.configs import ROOT_DIR
 from ciscoreset.utils import image_to_base64
 from ciscoreset import PhoneConnection
+from ciscoreset.phone import REBOOT_RESETS
+from ciscoreset.reachability import ReachabilityEvent
+from ciscoreset.exceptions import PhoneConnectException
 import PySimpleGUI as sg
 import concurrent.futures
 from concurrent.futures import Future
@@ -80,14 +83,11 @@ class BGTasks:
         # self.__window.refresh()
 
     def update_screenshot(self, phone: PhoneConnection) -> Future:
-
-        img_path = gen_screenshot_path(phone.device_ip)
-
-        def dl_screenshot(t_phone: PhoneConnection) -> str:
-            print(f"dl-ing screenshot: {img_path}")
-            location = t_phone._screenshot()
+        def dl_screenshot(t_phone: PhoneConnection) -> bytes:
+            print(f"dl-ing screenshot: {t_phone.device_ip}")
+            data = t_phone._screenshot_bytes()
             print("screenshot downloaded")
-            return location
+            return data
 
         dl_fut = self._add_task("screenshot", dl_screenshot, phone)
         print("futures started")
@@ -102,21 +102,18 @@ class BGTasks:
     def send_reset(self, phone: PhoneConnection, reset_type: str) -> Future:
         def reset(t_phone: PhoneConnection, t_reset_type: str):
             t_phone.send_reset(t_reset_type)
-            if t_reset_type in ["Device", "Settings", "Service"]:  # "phone off" resets
-                # ? wait until device disconnects
-                t = 0.25
-                i = 0
-                while t_phone.is_reachable():
-                    time.sleep(0.25)
-                    t += 0.25
-                    if t > 15:
-                        break
-                while not t_phone.is_reachable():
-                    i += 1
+            if t_reset_type.lower() in REBOOT_RESETS:  # "phone off" resets
+                self.__window["-STATUS-"].update("Waiting for phone to go offline...")
+
+                def went_down(event: ReachabilityEvent) -> None:
                     self.__window["-STATUS-"].update(
-                        f"Waiting for phone to come back online...({i})"
+                        "Waiting for phone to come back online..."
+                    )
+
+                if not t_phone.wait_for_reboot(on_down=went_down):
+                    raise PhoneConnectException(
+                        f"{t_phone.device_ip} did not come back online"
                     )
-                    time.sleep(0.95)
             for n in range(10):
                 self.__window["-STATUS-"].update(
                     f"Waiting 10sec for phone to finish up...({n+1})"
@@ -129,7 +126,7 @@ class BGTasks:
                 t_phone._to_home()
                 time.sleep(1)
 
-            return t_phone._screenshot()
+            return t_phone._screenshot_bytes()
 
         return self._add_task("reset", reset, phone, reset_type)
 
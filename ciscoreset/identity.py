@@ -0,0 +1,124 @@
+from collections import namedtuple
+from time import monotonic
+import threading
+import requests
+import re
+
+
+DeviceIdentity = namedtuple("DeviceIdentity", ["name", "model", "serial", "firmware"])
+
+r_device_name = re.compile(rb"SEP\w{12}")
+r_model = re.compile(rb"CP-(\d{4}(?:NR)?)")
+r_serial = re.compile(rb"Serial [Nn]umber(?:\s|<[^>]*>|&nbsp;)*([A-Z0-9]{8,})")
+r_firmware = re.compile(
+    rb">\s*Version\s*(?=<)(?:\s|<[^>]*>|&nbsp;)*([A-Za-z0-9][\w.\-]*)"
+)
+
+CHUNK_SIZE = 4096
+MAX_PROBE_BYTES = 64 * 1024
+# * model, serial and version usually sit next to the host name, don't read far past it
+EXTRA_BYTES_AFTER_NAME = 8 * 1024
+
+
+def parse_identity(page: bytes) -> DeviceIdentity:
+    name = r_device_name.search(page)
+    model = r_model.search(page)
+    serial = r_serial.search(page)
+    firmware = r_firmware.search(page)
+    return DeviceIdentity(
+        name.group(0).decode() if name else "",
+        model.group(1).decode() if model else "",
+        serial.group(1).decode() if serial else "",
+        firmware.group(1).decode() if firmware else "",
+    )
+
+
+class IdentityScanner:
+    """Feeds a phone's web page through in chunks and says when to stop."""
+
+    def __init__(self, max_bytes=MAX_PROBE_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.page = b""
+        self.__name_end = -1
+
+    def feed(self, chunk: bytes) -> bool:
+        """Adds a chunk, returning True once enough of the page has been read."""
+        self.page += chunk
+        if len(self.page) >= self.max_bytes:
+            return True
+        if self.__name_end == -1:
+            if match := r_device_name.search(self.page):
+                self.__name_end = match.end()
+            else:
+                return False
+        identity = parse_identity(self.page)
+        return bool(identity.model and identity.serial and identity.firmware) or (
+            len(self.page) - self.__name_end >= EXTRA_BYTES_AFTER_NAME
+        )
+
+    @property
+    def identity(self) -> DeviceIdentity:
+        return parse_identity(self.page[: self.max_bytes])
+
+
+def probe_identity(
+    url: str, timeout=10, max_bytes=MAX_PROBE_BYTES, session: requests.Session = None
+) -> DeviceIdentity:
+    """Streams a phone's web root just far enough to find its device name,
+    plus its model, serial number and firmware version when they're nearby.
+
+    Raises:
+        requests.RequestException: The phone couldn't be reached
+
+    Returns:
+        DeviceIdentity: Blank fields for anything that wasn't found
+    """
+    getter = session.get if session is not None else requests.get
+    scanner = IdentityScanner(max_bytes)
+    with getter(url, timeout=timeout, stream=True) as recv:
+        for chunk in recv.iter_content(chunk_size=CHUNK_SIZE):
+            if scanner.feed(chunk):
+                break
+    return scanner.identity
+
+
+class IdentityCache:
+    """Phone address ("ip:port") -> DeviceIdentity, forgotten after `ttl` seconds."""
+
+    def __init__(self, ttl=300.0) -> None:
+        self.ttl = ttl
+        self.__entries: dict[str, tuple[float, DeviceIdentity]] = {}
+        self.__lock = threading.Lock()
+
+    def get(self, address: str) -> DeviceIdentity:
+        with self.__lock:
+            if (entry := self.__entries.get(address, None)) is None:
+                return None
+            if monotonic() - entry[0] > self.ttl:
+                del self.__entries[address]
+                return None
+            return entry[1]
+
+    def put(self, address: str, identity: DeviceIdentity) -> None:
+        with self.__lock:
+            self.__entries[address] = (monotonic(), identity)
+
+    def invalidate(self, address="") -> None:
+        with self.__lock:
+            if address:
+                self.__entries.pop(address, None)
+            else:
+                self.__entries.clear()
+
+
+IDENTITY_CACHE = IdentityCache()
+
+
+def get_identity(ip: str, port=80, timeout=10, use_cache=True) -> DeviceIdentity:
+    address = f"{ip}:{port}"
+    if use_cache and (identity := IDENTITY_CACHE.get(address)) is not None:
+        return identity
+    identity = probe_identity(f"http://{address}/", timeout=timeout)
+    if identity.name:
+        IDENTITY_CACHE.put(address, identity)
+    return identity
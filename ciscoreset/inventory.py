@@ -0,0 +1,291 @@
+"""Local SQLite index of phones, kept in step with CUCM, so names, DNs and IPs
+can be looked up without a round-trip to AXL."""
+from ciscoreset.configs import USER_DIR
+from ciscoreset.axl import CUCM, get_cucm, sql_list
+from ciscoreset.credentials import get_credentials
+from collections import namedtuple
+from pathlib import Path
+from time import time
+from typing import Iterable
+from zeep.exceptions import Fault
+import threading
+import argparse
+import sqlite3
+import json
+
+
+INVENTORY_FILE: Path = USER_DIR / "inventory.sqlite3"
+
+InventoryRecord = namedtuple(
+    "InventoryRecord",
+    ["name", "model", "description", "dn", "partition", "device_pool", "ip"],
+)
+FIELDS = InventoryRecord._fields
+
+SCHEMA = """
+create table if not exists phones (
+    name text primary key,
+    pkid text,
+    model text not null default '',
+    description text not null default '',
+    dn text not null default '',
+    partition text not null default '',
+    device_pool text not null default '',
+    ip text not null default '',
+    updated real not null default 0
+);
+create index if not exists phones_pkid on phones (pkid);
+create index if not exists phones_dn on phones (dn);
+create index if not exists phones_ip on phones (ip);
+create table if not exists meta (key text primary key, value text);
+"""
+
+# every phone with its primary line, or only those matching {where}
+PHONES_SQL = """
+select d.pkid, d.name, tm.name as model, d.description,
+    n.dnorpattern as dn, rp.name as partition, dp.name as device_pool
+from device as d
+inner join typemodel as tm on tm.enum = d.tkmodel
+left outer join devicepool as dp on dp.pkid = d.fkdevicepool
+left outer join devicenumplanmap as dnm
+    on dnm.fkdevice = d.pkid and dnm.numplanindex = 1
+left outer join numplan as n on n.pkid = dnm.fknumplan
+left outer join routepartition as rp on rp.pkid = n.fkroutepartition
+where d.tkclass = 1 {where}
+"""
+SYNC_BATCH = 200  # pkids per incremental query
+
+
+class Inventory:
+    def __init__(self, path: Path = INVENTORY_FILE) -> None:
+        self.path = Path(path)
+        if not self.path.parent.exists():
+            self.path.parent.mkdir(parents=True)
+        self.__db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.__db.row_factory = sqlite3.Row
+        self.__lock = threading.Lock()
+        with self.__lock, self.__db:
+            self.__db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__db.close()
+
+    def __query(self, sql: str, params=()) -> list[InventoryRecord]:
+        with self.__lock:
+            rows = self.__db.execute(sql, params).fetchall()
+        return [InventoryRecord(*(r[f] for f in FIELDS)) for r in rows]
+
+    def __get_meta(self, key: str) -> str:
+        with self.__lock:
+            row = self.__db.execute(
+                "select value from meta where key = ?", (key,)
+            ).fetchone()
+        return row["value"] if row is not None else ""
+
+    def __set_meta(self, key: str, value: str) -> None:
+        with self.__lock, self.__db:
+            self.__db.execute(
+                "insert or replace into meta (key, value) values (?, ?)", (key, value)
+            )
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return self.__db.execute("select count(*) from phones").fetchone()[0]
+
+    @property
+    def last_sync(self) -> float:
+        return float(self.__get_meta("last_sync") or 0)
+
+    def upsert(self, rows: Iterable[dict]) -> int:
+        """Adds or updates phones from rows of PHONES_SQL, keeping known IPs."""
+        now = time()
+        params = [
+            (
+                r["name"],
+                r["pkid"],
+                r["model"].split(" ")[-1],
+                r["description"],
+                r["dn"],
+                r["partition"],
+                r["device_pool"],
+                now,
+            )
+            for r in rows
+        ]
+        with self.__lock, self.__db:
+            self.__db.executemany(
+                """
+                insert into phones
+                    (name, pkid, model, description, dn, partition, device_pool,
+                    updated)
+                values (?, ?, ?, ?, ?, ?, ?, ?)
+                on conflict (name) do update set
+                    pkid = excluded.pkid,
+                    model = excluded.model,
+                    description = excluded.description,
+                    dn = excluded.dn,
+                    partition = excluded.partition,
+                    device_pool = excluded.device_pool,
+                    updated = excluded.updated
+                """,
+                params,
+            )
+        return len(params)
+
+    def remove(self, pkids: Iterable[str]) -> None:
+        with self.__lock, self.__db:
+            self.__db.executemany(
+                "delete from phones where pkid = ?", [(p,) for p in pkids]
+            )
+
+    def record_ip(self, name: str, ip: str, model="") -> None:
+        """Remembers where a phone was last reached."""
+        with self.__lock, self.__db:
+            # * an IP belongs to one phone at a time
+            self.__db.execute(
+                "update phones set ip = '' where ip = ? and name != ?", (ip, name)
+            )
+            self.__db.execute(
+                """
+                insert into phones (name, model, ip, updated) values (?, ?, ?, ?)
+                on conflict (name) do update set ip = excluded.ip
+                """,
+                (name, model, ip, time()),
+            )
+
+    def by_name(self, name: str) -> InventoryRecord:
+        found = self.__query("select * from phones where name = ?", (name.upper(),))
+        return found[0] if found else None
+
+    def by_ip(self, ip: str) -> InventoryRecord:
+        found = self.__query("select * from phones where ip = ?", (ip,))
+        return found[0] if found else None
+
+    def by_dn(self, dn: str) -> list[InventoryRecord]:
+        return self.__query("select * from phones where dn = ? order by name", (dn,))
+
+    def search(self, text: str, limit=50) -> list[InventoryRecord]:
+        """Phones whose name, DN or description contains `text`."""
+        like = "%" + text.replace("%", r"\%").replace("_", r"\_") + "%"
+        return self.__query(
+            r"""
+            select * from phones
+            where name like ? escape '\' or dn like ? escape '\'
+                or description like ? escape '\'
+            order by name limit ?
+            """,
+            (like, like, like, limit),
+        )
+
+    def find(self, text: str) -> list[InventoryRecord]:
+        """Best matches for whatever a user typed: a device name, DN, IP or
+        part of a description."""
+        text = text.strip()
+        if (record := self.by_name(text)) is not None:
+            return [record]
+        if found := self.by_dn(text):
+            return found
+        if (record := self.by_ip(text)) is not None:
+            return [record]
+        return self.search(text)
+
+    def resolve_ip(self, name: str) -> str:
+        """Last known IP of a device name, "" if unknown (a fleet resolver)."""
+        record = self.by_name(name)
+        return record.ip if record is not None else ""
+
+    def sync(self, ucm: CUCM, full=False) -> int:
+        """Brings the index up to date with CUCM.
+
+        The first sync (or `full`) loads every phone in one SQL query. After
+        that only phones changed since the last sync are fetched, using the AXL
+        change queue, and a full load is done again if the queue can't be used.
+
+        Returns:
+            int: Phones added or updated
+        """
+        cursor = json.loads(self.__get_meta("change_cursor") or "null")
+        if not full and cursor is not None:
+            try:
+                count = self.__sync_changes(ucm, tuple(cursor))
+            except Fault:
+                pass  # * cursor expired or no change queue, reload everything
+            else:
+                self.__set_meta("last_sync", str(time()))
+                return count
+
+        try:
+            next_cursor, _ = ucm.list_changes()
+        except Fault:
+            next_cursor = None
+        start = time()
+        count = self.upsert(ucm.execute_sql(PHONES_SQL.format(where="")))
+        with self.__lock, self.__db:
+            # * gone from CUCM (phones only ever seen by IP have no pkid)
+            self.__db.execute(
+                "delete from phones where pkid is not null and updated < ?", (start,)
+            )
+        self.__set_meta("change_cursor", json.dumps(next_cursor))
+        self.__set_meta("last_sync", str(time()))
+        return count
+
+    def __sync_changes(self, ucm: CUCM, cursor: tuple) -> int:
+        next_cursor, changes = ucm.list_changes(cursor)
+        removed = {c.uuid for c in changes if c.type == "Phone" and c.action == "r"}
+        phones = {c.uuid for c in changes if c.type == "Phone"} - removed
+        lines = {c.uuid for c in changes if c.type == "Line" and c.action != "r"}
+
+        self.remove(removed)
+        wheres = [f"and d.pkid in ({sql_list(batch)})" for batch in batched(phones)] + [
+            "and d.pkid in (select fkdevice from devicenumplanmap"
+            f" where fknumplan in ({sql_list(batch)}))"
+            for batch in batched(lines)
+        ]
+        count = 0
+        for where in wheres:
+            count += self.upsert(ucm.execute_sql(PHONES_SQL.format(where=where)))
+        self.__set_meta("change_cursor", json.dumps(next_cursor))
+        return count
+
+
+def batched(items: Iterable[str], size=SYNC_BATCH) -> list[list[str]]:
+    items = sorted(items)
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+_inventory: Inventory = None
+_inventory_lock = threading.Lock()
+
+
+def get_inventory() -> Inventory:
+    """The inventory in the user folder, opened on first use."""
+    global _inventory
+    with _inventory_lock:
+        if _inventory is None:
+            _inventory = Inventory()
+        return _inventory
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(description="Local index of CUCM phones")
+    commands = parser.add_subparsers(dest="command", required=True)
+    sync = commands.add_parser("sync", help="update the index from CUCM")
+    sync.add_argument("--cucm", required=True, help="CUCM server address")
+    sync.add_argument("--port", default="8443", help="AXL port")
+    sync.add_argument("--full", action="store_true", help="reload every phone")
+    find = commands.add_parser("find", help="look up phones")
+    find.add_argument("text", help="device name, DN, IP or part of a description")
+    args = parser.parse_args()
+
+    inventory = get_inventory()
+    if args.command == "sync":
+        ucm = get_cucm(*get_credentials(), args.cucm, port=args.port)
+        print(f"{inventory.sync(ucm, full=args.full)} phones updated")
+    else:
+        for record in inventory.find(args.text):
+            print("  ".join(v or "-" for v in record))
+
+
+if __name__ == "__main__":
+    run()
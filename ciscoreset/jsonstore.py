@@ -0,0 +1,41 @@
+"""Learned data kept as small JSON files in the user folder.
+
+The files only save relearning: a missing or bad one starts the store empty,
+and a write that fails is dropped.
+"""
+from pathlib import Path
+import threading
+import json
+
+
+class JSONStore:
+    """A dict loaded from and saved to a JSON file. Subclasses read and change
+    `_data` holding `_lock`, and mark `_unsaved` when the file is behind."""
+
+    indent: int = None
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._data: dict = {}
+        self._unsaved = False
+        if self.path.is_file():
+            try:
+                self._data.update(json.loads(self.path.read_text()))
+            except (ValueError, OSError):
+                pass
+
+    def save(self) -> None:
+        with self._lock:
+            if self._unsaved:
+                self._write()
+
+    def _write(self) -> None:
+        """Writes the file, the caller holds `_lock`."""
+        self._unsaved = False
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            text = json.dumps(self._data, indent=self.indent, sort_keys=True)
+            self.path.write_text(text)
+        except OSError:
+            pass
@@ -1,4 +1,6 @@
-from typing import Tuple
+from types import MappingProxyType
+from typing import NamedTuple, Tuple
+import re
 
 
 # Key lists are located at:
@@ -115,3 +117,86 @@ keys_7800_standard = {
 KEY_SUPPORT["7832"] = keys_7832
 for dev in ["7811", "7821", "7841", "7861"]:
     KEY_SUPPORT[dev] = keys_7800_standard
+
+
+# seconds to wait between key requests, for models that drop keys sent too fast
+KEY_BATCH_DELAY: dict = {dev: 0.0 for dev in KEY_SUPPORT}
+
+
+class KeyTable(NamedTuple):
+    """Every key a model supports, expanded once so lookups are a set hit."""
+
+    valid: frozenset
+    ranges: MappingProxyType  # numeric key name -> (lowest, highest)
+    buttons: tuple  # standard keys, then numeric keys in order
+
+
+r_numeric_key = re.compile(r"^(\D+)(\d+)-(\d+)$")
+
+
+def compile_key_table(key_pack: dict) -> KeyTable:
+    ranges: dict[str, Tuple[int, int]] = {}
+    numeric: list[str] = []
+    for n_set in key_pack["numeric"]:
+        name, start, stop = r_numeric_key.match(n_set).groups()
+        ranges[name] = (int(start), int(stop))
+        numeric += [f"{name}{i}" for i in range(int(start), int(stop) + 1)]
+
+    buttons = tuple(key_pack["standard"]) + tuple(numeric)
+    return KeyTable(frozenset(buttons), MappingProxyType(ranges), buttons)
+
+
+KEY_TABLES = MappingProxyType(
+    {model: compile_key_table(key_pack) for model, key_pack in KEY_SUPPORT.items()}
+)
+
+
+def find_invalid_key(model: str, keys: list[str]) -> str:
+    """Finds the first key that a device doesn't support.
+
+    Args:
+        model (str): Model number only, no other words
+
+        keys (list[str]): List of keys to check. Works with 'Key:' or without.
+
+    Raises:
+        KeyError: The model isn't supported at all
+
+    Returns:
+        str: The first unsupported key as given, or "" if they're all supported
+    """
+    valid = KEY_TABLES[model].valid
+    for key in keys:
+        if key.removeprefix("Key:") not in valid:
+            return key
+    return ""
+
+
+KEY_SHORTCUTS: dict = {
+    "down": "NavDwn",
+    "up": "NavUp",
+    "left": "NavLeft",
+    "right": "NavRight",
+    "select": "NavSelect",
+    "back": "NavBack",
+    "apps": "Applications",
+}
+
+
+def replace_key_shortcuts(key_list: list[str], model="") -> list[str]:
+    """Swaps shortcut words and single digits for real key names. Digits are
+    only swapped when `model` has a matching KeyPad key (any model, if blank)."""
+    table = KEY_TABLES.get(model, None)
+    correct_list: list[str] = []
+    for key in key_list:
+        if key in KEY_SHORTCUTS:
+            correct_list.append(KEY_SHORTCUTS[key])
+        elif (
+            key.isnumeric()
+            and len(key) == 1
+            and (table is None or f"KeyPad{key}" in table.valid)
+        ):
+            correct_list.append(f"KeyPad{key}")
+        else:
+            correct_list.append(key)
+    return correct_list
@@ -3,7 +3,7 @@ import PySimpleGUI as sg
 
 def create_ip_entry() -> list:
     return [
-        [sg.Text("IP Address of device:")],
+        [sg.Text("IP address, device name or DN:")],
         [
             sg.In("", size=(18, 1), key="-IP-"),
             sg.Button("Connect", bind_return_key=True),
@@ -0,0 +1,181 @@
+"""Resets every device on every line group member, journaling as it goes so
+an interrupted run picks up where it left off."""
+from ciscoreset.configs import USER_DIR
+from ciscoreset.axl import CUCM, check_output
+from collections import namedtuple
+from pathlib import Path
+from time import sleep, time
+from typing import Callable, Iterable, Tuple
+import concurrent.futures
+import threading
+import json
+import os
+
+
+JOURNAL_FILE: Path = USER_DIR / "lg_reset_journal.jsonl"
+LINE_STAGGER = 5.0  # seconds between member DNs of a group
+
+JournalEntry = namedtuple(
+    "JournalEntry", ["group", "dn", "partition", "device", "status", "error", "at"]
+)
+# error: why the group stopped early, "" if every member DN was worked through
+GroupResult = namedtuple(
+    "GroupResult", ["group", "reset", "skipped", "failed", "error"], defaults=("",)
+)
+
+
+class ResetJournal:
+    """Append-only JSONL record of every device reset attempted. Each entry
+    is flushed to disk before the next reset starts."""
+
+    def __init__(self, path: Path = JOURNAL_FILE) -> None:
+        self.path = Path(path)
+        self.done: set[str] = set()
+        self.failed: dict[str, str] = {}
+        self.__lock = threading.Lock()
+        if self.path.is_file():
+            text = self.path.read_text()
+            if text and not text.endswith("\n"):
+                # * a crash mid-write left a torn last line, drop it
+                text = text[: text.rfind("\n") + 1]
+                self.path.write_text(text)
+            for line in text.splitlines():
+                try:
+                    self.__apply(JournalEntry(**json.loads(line)))
+                except (ValueError, TypeError):
+                    continue
+
+    def __apply(self, entry: JournalEntry) -> None:
+        if entry.status == "ok":
+            self.done.add(entry.device)
+            self.failed.pop(entry.device, None)
+        else:
+            self.failed[entry.device] = entry.error
+
+    def record(
+        self, group: str, dn: str, partition: str, device: str, error=""
+    ) -> JournalEntry:
+        entry = JournalEntry(
+            group, dn, partition, device, "failed" if error else "ok", error, time()
+        )
+        with self.__lock:
+            if not self.path.parent.exists():
+                self.path.parent.mkdir(parents=True)
+            with self.path.open("a") as journal:
+                journal.write(json.dumps(entry._asdict()) + "\n")
+                journal.flush()
+                os.fsync(journal.fileno())
+            self.__apply(entry)
+        return entry
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.done.clear()
+            self.failed.clear()
+            if self.path.is_file():
+                self.path.unlink()
+
+
+class LineGroupResetRunner:
+    def __init__(
+        self,
+        ucm: CUCM,
+        journal: ResetJournal = None,
+        workers=7,
+        stagger=LINE_STAGGER,
+        group_stagger: dict[str, float] = None,
+    ) -> None:
+        """Resets line group devices a group per worker, one member DN at a time.
+
+        Devices already reset according to the journal are skipped, as are
+        devices already handled for another DN or group in this run.
+
+        Args:
+            workers (int, optional): Line groups worked on at once. Defaults to 7.
+
+            stagger (float, optional): Seconds between member DNs of a group, so
+            a group never loses all its phones at once. Defaults to 5.0.
+
+            group_stagger (dict[str, float], optional): Per-group overrides
+            of `stagger`.
+        """
+        self.ucm = ucm
+        self.journal = journal if journal is not None else ResetJournal()
+        self.workers = workers
+        self.stagger = stagger
+        self.group_stagger = dict(group_stagger or {})
+        self.__claimed: set[str] = set()
+        self.__lock = threading.Lock()
+
+    def stagger_for(self, group: str) -> float:
+        return self.group_stagger.get(group, self.stagger)
+
+    def __claim(self, device: str) -> bool:
+        """True if no one has reset or is resetting `device` yet."""
+        with self.__lock:
+            if device in self.journal.done or device in self.__claimed:
+                return False
+            self.__claimed.add(device)
+            return True
+
+    def reset_group(self, group: str, members: list[Tuple[str, str]]) -> GroupResult:
+        """Works through a group's member DNs. A failure outside a single
+        device reset (looking up a DN, writing the journal) stops this group
+        only, and is returned as its error."""
+        reset, skipped, failed = 0, 0, 0
+        waited = False
+        try:
+            for dn, partition in members:
+                devices = list(self.ucm.get_dn_devices(dn, partition))
+                to_reset = [d for d in devices if self.__claim(d)]
+                skipped += len(devices) - len(to_reset)
+                if not to_reset:
+                    continue
+
+                if waited:
+                    sleep(self.stagger_for(group))
+                waited = True
+                for device in to_reset:
+                    try:
+                        result = self.ucm.do_device_reset(name=device)
+                        error = "" if check_output(result) is not None else str(result)
+                    except Exception as e:
+                        error = str(e) or type(e).__name__
+                    self.journal.record(group, dn, partition, device, error)
+                    if error:
+                        failed += 1
+                    else:
+                        reset += 1
+        except Exception as e:
+            return GroupResult(
+                group, reset, skipped, failed, str(e) or type(e).__name__
+            )
+        return GroupResult(group, reset, skipped, failed)
+
+    def run(
+        self,
+        line_groups: dict[str, list[Tuple[str, str]]],
+        on_result: Callable[[GroupResult], None] = None,
+    ) -> list[GroupResult]:
+        results: list[GroupResult] = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as ex:
+            futures = [
+                ex.submit(self.reset_group, name, members)
+                for name, members in line_groups.items()
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                result: GroupResult = future.result()
+                results.append(result)
+                if on_result is not None:
+                    on_result(result)
+        return results
+
+
+def select_groups(line_groups: dict, names: Iterable[str]) -> dict:
+    names = list(names)
+    if not names:
+        return line_groups
+    missing = [n for n in names if n not in line_groups]
+    if missing:
+        raise Exception(f"No line group(s) named {', '.join(missing)}")
+    return {n: line_groups[n] for n in names}
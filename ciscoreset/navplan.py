@@ -0,0 +1,127 @@
+"""KeyPad positions learned by navigating with vision, shared between phones.
+
+Every phone of a model running the same firmware at the same font size draws
+the same menus, so the positions one phone needed can drive the next one
+without screenshots. Plans are saved between runs.
+"""
+from ciscoreset.configs import USER_DIR
+from ciscoreset.jsonstore import JSONStore
+from collections import namedtuple
+from pathlib import Path
+from typing import Tuple
+import threading
+import atexit
+
+
+NAV_PLANS_FILE: Path = USER_DIR / "nav_plans.json"
+
+# menus every reset passes through on its way to the reset item
+RESET_PATH = ("Admin Settings", "Reset Settings")
+
+# a plan picked for a phone: its key, the keys reaching Reset Settings from
+# anywhere, and where the reset item should be in that list
+Replay = namedtuple("Replay", ["key", "keys", "position"])
+
+
+def plan_key(model: str, firmware: str, font: str) -> str:
+    return f"{model}/{firmware}/{font}"
+
+
+class NavPlans(JSONStore):
+    """(model, firmware, font size) -> {menu or list item: KeyPad position}"""
+
+    indent = 1
+
+    def __init__(self, path: Path = NAV_PLANS_FILE) -> None:
+        super().__init__(path)
+
+    def get(self, model: str, firmware: str, font: str) -> dict[str, int]:
+        with self._lock:
+            return dict(self._data.get(plan_key(model, firmware, font), {}))
+
+    def fonts(self, model: str, firmware: str) -> list[str]:
+        """Font sizes with a plan for a model and firmware."""
+        prefix = plan_key(model, firmware, "")
+        with self._lock:
+            return [k[len(prefix) :] for k in self._data if k.startswith(prefix)]
+
+    def record(self, model: str, firmware: str, font: str, positions: dict) -> None:
+        """Adds positions found with vision to a plan."""
+        key = plan_key(model, firmware, font)
+        with self._lock:
+            plan = self._data.setdefault(key, {})
+            if any(plan.get(item, None) != pos for item, pos in positions.items()):
+                plan.update(positions)
+                self._unsaved = True
+
+    def forget(self, model: str, firmware: str, font: str) -> None:
+        with self._lock:
+            if self._data.pop(plan_key(model, firmware, font), None) is not None:
+                self._unsaved = True
+
+
+class PhonePlans:
+    """The plans as one phone uses them. Connections, sync or async, only
+    press the keys and take the screenshots; which plan to replay, whether a
+    replay checked out and what gets recorded is decided here."""
+
+    def __init__(self, plans: NavPlans, model: str, firmware: str, font: str) -> None:
+        """
+        Args:
+            font (str): Font size last seen on the phone, "" if unknown
+        """
+        self.plans = plans
+        self.model = model
+        self.firmware = firmware
+        self.font = font
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        """What this phone's menus depend on, or None while its firmware or
+        font size isn't known."""
+        if not (self.firmware and self.font):
+            return None
+        return self.model, self.firmware, self.font
+
+    def replay(self, list_item: str) -> Replay:
+        """A plan reaching `list_item` for this phone's model and firmware,
+        trying the font size last seen on it first (any other is a guess the
+        check screenshot settles). None if there's none."""
+        fonts = self.plans.fonts(self.model, self.firmware)
+        for guess in sorted(fonts, key=lambda f: f != self.font):
+            plan = self.plans.get(self.model, self.firmware, guess)
+            if all(item in plan for item in (*RESET_PATH, list_item)):
+                keys = ["NavBack"] * 6 + ["Applications"]
+                keys += [f"KeyPad{plan[item]}" for item in RESET_PATH]
+                return Replay((self.model, self.firmware, guess), keys, plan[list_item])
+        return None
+
+    def check(self, replay: Replay, state: str, position: int) -> bool:
+        """Whether a replay reached the reset list with the item where the
+        plan says (`position` is where vision found it, None if it didn't).
+        A plan for this phone's font that doesn't check out is forgotten."""
+        if state == "reset_settings" and position == replay.position:
+            return True
+        if self.key == replay.key:
+            self.plans.forget(*replay.key)  # * the plan is out of date
+        return False
+
+    def record(self, list_item: str, found: dict[str, int]) -> None:
+        """Saves the positions vision found on the way to `list_item`."""
+        if (key := self.key) is not None:
+            items = (*RESET_PATH, list_item)
+            self.plans.record(*key, {i: found[i] for i in items if i in found})
+
+
+_nav_plans: NavPlans = None
+_nav_plans_lock = threading.Lock()
+
+
+def get_nav_plans() -> NavPlans:
+    """The plans in the user folder, loaded on first use."""
+    global _nav_plans
+    with _nav_plans_lock:
+        if _nav_plans is None:
+            _nav_plans = NavPlans()
+            atexit.register(_nav_plans.save)
+        return _nav_plans
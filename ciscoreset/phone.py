@@ -1,14 +1,34 @@
 from ciscoreset.configs import ROOT_DIR
-from ciscoreset.axl import CUCM
+from ciscoreset.axl import CUCM, get_cucm
+from ciscoreset.associations import AssociationManager, get_association_manager
 from ciscoreset.credentials import get_credentials
-from ciscoreset.xml import XMLPhone
-from ciscoreset.vision import get_list_position, get_menu_position
+from ciscoreset.xml import XMLPhone, save_screenshot
+from ciscoreset.keys import replace_key_shortcuts
+from ciscoreset.identity import DeviceIdentity, get_identity
+from ciscoreset.inventory import get_inventory
+from ciscoreset.navplan import NavPlans, PhonePlans, get_nav_plans
+from ciscoreset.reachability import (
+    MONITOR,
+    DOWN_TIMEOUT,
+    UP_TIMEOUT,
+    ReachabilityEvent,
+    tcp_probe,
+)
+from ciscoreset.vision import (
+    get_font_memory,
+    classify_screen,
+    get_list_position,
+    get_menu_position,
+    decode_image,
+)
 from ciscoreset.exceptions import *
-from bs4 import BeautifulSoup
 import requests
-import re
+import sqlite3
 from time import sleep
 from pathlib import Path
+from functools import partial
+from typing import Callable, Tuple
+import numpy as np
 
 
 SUPPORTED_PHONE_MODELS = [
@@ -42,6 +62,18 @@ RESET_CONFIRM_BUTTON: dict = {
 }
 
 
+RESET_COMMANDS: dict = {
+    "device": "Reset Device",
+    "settings": "All Settings",
+    "network": "Network Settings",
+    "service": "Service Mode",
+    "service mode": "Service Mode",
+    "security": "Security Settings",
+}
+# resets that reboot the phone, taking it off the network for a while
+REBOOT_RESETS = ("device", "settings", "service", "service mode")
+
+
 SCREENSHOT_DIR = ROOT_DIR / "tmp"
 
 
@@ -54,11 +86,21 @@ class PhoneConnection:
         verbose=False,
         username="",
         password="",
+        settle="adaptive",
+        phone_port=80,
+        ucm: CUCM = None,
+        blind=True,
     ) -> None:
         # if not verbose:
         #     ic.disable()
         self.verbose = verbose
-        self.__stream: requests.Session = None
+        self.last_screenshot: bytes = b""
+        # * replay positions learned on identical phones instead of screenshots
+        self.blind = blind
+        # * set once the confirm key goes out, even if that request fails
+        self.reset_sent = False
+        self.nav_plans: NavPlans = get_nav_plans()
+        self.__found: dict[str, int] = {}  # positions vision found on this phone
 
         if not all((username, password)):
             self.username, self.password = get_credentials(quiet=not verbose)
@@ -66,14 +108,16 @@ class PhoneConnection:
             self.username = username
             self.password = password
         self.device_ip = phone_ip
-        self.ucm: CUCM = CUCM(self.username, self.password, cucm_url, port=port)
+        self.phone_port = phone_port
+        self.device_url = f"http://{phone_ip}:{phone_port}"
+        if ucm is None:
+            ucm = get_cucm(self.username, self.password, cucm_url, port=port)
+        self.ucm: CUCM = ucm
 
-        if not SCREENSHOT_DIR.exists():
-            SCREENSHOT_DIR.mkdir(parents=False)
         try:
-            recv = BeautifulSoup(
-                requests.get("http://" + self.device_ip, timeout=10).text, "html.parser"
-            ).find(string=re.compile(r"^(SEP\w{12})"))
+            self.identity: DeviceIdentity = get_identity(
+                phone_ip, phone_port, timeout=10
+            )
         except requests.exceptions.ConnectionError:
             raise PhoneConnectException(f"Could not reach {self.device_ip}")
         except requests.exceptions.ConnectTimeout:
@@ -81,12 +125,12 @@ class PhoneConnection:
                 f"Connection timed out (10sec) trying to reach {self.device_ip}"
             )
 
-        if recv is None:
+        if not self.identity.name:
             raise PhoneConnectException(
                 f"Cannot get device name at {self.device_ip}. Is this a Cisco phone?"
             )
         else:
-            self.device_name = str(recv)
+            self.device_name = self.identity.name
 
         # get device model to set up XML
         # ic("getting device model")
@@ -96,21 +140,26 @@ class PhoneConnection:
                 f"Cisco {self.device_model} is not yet supported by this program."
             )
 
+        try:
+            get_inventory().record_ip(
+                self.device_name, self.device_ip, self.device_model
+            )
+        except sqlite3.Error:
+            pass  # * the inventory is only a lookup aid
+
         self.xml: XMLPhone = XMLPhone(
-            phone_ip, self.username, self.password, self.device_model
+            phone_ip,
+            self.username,
+            self.password,
+            self.device_model,
+            settle=settle,
+            port=phone_port,
         )
 
         # add device to user's controlled devices, unless already there
-        # ic("pulling user's admin devices")
-        self.admin_devices = self.ucm.get_user_devices(self.username)
-        if self.device_name not in self.admin_devices:
-            self.ucm.update_user_devices(
-                self.username, self.admin_devices + [self.device_name]
-            )
-            self.cleanup = True
-        else:
-            self.cleanup = False
-        # ic("init done")
+        self.associations = get_association_manager(self.ucm, self.username)
+        self.associations.acquire(self.device_name)
+        self.cleanup = True
 
     def __enter__(self):
         return self
@@ -119,11 +168,14 @@ class PhoneConnection:
         self.close()
 
     def close(self):
-        if self.cleanup:
-            print("Removing used device from admin profile...")
-            self.ucm.update_user_devices(self.username, self.admin_devices)
+        try:
+            if self.cleanup:
+                self.cleanup = False
+                self.associations.release(self.device_name)
+        finally:
+            self.xml.close()
 
-    def _screenshot(self, append="", full_name="") -> str:
+    def _screenshot_path(self, append="", full_name="") -> str:
         filename = self.device_ip.replace(".", "-")
         if append:
             if not append.startswith("-"):
@@ -134,54 +186,67 @@ class PhoneConnection:
             filename = full_name
         if not filename.endswith(".bmp"):
             filename += ".bmp"
-        return self.xml.download_screenshot(str(SCREENSHOT_DIR / filename))
+        return str(SCREENSHOT_DIR / filename)
+
+    def _screenshot_bytes(self, append="", full_name="", save=None) -> bytes:
+        """Fetches the phone's screen without touching the disk, unless `save`
+        is set (defaults to on in verbose mode). The newest frame is also kept
+        in `last_screenshot` for anything displaying the phone's progress."""
+        data = self.xml.get_screenshot_bytes()
+        self.last_screenshot = data
+        if save is None:
+            save = self.verbose
+        if save:
+            save_screenshot(data, self._screenshot_path(append, full_name))
+        return data
 
-    def _wait_until_reachable(self) -> None:
-        while True:
-            try:
-                # print("trying...")
-                resp = requests.get(
-                    f"http://{self.device_ip}/CGI/Screenshot",
-                    auth=requests.auth.HTTPBasicAuth(self.username, self.password),
-                )
-            except requests.exceptions.ConnectionError:
-                sleep(1)
-                continue
-            else:
-                return None
+    def _screenshot(self, append="", full_name="") -> str:
+        return save_screenshot(
+            self._screenshot_bytes(save=False),
+            self._screenshot_path(append, full_name),
+        )
+
+    def _wait_until_reachable(self, timeout=UP_TIMEOUT) -> bool:
+        return MONITOR.wait_for(self.device_ip, self.phone_port, "up", timeout)
 
     def is_reachable(self) -> bool:
-        if self.__stream is None:
-            self.__stream = requests.Session()
-            self.__stream.auth = requests.auth.HTTPBasicAuth(
-                self.username, self.password
-            )
-        try:
-            recv = self.__stream.get(
-                f"http://{self.device_ip}/", stream=True, timeout=3
-            )
-        except requests.exceptions.ConnectionError:
-            return False
-        if recv.status_code != 200:
-            return False
-        else:
-            return True
+        return tcp_probe(self.device_ip, self.phone_port)
 
-    def __find_pos(self, item: str, f) -> int:
-        if self.verbose:
-            screenshot = self._screenshot(append=item.lower().replace(" ", "-"))
-        else:
-            screenshot = self._screenshot()
+    def wait_for_reboot(
+        self,
+        down_timeout=DOWN_TIMEOUT,
+        up_timeout=UP_TIMEOUT,
+        on_down: Callable[[ReachabilityEvent], None] = None,
+    ) -> bool:
+        """Blocks until the phone has dropped off the network and come back.
+
+        Returns:
+            bool: False if the phone wasn't back within `up_timeout` seconds
+        """
+        return MONITOR.wait_for_reboot(
+            self.device_ip, self.phone_port, down_timeout, up_timeout, on_down
+        )
+
+    def __find_pos(self, item: str, f, screenshot: np.ndarray = None) -> int:
+        if screenshot is None:
+            screenshot = decode_image(
+                self._screenshot_bytes(append=item.lower().replace(" ", "-"))
+            )
         pos = f(item, self.device_model, screenshot)
         if pos == -1:
             raise PhoneNavError(f"Cannot find {item}")
+        self.__found[item] = pos
         return pos
 
-    def _find_menu_pos(self, menu_item: str) -> int:
-        return self.__find_pos(menu_item, get_menu_position)
+    def _find_menu_pos(self, menu_item: str, screenshot: np.ndarray = None) -> int:
+        return self.__find_pos(menu_item, get_menu_position, screenshot)
 
-    def _find_list_pos(self, list_item: str) -> int:
-        return self.__find_pos(list_item, get_list_position)
+    def _find_list_pos(self, list_item: str, screenshot: np.ndarray = None) -> int:
+        return self.__find_pos(
+            list_item,
+            partial(get_list_position, device=self.device_name),
+            screenshot,
+        )
 
     def _goto_menu_item(self, menu_item: str) -> None:
         self.xml.send_key(f"KeyPad{self._find_menu_pos(menu_item)}")
@@ -189,11 +254,20 @@ class PhoneConnection:
     def _goto_list_item(self, list_item: str) -> None:
         self.xml.send_key(f"KeyPad{self._find_list_pos(list_item)}")
 
+    def _screen_state(self) -> Tuple[str, np.ndarray]:
+        """What the phone is showing (one of vision.SCREEN_STATES), along with
+        the screenshot it was read from."""
+        screenshot = decode_image(self._screenshot_bytes(append="state"))
+        return (
+            classify_screen(self.device_model, screenshot, device=self.device_name),
+            screenshot,
+        )
+
     def _to_home(self) -> None:
         print("Navigating back to home menu... ", end="", flush=True)
         self.xml.send_keys(["NavBack"] * 6)
         if self.verbose:
-            self._screenshot("-home")
+            self._screenshot_bytes("-home")
         print("done")
 
     def _to_applications(self, menu="") -> None:
@@ -201,7 +275,7 @@ class PhoneConnection:
         print("Opening applications... ", end="", flush=True)
         self.xml.send_key("Applications")
         if self.verbose:
-            self._screenshot("-applications")
+            self._screenshot_bytes("-applications")
         print("done")
         if menu:
             print(f"Navigating to {menu} menu... ", end="", flush=True)
@@ -210,46 +284,104 @@ class PhoneConnection:
             #     self._screenshot(f"-{menu}-menu")
             print("done")
 
-    def _to_admin_settings_menu(self) -> None:
-        self._to_applications()
+    def _to_admin_settings_menu(
+        self, state="unknown", screenshot: np.ndarray = None
+    ) -> None:
+        """
+        Args:
+            state (str, optional): Screen the phone is on, with the `screenshot`
+            it was read from. Defaults to "unknown", going through home.
+        """
+        if state == "admin_settings":
+            return
+        if state != "applications":
+            self._to_applications()
+            screenshot = None
         print("Opening admin settings menu... ", end="", flush=True)
         if self.verbose:
             print("")
 
-        self.xml.send_key(f"KeyPad{self._find_menu_pos('Admin Settings')}")
+        self.xml.send_key(f"KeyPad{self._find_menu_pos('Admin Settings', screenshot)}")
         # if self.verbose:
         #     self._screenshot("-admin-settings")
         print("done")
 
     def _to_reset_settings_menu(self) -> None:
-        self._to_admin_settings_menu()
+        state, screenshot = self._screen_state()
+        if state == "confirm":
+            # * back out of the dialog to the list that opened it
+            self.xml.send_key("NavBack")
+            state, screenshot = self._screen_state()
+        if state == "reset_settings":
+            return
+        if state != "admin_settings":
+            self._to_admin_settings_menu(state, screenshot)
+            screenshot = None
         print("Opening reset menu... ", end="", flush=True)
         if self.verbose:
             print("")
 
-        self.xml.send_key(f"KeyPad{self._find_list_pos('Reset Settings')}")
+        self.xml.send_key(f"KeyPad{self._find_list_pos('Reset Settings', screenshot)}")
         if self.verbose:
-            self._screenshot("-reset-settings")
+            self._screenshot_bytes("-reset-settings")
         print("done")
 
+    def __phone_plans(self) -> PhonePlans:
+        """Nav plans for this phone, with the font size as known right now."""
+        return PhonePlans(
+            self.nav_plans,
+            self.device_model,
+            self.identity.firmware,
+            get_font_memory().get(self.device_name),
+        )
+
+    def _replay_nav_plan(self, list_item: str) -> bool:
+        """Selects `list_item` in Reset Settings using positions learned on an
+        identical phone. Every key up to Reset Settings goes in one batch, and
+        one screenshot checks the list is there with the item where the plan
+        says before it's pressed.
+
+        Returns:
+            bool: False if there was no plan or it didn't check out, leaving
+            navigation to vision
+        """
+        if not self.blind or (replay := self.__phone_plans().replay(list_item)) is None:
+            return False
+
+        print("Replaying saved navigation... ", end="", flush=True)
+        self.xml.send_keys(replay.keys)
+        screenshot = decode_image(self._screenshot_bytes(append="plan"))
+        state = classify_screen(self.device_model, screenshot, device=self.device_name)
+        position = None
+        if state == "reset_settings":
+            try:
+                position = self._find_list_pos(list_item, screenshot)
+            except Exception:
+                pass  # * item isn't in the list where the plan expects it
+        if not self.__phone_plans().check(replay, state, position):
+            print("no match, navigating with vision")
+            return False
+
+        self.xml.send_key(f"KeyPad{replay.position}")
+        print("done")
+        return True
+
     def send_reset(self, reset_type: str, dry_run=False) -> None:
         reset_type = reset_type.lower()
-        reset_commands = {
-            "device": "Reset Device",
-            "settings": "All Settings",
-            "network": "Network Settings",
-            "service": "Service Mode",
-            "service mode": "Service Mode",
-            "security": "Security Settings",
-        }
+        reset_commands = RESET_COMMANDS
         if reset_type not in reset_commands:
             raise ResetException(f"{reset_type} is not a valid reset type")
 
-        self._to_reset_settings_menu()
+        list_item = reset_commands[reset_type]
+        if self._replay_nav_plan(list_item):
+            print(f"Sending {reset_type.title()} reset... ", end="", flush=True)
+        else:
+            self._to_reset_settings_menu()
 
-        print(f"Sending {reset_type.title()} reset... ", end="", flush=True)
-        self._goto_list_item(reset_commands[reset_type])
-        self._screenshot()
+            print(f"Sending {reset_type.title()} reset... ", end="", flush=True)
+            self._goto_list_item(list_item)
+            self.__phone_plans().record(list_item, self.__found)
+        self._screenshot_bytes("-reset-select")
         # if self.verbose:
         # self._screenshot("-reset-select")
 
@@ -258,6 +390,7 @@ class PhoneConnection:
             sleep(1)
             self._to_home()
         else:
+            self.reset_sent = True
             self.xml.send_key(RESET_CONFIRM_BUTTON[self.device_model])
             print("done")
             if reset_type in ["security"]:
@@ -266,8 +399,7 @@ class PhoneConnection:
                 print("done")
                 if self.verbose:
                     sleep(10)
-                    self._screenshot()
-                    self._screenshot("-finished-home")
+                    self._screenshot_bytes("-finished-home")
             # elif reset_type == "network":
             #     self._wait_until_reachable()
 
@@ -298,13 +430,15 @@ class PhoneConnection:
                 self._goto_menu_item("Settings")
                 print(f"Setting font size to {sizes[fontsize]}... ", end="", flush=True)
                 self.xml.send_keys(["KeyPad5", f"KeyPad{fontsize}", "Soft2"])
+                get_font_memory().remember(self.device_name, sizes[fontsize])
                 self._screenshot()
                 print("done")
                 return sizes[fontsize]
 
         while (input_keys := input("-> ")) != "":
             cmds: list[str] = replace_key_shortcuts(
-                input_keys.replace(",", " ").replace("  ", " ").split(" ")
+                input_keys.replace(",", " ").replace("  ", " ").split(" "),
+                self.device_model,
             )
             if cmds == ["screenshot"]:
                 self._screenshot()
@@ -342,25 +476,3 @@ class PhoneConnection:
 
     def get_phone_dn(self) -> str:
         return self.ucm.get_phone_main_line(self.device_name)
-
-
-def replace_key_shortcuts(key_list: list[str]) -> list[str]:
-    shortcuts: dict = {
-        "down": "NavDwn",
-        "up": "NavUp",
-        "left": "NavLeft",
-        "right": "NavRight",
-        "select": "NavSelect",
-        "back": "NavBack",
-        "apps": "Applications",
-    }
-
-    correct_list: list[str] = []
-    for key in key_list:
-        if key in shortcuts:
-            correct_list.append(shortcuts[key])
-        elif key.isnumeric() and len(key) == 1:
-            correct_list.append(f"KeyPad{key}")
-        else:
-            correct_list.append(key)
-    return correct_list
@@ -0,0 +1,308 @@
+from ciscoreset.axl import CUCM, get_cucm
+from ciscoreset.associations import AssociationManager, get_association_manager
+from ciscoreset.credentials import get_credentials
+from ciscoreset.xml_async import AsyncXMLPhone, create_client_session
+from ciscoreset.xml import save_screenshot
+from ciscoreset.inventory import get_inventory
+from ciscoreset.navplan import NavPlans, PhonePlans, get_nav_plans
+from ciscoreset.vision import (
+    get_font_memory,
+    classify_screen,
+    get_list_position,
+    get_menu_position,
+    decode_image,
+)
+from ciscoreset.phone import (
+    SUPPORTED_PHONE_MODELS,
+    RESET_CONFIRM_BUTTON,
+    RESET_COMMANDS,
+    SCREENSHOT_DIR,
+)
+from ciscoreset.identity import (
+    DeviceIdentity,
+    IdentityScanner,
+    IDENTITY_CACHE,
+    CHUNK_SIZE,
+)
+from ciscoreset.reachability import (
+    DOWN_TIMEOUT,
+    UP_TIMEOUT,
+    async_tcp_probe,
+    async_wait_for,
+)
+from ciscoreset.exceptions import *
+import aiohttp
+import asyncio
+import sqlite3
+import numpy as np
+from functools import partial
+from typing import Tuple
+
+
+class AsyncPhoneConnection:
+    """Asyncio counterpart to PhoneConnection.
+
+    Phone traffic is awaited on the event loop, while AXL and vision work
+    (both blocking) are handed to worker threads. Nothing is contacted until
+    `connect()` is awaited, or the object is used with `async with`.
+    """
+
+    def __init__(
+        self,
+        phone_ip: str,
+        cucm_url: str,
+        port="8443",
+        verbose=False,
+        username="",
+        password="",
+        session: aiohttp.ClientSession = None,
+        limit: asyncio.Semaphore = None,
+        phone_port=80,
+        ucm: CUCM = None,
+        blind=True,
+    ) -> None:
+        self.verbose = verbose
+        self.blind = blind
+        # * set once the confirm key goes out, even if that request fails
+        self.reset_sent = False
+        self.nav_plans: NavPlans = get_nav_plans()
+        self.__found: dict[str, int] = {}
+        self.device_ip = phone_ip
+        self.phone_port = phone_port
+        self.device_url = f"http://{phone_ip}:{phone_port}"
+        self.cucm_url = cucm_url
+        self.port = port
+        self.username = username
+        self.password = password
+        self.__owns_session = session is None
+        self.__session = session
+        self.__limit = limit
+
+        self.ucm: CUCM = ucm
+        self.xml: AsyncXMLPhone = None
+        self.device_name = ""
+        self.device_model = ""
+        self.associations: AssociationManager = None
+        self.cleanup = False
+        self.last_screenshot: bytes = b""
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def connect(self) -> None:
+        if not all((self.username, self.password)):
+            self.username, self.password = get_credentials(quiet=not self.verbose)
+        if self.ucm is None:
+            self.ucm = await asyncio.to_thread(
+                get_cucm, self.username, self.password, self.cucm_url, port=self.port
+            )
+
+        try:
+            self.identity = await self.__get_identity(timeout=10)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            raise PhoneConnectException(f"Could not reach {self.device_ip}")
+
+        if not self.identity.name:
+            raise PhoneConnectException(
+                f"Cannot get device name at {self.device_ip}. Is this a Cisco phone?"
+            )
+        self.device_name = self.identity.name
+
+        self.device_model = await asyncio.to_thread(
+            self.ucm.get_phone_model, self.device_name
+        )
+        if self.device_model not in SUPPORTED_PHONE_MODELS:
+            raise UnsupportedDeviceError(
+                f"Cisco {self.device_model} is not yet supported by this program."
+            )
+
+        try:
+            await asyncio.to_thread(
+                get_inventory().record_ip,
+                self.device_name,
+                self.device_ip,
+                self.device_model,
+            )
+        except sqlite3.Error:
+            pass  # * the inventory is only a lookup aid
+
+        self.xml = AsyncXMLPhone(
+            self.device_ip,
+            self.username,
+            self.password,
+            self.device_model,
+            session=self.session,
+            limit=self.__limit,
+            port=self.phone_port,
+        )
+
+        # add device to user's controlled devices, unless already there
+        self.associations = get_association_manager(self.ucm, self.username)
+        await asyncio.to_thread(self.associations.acquire, self.device_name)
+        self.cleanup = True
+
+    async def close(self) -> None:
+        try:
+            if self.cleanup:
+                self.cleanup = False
+                await asyncio.to_thread(self.associations.release, self.device_name)
+        finally:
+            if self.__owns_session and self.__session is not None:
+                await self.__session.close()
+                self.__session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self.__session is None:
+            self.__session = create_client_session()
+        return self.__session
+
+    async def __get_identity(self, timeout=10) -> DeviceIdentity:
+        address = f"{self.device_ip}:{self.phone_port}"
+        if (identity := IDENTITY_CACHE.get(address)) is not None:
+            return identity
+
+        scanner = IdentityScanner()
+        async with self.session.get(
+            f"{self.device_url}/",
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        ) as resp:
+            async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                if scanner.feed(chunk):
+                    break
+        if (identity := scanner.identity).name:
+            IDENTITY_CACHE.put(address, identity)
+        return identity
+
+    async def is_reachable(self) -> bool:
+        return await async_tcp_probe(self.device_ip, self.phone_port)
+
+    async def wait_until_reachable(self, timeout=UP_TIMEOUT) -> bool:
+        event = await async_wait_for(self.device_ip, self.phone_port, "up", timeout)
+        return event.kind == "up"
+
+    async def wait_for_reboot(
+        self, down_timeout=DOWN_TIMEOUT, up_timeout=UP_TIMEOUT
+    ) -> bool:
+        """Awaits the phone dropping off the network and coming back."""
+        await async_wait_for(self.device_ip, self.phone_port, "down", down_timeout)
+        return await self.wait_until_reachable(up_timeout)
+
+    async def _screenshot_bytes(self, append="") -> bytes:
+        data = await self.xml.get_screenshot_bytes()
+        self.last_screenshot = data
+        if self.verbose:
+            filename = self.device_ip.replace(".", "-")
+            if append:
+                filename += append if append.startswith("-") else "-" + append
+            save_screenshot(data, SCREENSHOT_DIR / (filename + ".bmp"))
+        return data
+
+    async def __find_pos(self, item: str, f, screenshot: np.ndarray = None) -> int:
+        if screenshot is None:
+            data = await self._screenshot_bytes(item.lower().replace(" ", "-"))
+            screenshot = decode_image(data)
+        pos = await asyncio.to_thread(f, item, self.device_model, screenshot)
+        if pos == -1:
+            raise PhoneNavError(f"Cannot find {item}")
+        self.__found[item] = pos
+        return pos
+
+    async def _goto_menu_item(self, menu_item: str, screenshot=None) -> None:
+        pos = await self.__find_pos(menu_item, get_menu_position, screenshot)
+        await self.xml.send_key(f"KeyPad{pos}")
+
+    async def _goto_list_item(self, list_item: str, screenshot=None) -> None:
+        pos = await self.__find_pos(
+            list_item, partial(get_list_position, device=self.device_name), screenshot
+        )
+        await self.xml.send_key(f"KeyPad{pos}")
+
+    async def _screen_state(self) -> Tuple[str, np.ndarray]:
+        screenshot = decode_image(await self._screenshot_bytes("state"))
+        state = await asyncio.to_thread(
+            classify_screen, self.device_model, screenshot, self.device_name
+        )
+        return state, screenshot
+
+    async def _to_home(self) -> None:
+        await self.xml.send_keys(["NavBack"] * 6)
+
+    async def _to_reset_settings_menu(self) -> None:
+        state, screenshot = await self._screen_state()
+        if state == "confirm":
+            await self.xml.send_key("NavBack")
+            state, screenshot = await self._screen_state()
+        if state == "reset_settings":
+            return
+        if state not in ("applications", "admin_settings"):
+            await self._to_home()
+            await self.xml.send_key("Applications")
+            screenshot = None
+        if state != "admin_settings":
+            await self._goto_menu_item("Admin Settings", screenshot)
+            screenshot = None
+        await self._goto_list_item("Reset Settings", screenshot)
+
+    def __phone_plans(self) -> PhonePlans:
+        return PhonePlans(
+            self.nav_plans,
+            self.device_model,
+            self.identity.firmware,
+            get_font_memory().get(self.device_name),
+        )
+
+    async def _replay_nav_plan(self, list_item: str) -> bool:
+        """Awaitable version of PhoneConnection._replay_nav_plan."""
+        if not self.blind or (replay := self.__phone_plans().replay(list_item)) is None:
+            return False
+
+        await self.xml.send_keys(replay.keys)
+        state, screenshot = await self._screen_state()
+        position = None
+        if state == "reset_settings":
+            try:
+                position = await self.__find_pos(
+                    list_item,
+                    partial(get_list_position, device=self.device_name),
+                    screenshot,
+                )
+            except Exception:
+                pass
+        if not self.__phone_plans().check(replay, state, position):
+            return False
+
+        await self.xml.send_key(f"KeyPad{replay.position}")
+        return True
+
+    async def send_reset(self, reset_type: str, dry_run=False) -> None:
+        reset_type = reset_type.lower()
+        if reset_type not in RESET_COMMANDS:
+            raise ResetException(f"{reset_type} is not a valid reset type")
+
+        list_item = RESET_COMMANDS[reset_type]
+        if not await self._replay_nav_plan(list_item):
+            await self._to_reset_settings_menu()
+            await self._goto_list_item(list_item)
+            self.__phone_plans().record(list_item, self.__found)
+        # * the confirm dialog has to be drawn before its soft key is pressed
+        await self._screenshot_bytes("-reset-select")
+
+        if dry_run:
+            await asyncio.sleep(1)
+            await self._to_home()
+        else:
+            self.reset_sent = True
+            await self.xml.send_key(RESET_CONFIRM_BUTTON[self.device_model])
+            if reset_type in ["security"]:
+                await self._to_home()
+
+    async def get_phone_desc(self) -> str:
+        return await asyncio.to_thread(self.ucm.get_phone_description, self.device_name)
+
+    async def get_phone_dn(self) -> str:
+        return await asyncio.to_thread(self.ucm.get_phone_main_line, self.device_name)
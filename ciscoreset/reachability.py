@@ -0,0 +1,277 @@
+"""Watches phones come and go off the network with cheap TCP-connect probes.
+
+A single background thread multiplexes non-blocking connects for every phone
+being watched, backing off exponentially (with jitter) between probes, so
+waiting on a reboot costs neither a worker thread nor an HTTP request per poll.
+"""
+from collections import namedtuple
+from concurrent.futures import Future
+from time import monotonic
+from typing import Callable
+import selectors
+import threading
+import asyncio
+import random
+import socket
+import errno
+
+
+ReachabilityEvent = namedtuple("ReachabilityEvent", ["ip", "port", "kind", "seconds"])
+EVENT_KINDS = ("down", "up", "timeout")
+
+PROBE_TIMEOUT = 1.0  # seconds a connect gets before the phone counts as down
+FIRST_INTERVAL = 0.25
+MAX_INTERVAL = 5.0
+DOWN_TIMEOUT = 15.0  # rebooting phones drop off the network well within this
+UP_TIMEOUT = 300.0
+
+CONNECTING = (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY)
+
+
+def tcp_probe(ip: str, port=80, timeout=PROBE_TIMEOUT) -> bool:
+    try:
+        with socket.create_connection((ip, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+async def async_tcp_probe(ip: str, port=80, timeout=PROBE_TIMEOUT) -> bool:
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    return True
+
+
+def next_interval(interval: float, max_interval=MAX_INTERVAL) -> float:
+    return min(interval * 2, max_interval) * random.uniform(0.8, 1.2)
+
+
+async def async_wait_for(
+    ip: str,
+    port=80,
+    until="up",
+    timeout=UP_TIMEOUT,
+    first_interval=FIRST_INTERVAL,
+    max_interval=MAX_INTERVAL,
+) -> ReachabilityEvent:
+    """Awaitable version of `ReachabilityMonitor.watch`."""
+    if until not in ("down", "up"):
+        raise ValueError(f"Cannot wait for a phone to be {until}")
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    interval = first_interval
+    while (elapsed := loop.time() - start) < timeout:
+        if await async_tcp_probe(ip, port) == (until == "up"):
+            return ReachabilityEvent(ip, port, until, loop.time() - start)
+        await asyncio.sleep(min(interval, timeout - elapsed))
+        interval = next_interval(interval, max_interval)
+    return ReachabilityEvent(ip, port, "timeout", loop.time() - start)
+
+
+class Watch:
+    """One phone being waited on to reach the `until` state."""
+
+    def __init__(self, ip: str, port: int, until: str, timeout: float) -> None:
+        self.ip = ip
+        self.port = port
+        self.until = until
+        self.start = monotonic()
+        self.deadline = self.start + timeout
+        self.next_probe = self.start
+        self.interval = FIRST_INTERVAL
+        self.sock: socket.socket = None
+        self.probe_deadline = 0.0
+        self.future: Future = Future()
+
+
+class ReachabilityMonitor:
+    def __init__(
+        self,
+        first_interval=FIRST_INTERVAL,
+        max_interval=MAX_INTERVAL,
+        probe_timeout=PROBE_TIMEOUT,
+    ) -> None:
+        """Probes any number of phones from one background thread, which is
+        started on the first watch.
+
+        Args:
+            first_interval (float, optional): Seconds between the first probes
+            of a phone, doubled after every probe. Defaults to 0.25.
+
+            max_interval (float, optional): Cap on the time between probes.
+            Defaults to 5.0.
+
+            probe_timeout (float, optional): Seconds a TCP connect gets before
+            the phone counts as down. Defaults to 1.0.
+        """
+        self.first_interval = first_interval
+        self.max_interval = max_interval
+        self.probe_timeout = probe_timeout
+        self.__lock = threading.Lock()
+        self.__new: list[Watch] = []
+        self.__watches: list[Watch] = []
+        self.__selector: selectors.BaseSelector = None
+        self.__wakeup: tuple[socket.socket, socket.socket] = None
+        self.__thread: threading.Thread = None
+
+    def watch(
+        self, ip: str, port=80, until="up", timeout=UP_TIMEOUT
+    ) -> "Future[ReachabilityEvent]":
+        """Starts waiting for a phone to go "down" or come back "up".
+
+        Returns:
+            Future[ReachabilityEvent]: Resolves to an event of kind `until`,
+            or "timeout" if the phone didn't get there within `timeout` seconds
+        """
+        if until not in ("down", "up"):
+            raise ValueError(f"Cannot wait for a phone to be {until}")
+        w = Watch(ip, port, until, timeout)
+        w.interval = self.first_interval
+        with self.__lock:
+            self.__new.append(w)
+            self.__ensure_running()
+            self.__wakeup[1].send(b"\0")
+        return w.future
+
+    def wait_for(self, ip: str, port=80, until="up", timeout=UP_TIMEOUT) -> bool:
+        return self.watch(ip, port, until, timeout).result().kind == until
+
+    def watch_reboot(
+        self,
+        ip: str,
+        port=80,
+        down_timeout=DOWN_TIMEOUT,
+        up_timeout=UP_TIMEOUT,
+        on_down: Callable[[ReachabilityEvent], None] = None,
+    ) -> "Future[ReachabilityEvent]":
+        """Waits for a phone to drop off the network and then come back.
+
+        A phone that is never seen going down (it may have rebooted between
+        probes) is still waited on to be up.
+
+        Returns:
+            Future[ReachabilityEvent]: Resolves to the "up" event, or "timeout"
+        """
+        start = monotonic()
+        result: Future = Future()
+
+        def came_back(f: Future) -> None:
+            if (error := f.exception()) is not None:
+                result.set_exception(error)
+                return
+            e: ReachabilityEvent = f.result()
+            result.set_result(e._replace(seconds=monotonic() - start))
+
+        def went_down(f: Future) -> None:
+            try:
+                if on_down is not None and f.result().kind == "down":
+                    on_down(f.result())
+            finally:
+                # * a failing on_down is reported, but the phone is still waited on
+                self.watch(ip, port, "up", up_timeout).add_done_callback(came_back)
+
+        self.watch(ip, port, "down", down_timeout).add_done_callback(went_down)
+        return result
+
+    def wait_for_reboot(
+        self,
+        ip: str,
+        port=80,
+        down_timeout=DOWN_TIMEOUT,
+        up_timeout=UP_TIMEOUT,
+        on_down: Callable[[ReachabilityEvent], None] = None,
+    ) -> bool:
+        future = self.watch_reboot(ip, port, down_timeout, up_timeout, on_down)
+        return future.result().kind == "up"
+
+    def __ensure_running(self) -> None:
+        if self.__thread is not None and self.__thread.is_alive():
+            return
+        self.__selector = selectors.DefaultSelector()
+        self.__wakeup = socket.socketpair()
+        self.__wakeup[0].setblocking(False)
+        self.__selector.register(self.__wakeup[0], selectors.EVENT_READ)
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def __run(self) -> None:
+        while True:
+            with self.__lock:
+                self.__watches += self.__new
+                self.__new.clear()
+                if not self.__watches:
+                    # * nothing to do, let the next watch start a fresh thread
+                    self.__selector.close()
+                    for s in self.__wakeup:
+                        s.close()
+                    self.__thread = None
+                    return
+
+            now = monotonic()
+            for w in self.__watches.copy():
+                if now >= w.deadline:
+                    self.__finish(w, "timeout")
+                elif w.sock is None and now >= w.next_probe:
+                    self.__start_probe(w, now)
+                elif w.sock is not None and now >= w.probe_deadline:
+                    self.__probe_result(w, False)
+
+            wake_at = [w.deadline for w in self.__watches]
+            wake_at += [
+                w.probe_deadline if w.sock is not None else w.next_probe
+                for w in self.__watches
+            ]
+            wait = max(min(wake_at, default=now + 1) - monotonic(), 0)
+            for key, _ in self.__selector.select(min(wait, 1.0)):
+                if key.fileobj is self.__wakeup[0]:
+                    try:
+                        self.__wakeup[0].recv(1024)
+                    except BlockingIOError:
+                        pass
+                    continue
+                w: Watch = key.data
+                if w.sock is not None:
+                    err = w.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    self.__probe_result(w, err == 0)
+
+    def __start_probe(self, w: Watch, now: float) -> None:
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            err = sock.connect_ex((w.ip, w.port))
+        except OSError:
+            self.__probe_result(w, False)
+            return
+        if err not in CONNECTING:
+            sock.close()
+            self.__probe_result(w, False)
+            return
+        w.sock = sock
+        w.probe_deadline = now + self.probe_timeout
+        self.__selector.register(sock, selectors.EVENT_WRITE, data=w)
+
+    def __close_probe(self, w: Watch) -> None:
+        if w.sock is not None:
+            self.__selector.unregister(w.sock)
+            w.sock.close()
+            w.sock = None
+
+    def __probe_result(self, w: Watch, reachable: bool) -> None:
+        self.__close_probe(w)
+        if reachable == (w.until == "up"):
+            self.__finish(w, w.until)
+            return
+        w.next_probe = monotonic() + w.interval
+        w.interval = next_interval(w.interval, self.max_interval)
+
+    def __finish(self, w: Watch, kind: str) -> None:
+        self.__close_probe(w)
+        self.__watches.remove(w)
+        event = ReachabilityEvent(w.ip, w.port, kind, monotonic() - w.start)
+        w.future.set_result(event)
+
+
+MONITOR = ReachabilityMonitor()
@@ -0,0 +1,136 @@
+from ciscoreset.configs import USER_DIR
+from ciscoreset.jsonstore import JSONStore
+from pathlib import Path
+from time import monotonic, sleep
+from typing import Awaitable, Callable
+import asyncio
+import threading
+import atexit
+
+
+SETTLE_FILE: Path = USER_DIR / "settle_times.json"
+
+FIXED_SETTLE = 0.75  # seconds, what every screenshot used to wait
+FIRST_POLL = 0.1  # give the phone a moment to start redrawing
+POLL_INTERVAL = 0.1
+# a key that leaves the screen as it was (NavBack on home) is done after this
+UNCHANGED_SETTLE = 0.5
+DEFAULT_SETTLE_LIMIT = 2.0  # used until enough settle times are recorded
+MIN_SAMPLES = 5
+MAX_SAMPLES = 50
+SAVE_EVERY = 10  # records between writes to disk
+
+SETTLE_MODES = ("fixed", "adaptive")
+
+
+class SettleTimes(JSONStore):
+    """Observed screen settle times per phone model, saved between runs so
+    the adaptive wait limit tunes itself to each model."""
+
+    def __init__(self, path: Path = SETTLE_FILE) -> None:
+        super().__init__(path)
+        self._unsaved = 0  # * records since the last write
+
+    def record(self, model: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._data.setdefault(model, [])
+            samples.append(round(seconds, 3))
+            del samples[:-MAX_SAMPLES]
+            self._unsaved += 1
+            if self._unsaved >= SAVE_EVERY:
+                self._write()
+
+    def limit(self, model: str) -> float:
+        """Longest we should wait for `model` to settle before giving up and
+        using whatever is on screen."""
+        with self._lock:
+            samples = sorted(self._data.get(model, []))
+        if len(samples) < MIN_SAMPLES:
+            return DEFAULT_SETTLE_LIMIT
+        p90 = samples[int(len(samples) * 0.9) - 1]
+        return min(max(p90 * 1.5, FIXED_SETTLE / 2), DEFAULT_SETTLE_LIMIT)
+
+
+_settle_times: SettleTimes = None
+_settle_times_lock = threading.Lock()
+
+
+def get_settle_times() -> SettleTimes:
+    """The settle times in the user folder, loaded on first use."""
+    global _settle_times
+    with _settle_times_lock:
+        if _settle_times is None:
+            _settle_times = SettleTimes()
+            atexit.register(_settle_times.save)
+        return _settle_times
+
+
+def wait_for_settle(
+    fetch: Callable[[], bytes],
+    model: str,
+    previous: bytes = b"",
+    settle_times: SettleTimes = None,
+) -> bytes:
+    """Polls screenshots until two frames in a row match, then returns it.
+
+    Args:
+        fetch (Callable[[], bytes]): Downloads one raw screenshot
+
+        model (str): Phone model, used to look up and record settle times
+
+        previous (bytes, optional): Frame from before the last key press. Stable
+        frames identical to it only count after UNCHANGED_SETTLE seconds, since
+        the phone may not have started redrawing yet.
+
+        settle_times (SettleTimes, optional): Defaults to get_settle_times().
+
+    Returns:
+        bytes: The settled frame, or the newest one if the limit ran out
+    """
+    if settle_times is None:
+        settle_times = get_settle_times()
+    start = monotonic()
+    limit = settle_times.limit(model)
+    sleep(FIRST_POLL)
+    frame = fetch()
+    while monotonic() - start < limit:
+        sleep(POLL_INTERVAL)
+        next_frame = fetch()
+        if next_frame == frame:
+            if next_frame != previous:
+                settle_times.record(model, monotonic() - start)
+                return next_frame
+            if monotonic() - start >= UNCHANGED_SETTLE:
+                return next_frame
+        frame = next_frame
+    # * a timeout is a settle at least this slow, so the limit can grow back
+    settle_times.record(model, limit)
+    return frame
+
+
+async def async_wait_for_settle(
+    fetch: Callable[[], Awaitable[bytes]],
+    model: str,
+    previous: bytes = b"",
+    settle_times: SettleTimes = None,
+) -> bytes:
+    """Awaitable version of `wait_for_settle`."""
+    if settle_times is None:
+        settle_times = get_settle_times()
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    limit = settle_times.limit(model)
+    await asyncio.sleep(FIRST_POLL)
+    frame = await fetch()
+    while loop.time() - start < limit:
+        await asyncio.sleep(POLL_INTERVAL)
+        next_frame = await fetch()
+        if next_frame == frame:
+            if next_frame != previous:
+                settle_times.record(model, loop.time() - start)
+                return next_frame
+            if loop.time() - start >= UNCHANGED_SETTLE:
+                return next_frame
+        frame = next_frame
+    settle_times.record(model, limit)
+    return frame
@@ -0,0 +1,435 @@
+"""A stand-in for Cisco 8800 phones (and the bits of CUCM PhoneConnection
+needs) so connect, navigation and reset flows can be timed without hardware.
+
+Each SimulatedPhone serves its own web root, /CGI/Execute and /CGI/Screenshot
+on a local port. Screens are drawn from the same icon and menu images that
+`vision` matches against, so navigation runs the real matching code.
+"""
+from ciscoreset.keys import KEY_TABLES
+from ciscoreset.vision import get_template_bank
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+from html import escape
+from time import monotonic, sleep
+from typing import Tuple
+from lxml import etree
+import numpy as np
+import threading
+import cv2
+
+
+SCREEN_SIZE = (480, 800)  # rows, columns
+
+# where each applications icon sits, in KeyPad order
+APPLICATION_ICONS = (
+    "recents",
+    "running_applications",
+    "settings",
+    "accessibility",
+    "phone_information",
+    "accessories",
+    "bluetooth",
+    "admin_settings",
+)
+ICON_COLUMNS = (100, 290, 430, 560)
+ICON_ROWS = (20, 120, 250)
+
+# * a version no real phone runs, so nothing learned from a simulator applies
+SIMULATED_FIRMWARE = "simulated.88xx-0-0-0"
+
+LIST_ROWS = (60, 135, 205, 275, 345)
+LIST_LEFT = 60
+
+SCREEN_LISTS: dict = {
+    "admin_settings": (
+        "network_setup",
+        "status",
+        "aux_port",
+        "security_setup",
+        "reset_settings",
+    ),
+    "reset_settings": (
+        "all_settings",
+        "reset_device",
+        "network_settings",
+        "service_mode",
+        "security_settings",
+    ),
+}
+
+# resets that reboot the phone, taking it off the network for a while
+REBOOT_RESETS = ("all_settings", "reset_device", "service_mode")
+
+FONT_SIZES = ("tiny", "small", "regular", "large", "huge")
+
+
+def load_assets(model: str, font: str) -> Tuple[dict, dict]:
+    bank = get_template_bank(model)
+    icons = {name: t.color for name, t in bank.icons.items()}
+    labels = {
+        name: variants[font].color
+        for name, variants in bank.labels.items()
+        if font in variants
+    }
+    return icons, labels
+
+
+def blank_screen(shade=235) -> np.ndarray:
+    return np.full((*SCREEN_SIZE, 3), shade, dtype=np.uint8)
+
+
+def paste(screen: np.ndarray, img: np.ndarray, x: int, y: int) -> None:
+    h, w = img.shape[:2]
+    screen[y : y + h, x : x + w] = img
+
+
+class PhoneState:
+    """Menu state machine of a single phone. Keys move between screens,
+    and `render` draws the current one."""
+
+    def __init__(self, name: str, model: str, font: str) -> None:
+        self.name = name
+        self.model = model
+        self.icons, self.labels = load_assets(model, font)
+        self.screen = "home"
+        self.selected = ""
+        self.resets: list[str] = []
+        self.keys: list[str] = []  # every key pressed, in order
+        self.lock = threading.Lock()
+
+    def press(self, key: str) -> str:
+        """Applies a key, returning what happened to the phone
+        ("" normally, or the reset item that was confirmed)."""
+        with self.lock:
+            self.keys.append(key)
+            if key == "NavBack":
+                self.screen = {
+                    "applications": "home",
+                    "admin_settings": "applications",
+                    "reset_settings": "admin_settings",
+                    "confirm": "reset_settings",
+                }.get(self.screen, "home")
+            elif key == "Applications":
+                self.screen = "applications"
+            elif key.startswith("KeyPad") and key[6:].isnumeric():
+                self.__select(int(key[6:]))
+            elif key == "Soft3" and self.screen == "confirm":
+                self.resets.append(self.selected)
+                self.screen = "home"
+                return self.selected
+            return ""
+
+    def __select(self, pos: int) -> None:
+        if self.screen == "applications" and 0 < pos <= len(APPLICATION_ICONS):
+            if APPLICATION_ICONS[pos - 1] == "admin_settings":
+                self.screen = "admin_settings"
+        elif self.screen in SCREEN_LISTS and 0 < pos <= 5:
+            item = SCREEN_LISTS[self.screen][pos - 1]
+            if item == "reset_settings":
+                self.screen = "reset_settings"
+            elif self.screen == "reset_settings":
+                self.selected = item
+                self.screen = "confirm"
+
+    def render(self) -> np.ndarray:
+        with self.lock:
+            screen_name, selected = self.screen, self.selected
+
+        if screen_name == "applications":
+            screen = blank_screen()
+            for i, icon in enumerate(APPLICATION_ICONS):
+                x = ICON_COLUMNS[i % 4]
+                y = ICON_ROWS[i // 4]
+                paste(screen, self.icons[icon], x, y)
+        elif screen_name in SCREEN_LISTS or screen_name == "confirm":
+            screen = blank_screen()
+            items = SCREEN_LISTS.get(screen_name, SCREEN_LISTS["reset_settings"])
+            for y, item in zip(LIST_ROWS, items):
+                paste(screen, self.labels[item], LIST_LEFT, y)
+            if screen_name == "confirm":
+                screen //= 2  # dimmed behind the dialog
+                cv2.rectangle(screen, (150, 140), (650, 340), (250, 250, 250), -1)
+                cv2.putText(
+                    screen,
+                    selected.replace("_", " ").title() + "?",
+                    (190, 250),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    1,
+                    (30, 30, 30),
+                    2,
+                )
+        else:
+            screen = blank_screen(200)
+            cv2.putText(
+                screen,
+                self.name,
+                (40, 60),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                1,
+                (30, 30, 30),
+                2,
+            )
+        return screen
+
+
+def execute_response(commands: list[str], valid_keys: frozenset) -> bytes:
+    root = etree.Element("CiscoIPPhoneResponse")
+    for url in commands:
+        key = url.removeprefix("Key:")
+        ok = not url.startswith("Key:") or key in valid_keys
+        etree.SubElement(
+            root,
+            "ResponseItem",
+            URL=url,
+            Data="" if ok else "Invalid key",
+            Status="0" if ok else "6",
+        )
+    return etree.tostring(root, xml_declaration=True, encoding="UTF-8")
+
+
+def error_response(number: str) -> bytes:
+    return etree.tostring(
+        etree.Element("CiscoIPPhoneError", Number=number),
+        xml_declaration=True,
+        encoding="UTF-8",
+    )
+
+
+class SimulatedPhone:
+    def __init__(
+        self,
+        name="SEP001122334455",
+        model="8841",
+        font="regular",
+        latency=0.0,
+        redraw=0.0,
+        reboot=5.0,
+        serial="FCH0000A000",
+        firmware=SIMULATED_FIRMWARE,
+        ip="127.0.0.1",
+        port=0,
+    ) -> None:
+        """A phone listening on a loopback address, at a free port unless given.
+
+        Args:
+            ip (str, optional): Any 127.x.x.x address, so phones can share a
+            port like real ones. Defaults to 127.0.0.1.
+
+            latency (float, optional): Seconds added to every request. Defaults to 0.
+
+            redraw (float, optional): Seconds after a key press that the old
+            screen is still served. Defaults to 0.
+
+            reboot (float, optional): Seconds a rebooting reset keeps the phone
+            off the network (its port stops accepting connections). Defaults to 5.
+        """
+        self.name = name
+        self.model = model
+        self.serial = serial
+        self.firmware = firmware
+        self.latency = latency
+        self.redraw = redraw
+        self.reboot = reboot
+        self.state = PhoneState(name, model, font)
+        self.requests = 0
+        self.history: list[str] = []  # keys pressed and screenshots served, in order
+        self.__valid_keys = KEY_TABLES[model].valid
+        self.__frame = self.__encode()
+        self.__frame_ready = 0.0
+        self.__offline_until = 0.0
+        self.__server: ThreadingHTTPServer = None
+        self.__thread: threading.Thread = None
+        self.__ip = ip
+        self.__port = port
+        self.__server_lock = threading.Lock()
+
+    @property
+    def ip(self) -> str:
+        return self.__ip
+
+    @property
+    def port(self) -> int:
+        return self.__port
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.ip}:{self.port}"
+
+    @property
+    def offline(self) -> bool:
+        return monotonic() < self.__offline_until
+
+    def go_offline(self, seconds: float) -> None:
+        """Drops every request for a while, like a phone that lost its link."""
+        self.__offline_until = monotonic() + seconds
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self) -> None:
+        with self.__server_lock:
+            self.__listen()
+            self.__port = self.__server.server_address[1]
+
+    def stop(self) -> None:
+        with self.__server_lock:
+            self.__port = 0
+            self.__close()
+
+    def __listen(self) -> None:
+        self.__server = ThreadingHTTPServer((self.ip, self.__port), self.__handler())
+        self.__server.daemon_threads = True
+        self.__thread = threading.Thread(target=self.__server.serve_forever)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def __close(self) -> None:
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+
+    def __reboot(self) -> None:
+        """Takes the phone off the network until the reboot is over, then
+        listens on the same port again."""
+        with self.__server_lock:
+            self.__close()
+        sleep(max(self.__offline_until - monotonic(), 0))
+        with self.__server_lock:
+            if self.__port and self.__server is None:
+                self.__listen()
+
+    def __encode(self) -> bytes:
+        return cv2.imencode(".bmp", self.state.render())[1].tobytes()
+
+    def web_root(self) -> bytes:
+        rows = [
+            ("Host name", self.name),
+            ("Serial number", self.serial),
+            ("Model number", f"CP-{self.model}"),
+            ("Version", self.firmware),
+        ]
+        cells = "".join(
+            f"<tr><td><b>{escape(k)}</b></td><td><b>{escape(v)}</b></td></tr>"
+            for k, v in rows
+        )
+        return (
+            "<html><head><title>Cisco Systems, Inc.</title></head><body>"
+            f"<table>{cells}</table></body></html>"
+        ).encode()
+
+    def screenshot(self) -> bytes:
+        if monotonic() < self.__frame_ready:
+            return self.__frame  # still showing the screen from before the key
+        self.__frame = self.__encode()
+        return self.__frame
+
+    def execute(self, xml: str) -> bytes:
+        try:
+            document = etree.fromstring(xml.encode())
+        except etree.XMLSyntaxError:
+            return error_response("1")
+        commands = [e.get("URL", "") for e in document.findall("ExecuteItem")]
+
+        previous = self.screenshot()
+        for url in commands:
+            key = url.removeprefix("Key:")
+            if url.startswith("Key:") and key in self.__valid_keys:
+                self.history.append(key)
+                if self.state.press(key) in REBOOT_RESETS:
+                    self.__offline_until = monotonic() + self.reboot
+                    threading.Thread(target=self.__reboot, daemon=True).start()
+        self.__frame = previous
+        self.__frame_ready = monotonic() + self.redraw
+        return execute_response(commands, self.__valid_keys)
+
+    def __handler(self):
+        phone = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args) -> None:
+                pass
+
+            def __reply(self, content_type: str, body: bytes) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def __start(self) -> bool:
+                phone.requests += 1
+                if phone.latency:
+                    sleep(phone.latency)
+                if phone.offline:
+                    # * drop the connection like a rebooting phone would
+                    self.close_connection = True
+                    return False
+                return True
+
+            def do_GET(self) -> None:
+                if not self.__start():
+                    return
+                if self.path.startswith("/CGI/Screenshot"):
+                    phone.history.append("Screenshot")
+                    self.__reply("image/bmp", phone.screenshot())
+                else:
+                    self.__reply("text/html", phone.web_root())
+
+            def do_POST(self) -> None:
+                if not self.__start():
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                form = parse_qs(self.rfile.read(length).decode())
+                if self.path.startswith("/CGI/Execute") and "XML" in form:
+                    body = phone.execute(form["XML"][0])
+                else:
+                    body = error_response("1")
+                self.__reply("text/xml", body)
+
+        Handler.protocol_version = "HTTP/1.1"  # keep-alive, like the phones
+        return Handler
+
+
+class SimulatedCUCM:
+    """Answers the AXL lookups PhoneConnection makes, for simulated phones."""
+
+    def __init__(self, phones: list[SimulatedPhone], admin_devices: list = None):
+        self.phones = {p.name: p for p in phones}
+        self.admin_devices: list = list(admin_devices or [])
+        self.calls = 0
+        self.__lock = threading.Lock()
+
+    def __phone(self, name: str) -> SimulatedPhone:
+        with self.__lock:
+            self.calls += 1
+        if name not in self.phones:
+            raise Exception(f"No phone found with name {name}")
+        return self.phones[name]
+
+    def get_phone_model(self, name: str) -> str:
+        return self.__phone(name).model
+
+    def get_phone_description(self, name: str) -> str:
+        return f"Simulated {self.__phone(name).model}"
+
+    def get_phone_main_line(self, name: str) -> str:
+        return "9" + self.__phone(name).name[-6:]
+
+    def get_user_devices(self, userid: str) -> list:
+        with self.__lock:
+            self.calls += 1
+            return list(self.admin_devices)
+
+    def update_user_devices(self, userid: str, devices: list) -> None:
+        with self.__lock:
+            self.calls += 1
+            self.admin_devices = list(devices)
+
+
+def simulated_fleet(count: int, **kwargs) -> list[SimulatedPhone]:
+    return [SimulatedPhone(name=f"SEP{i:012X}", **kwargs) for i in range(count)]
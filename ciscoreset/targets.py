@@ -0,0 +1,138 @@
+"""Turns target expressions into the device names a bulk operation should hit.
+
+An expression is one or more terms separated by commas or spaces. Devices
+from every term are combined, and a term starting with "!" removes its
+devices instead:
+
+    pool:Main-DP                    phones in a device pool
+    dn:5xxx@Phones-PT               devices on DNs matching 5xxx ("X"/"x" for
+                                    any digit) in a partition ("@" alone for
+                                    none), or in any of CUCM.dn_partitions
+                                    without "@"
+    lg:Front-Desk-LG                devices on a line group's member DNs
+    user:jdoe                       devices associated to a user
+    name:SEP0011*                   device names ("*" for anything)
+
+    pool:Main-DP !lg:Front-Desk-LG  every phone in Main-DP not on the group
+"""
+from ciscoreset.axl import CUCM
+from typing import Callable
+import threading
+import re
+
+
+SELECTOR_KINDS = ("pool", "dn", "lg", "user", "name")
+r_term = re.compile(r"^(!?)(\w+):(.+)$")
+
+
+class TargetSelectorError(Exception):
+    pass
+
+
+def dn_regex(pattern: str) -> re.Pattern:
+    return re.compile(
+        "^" + "".join(r"\d" if c in "xX" else re.escape(c) for c in pattern) + "$"
+    )
+
+
+def split_terms(expression: str) -> list[str]:
+    return [t for t in re.split(r"[\s,]+", expression.strip()) if t]
+
+
+class TargetSelector:
+    def __init__(self, ucm: CUCM) -> None:
+        """Expands target expressions against CUCM. Every lookup is cached for
+        the life of the selector, so repeated or overlapping terms are free."""
+        self.ucm = ucm
+        self.__cache: dict[tuple[str, str], list[str]] = {}
+        self.__line_groups: dict = None
+        self.__lock = threading.Lock()
+        self.__resolvers: dict[str, Callable[[str], list[str]]] = {
+            "pool": self.__pool,
+            "dn": self.__dn,
+            "lg": self.__line_group,
+            "user": self.__user,
+            "name": self.__name,
+        }
+
+    def select(self, expression: str) -> list[str]:
+        """Device names matched by `expression`, in the order first found
+        and without repeats.
+
+        Raises:
+            TargetSelectorError: A term couldn't be understood
+        """
+        included: dict[str, None] = {}
+        excluded: set[str] = set()
+        for term in split_terms(expression):
+            if (match := r_term.match(term)) is None:
+                raise TargetSelectorError(f'"{term}" is not a "kind:value" term')
+            negate, kind, value = match.groups()
+            if (kind := kind.lower()) not in SELECTOR_KINDS:
+                raise TargetSelectorError(
+                    f"Unknown selector {kind}, expected one of "
+                    + ", ".join(SELECTOR_KINDS)
+                )
+            devices = self.__lookup(kind, value)
+            if negate:
+                excluded.update(devices)
+            else:
+                included.update(dict.fromkeys(devices))
+        return [d for d in included if d not in excluded]
+
+    def __lookup(self, kind: str, value: str) -> list[str]:
+        key = (kind, value)
+        with self.__lock:
+            if key in self.__cache:
+                return self.__cache[key]
+        devices = self.__resolvers[kind](value)
+        with self.__lock:
+            self.__cache[key] = devices
+        return devices
+
+    def __pool(self, pool: str) -> list[str]:
+        return [p.name for p in self.ucm.iter_phones(device_pool=pool)]
+
+    def __name(self, pattern: str) -> list[str]:
+        return [p.name for p in self.ucm.iter_phones(name=pattern.replace("*", "%"))]
+
+    def __user(self, userid: str) -> list[str]:
+        return list(self.ucm.get_user_devices(userid) or [])
+
+    def __dn(self, term: str) -> list[str]:
+        pattern, at, partition = term.partition("@")
+        partition = partition if at else None  # * "5001@" is the null partition
+        index = self.ucm.get_dn_index()
+        if partition is not None and not index.covers(partition):
+            if re.search("[xX]", pattern):
+                raise TargetSelectorError(
+                    "Wildcard DNs only work in indexed partitions"
+                    f" ({', '.join(index.partitions)})"
+                )
+            return self.ucm.get_dn_devices(pattern, partition)
+
+        r_dn = dn_regex(pattern)
+        devices: list[str] = []
+        for dn in index.patterns():
+            if not r_dn.match(dn):
+                continue
+            for p in [partition] if partition is not None else index.partitions_of(dn):
+                devices += index.devices(dn, p)
+        return devices
+
+    def __line_group(self, name: str) -> list[str]:
+        with self.__lock:
+            if self.__line_groups is None:
+                # * every group in one go, the next lg: term is a dict hit
+                self.__line_groups = self.ucm.get_all_line_group_members()
+            line_groups = self.__line_groups
+        if name not in line_groups:
+            raise TargetSelectorError(f"No line group named {name}")
+        index = self.ucm.get_dn_index()
+        devices: list[str] = []
+        for pattern, partition in line_groups[name]:
+            if index.covers(partition):
+                devices += index.devices(pattern, partition)
+            else:
+                devices += self.ucm.get_dn_devices(pattern, partition)
+        return devices
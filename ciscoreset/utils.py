@@ -1,6 +1,7 @@
 import PIL.Image
 from PIL import ImageFile
 import io
+import numpy as np
 import base64
 import ctypes
 import platform
@@ -27,8 +28,8 @@ def image_to_base64(file_or_bytes, resize=None):
     """
     Will convert into bytes and optionally resize an image that is a file or a base64 bytes object.
     Turns into  PNG format in the process so that can be displayed by tkinter
-    :param file_or_bytes: either a string filename or a bytes base64 image object
-    :type file_or_bytes:  (Union[str, bytes])
+    :param file_or_bytes: either a string filename, a bytes (raw or base64) image object or a decoded image array
+    :type file_or_bytes:  (Union[str, bytes, np.ndarray])
     :param resize:  optional new size
     :type resize: (Tuple[int, int] or None)
     :return: (bytes) a byte-string object
@@ -36,6 +37,12 @@ def image_to_base64(file_or_bytes, resize=None):
     """
     if isinstance(file_or_bytes, str):
         img = PIL.Image.open(file_or_bytes)
+    elif isinstance(file_or_bytes, np.ndarray):
+        # decoded by opencv, so channels are BGR
+        img = PIL.Image.fromarray(file_or_bytes[..., ::-1])
+    elif file_or_bytes[:2] == b"BM":
+        # raw screenshot straight from the phone
+        img = PIL.Image.open(io.BytesIO(file_or_bytes))
     else:
         try:
             img = PIL.Image.open(io.BytesIO(base64.b64decode(file_or_bytes)))
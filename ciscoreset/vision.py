@@ -1,55 +1,210 @@
-from ciscoreset.configs import ROOT_DIR
+from ciscoreset.configs import ROOT_DIR, USER_DIR
+from ciscoreset.jsonstore import JSONStore
 from cv2 import (
     imread,
+    imdecode,
     cvtColor,
     Canny,
+    pyrDown,
     minMaxLoc,
     matchTemplate,
     TM_CCOEFF_NORMED,
     COLOR_BGR2GRAY,
+    IMREAD_COLOR,
 )
 import numpy as np
 from pathlib import Path
-from typing import Any, Tuple
+from types import MappingProxyType
+from typing import Any, Iterable, Mapping, Tuple, Union
 from collections import namedtuple
+import threading
+import atexit
 
 # from icecream import ic
 
 
 ICONS_DIR: Path = ROOT_DIR / "icons"
 MENUS_DIR: Path = ROOT_DIR / "menus"
+FONT_SIZES_FILE: Path = USER_DIR / "font_sizes.json"
 
+# a label this well matched is the phone's font size, no need to try the rest
+# (the right font scores ~1.0 on a clean screen, the wrong ones under 0.6)
+FONT_CONFIDENCE = 0.75
+ICON_CONFIDENCE = 0.8  # colour match of an icon that is really on screen
+DIALOG_CONTRAST = 60  # grey levels a dialog is brighter than the dimmed screen
 
-def imread_edges(img_path: str) -> Any:
-    return Canny(cvtColor(imread(img_path), COLOR_BGR2GRAY), 50, 200)
+# screens navigation can start from; "unknown" covers home and anything else
+# there's no template for
+SCREEN_STATES = (
+    "applications",
+    "admin_settings",
+    "reset_settings",
+    "confirm",
+    "unknown",
+)
 
 
-def get_coords(subimage_path: str, main_image_path: str) -> Tuple[int, int]:
-    main_img = imread(main_image_path)
-    sub_img = imread(subimage_path)
-    result = matchTemplate(main_img, sub_img, TM_CCOEFF_NORMED)
-    return np.unravel_index(result.argmax(), result.shape)
+# a screenshot can be a path on disk or an image already decoded in memory
+ImageSource = Union[str, np.ndarray]
+
+
+def decode_image(data: bytes) -> np.ndarray:
+    img = imdecode(np.frombuffer(data, dtype=np.uint8), IMREAD_COLOR)
+    if img is None:
+        raise Exception("Could not decode image data")
+    return img
+
+
+def load_image(img: ImageSource) -> np.ndarray:
+    if isinstance(img, np.ndarray):
+        return img
+    return imread(str(img))
+
+
+def imread_edges(img: ImageSource) -> Any:
+    return Canny(cvtColor(load_image(img), COLOR_BGR2GRAY), 50, 200)
+
+
+def normalize_name(name: str) -> str:
+    return name.lower().replace(" ", "_")
+
+
+# one icon or menu label, ready to match ("variant" is the font size of a label)
+# with half-size copies for the coarse pass
+Template = namedtuple(
+    "Template",
+    ["name", "variant", "color", "gray", "edges", "small_color", "small_edges"],
+)
+Match = namedtuple("Match", ["correlation", "variant", "x", "y"])
+
+REFINE_MARGIN = 6  # full-size pixels searched around a coarse hit
+COARSE_CANDIDATES = 3  # coarse hits refined at full size
+
+
+def load_template(path: Path, name: str, variant="") -> Template:
+    color = imread(str(path))
+    if color is None:
+        raise Exception(f"Could not read template image {path}")
+    gray = cvtColor(color, COLOR_BGR2GRAY)
+    edges = Canny(gray, 50, 200)
+    return Template(name, variant, color, gray, edges, pyrDown(color), pyrDown(edges))
+
+
+class TemplateBank:
+    """Every icon and menu label for a set of models, read from disk and
+    preprocessed once. Read-only after it's built, so threads can share it."""
+
+    def __init__(self, icons_dir: str, menus_dir: str) -> None:
+        self.icons: Mapping[str, Template] = MappingProxyType(
+            {
+                p.stem: load_template(p, p.stem)
+                for p in sorted(Path(icons_dir).glob("**/*.png"))
+            }
+        )
+        self.labels: Mapping[str, Mapping[str, Template]] = MappingProxyType(
+            {
+                d.name: MappingProxyType(
+                    {
+                        p.stem: load_template(p, d.name, p.stem)
+                        for p in sorted(d.glob("*.png"))
+                    }
+                )
+                for d in sorted(Path(menus_dir).iterdir())
+                if d.is_dir()
+            }
+        )
 
+    def icon(self, name: str) -> Template:
+        return self.icons.get(normalize_name(name), None)
 
-def guess_best_coords(subimages_dir: str, main_image_path: str) -> Tuple[int, int, str]:
-    main_img = imread_edges(main_image_path)
-    Image = namedtuple("Image", ["correlation", "name", "x", "y"])
-    winner = Image(0, "", 0, 0)
-    for sub_path in [p for p in Path(subimages_dir).iterdir() if p.suffix == ".png"]:
-        sub_img = imread_edges(str(sub_path))
-        result = matchTemplate(main_img, sub_img, TM_CCOEFF_NORMED)
-        _, bestVal, _, coords = minMaxLoc(result)
-        if bestVal > winner.correlation:
-            winner = Image(bestVal, sub_path.stem, coords[0], coords[1])
-    return winner.x, winner.y, winner.name
+    def label(self, name: str) -> Mapping[str, Template]:
+        """Every font size variant of a menu label, by font size."""
+        return self.labels.get(normalize_name(name), MappingProxyType({}))
 
 
-def get_menu_position(menu_item: str, model: str, screenshot_path: str) -> int:
+_banks: dict[Tuple[str, str], TemplateBank] = {}
+_banks_lock = threading.Lock()
+
+
+def get_template_bank(model: str) -> TemplateBank:
+    """The template bank for `model`, built the first time it's needed.
+    Models sharing image folders share a bank."""
+    if (menu_data := MENU_SUPPORT.get(model, None)) is None:
+        raise Exception(f"Cisco {model} does not have subimage files")
+    key = (menu_data["icons"], menu_data["menus"])
+    with _banks_lock:
+        if key not in _banks:
+            _banks[key] = TemplateBank(*key)
+        return _banks[key]
+
+
+def best_edge_match(templates: Iterable[Template], main_edges: np.ndarray) -> Match:
+    """Best correlation of any template's edges against a screenshot's edges."""
+    winner = Match(0, "", 0, 0)
+    for template in templates:
+        result = matchTemplate(main_edges, template.edges, TM_CCOEFF_NORMED)
+        _, best, _, coords = minMaxLoc(result)
+        if best > winner.correlation:
+            winner = Match(best, template.variant, coords[0], coords[1])
+    return winner
+
+
+def pyramid_match(
+    main: np.ndarray,
+    sub: np.ndarray,
+    main_small: np.ndarray,
+    sub_small: np.ndarray,
+    candidates=COARSE_CANDIDATES,
+) -> Tuple[float, int, int]:
+    """Finds `sub` in `main` by searching the half-size images first, then
+    only small full-size windows around the best few coarse hits.
+
+    Returns:
+        Tuple[float, int, int]: correlation, x, y of the full-size match
+    """
+    h, w = sub.shape[:2]
+    if min(sub_small.shape[:2]) < 4 or main.shape[0] < h or main.shape[1] < w:
+        # * too small to say anything at half size, search it all
+        _, best, _, (x, y) = minMaxLoc(matchTemplate(main, sub, TM_CCOEFF_NORMED))
+        return best, x, y
+
+    coarse = matchTemplate(main_small, sub_small, TM_CCOEFF_NORMED)
+    sh, sw = sub_small.shape[0] // 2, sub_small.shape[1] // 2
+    winner = (-1.0, 0, 0)
+    for _ in range(candidates):
+        _, _, _, (cx, cy) = minMaxLoc(coarse)
+        # * blank out this hit so the next pass finds a different spot
+        coarse[max(cy - sh, 0) : cy + sh + 1, max(cx - sw, 0) : cx + sw + 1] = -1
+
+        x0 = max(cx * 2 - REFINE_MARGIN, 0)
+        y0 = max(cy * 2 - REFINE_MARGIN, 0)
+        window = main[y0 : cy * 2 + h + REFINE_MARGIN, x0 : cx * 2 + w + REFINE_MARGIN]
+        if window.shape[0] < h or window.shape[1] < w:
+            continue
+        _, best, _, (x, y) = minMaxLoc(matchTemplate(window, sub, TM_CCOEFF_NORMED))
+        if best > winner[0]:
+            winner = (best, x0 + x, y0 + y)
+    return winner
+
+
+def get_coords(subimage: ImageSource, main_image: ImageSource) -> Tuple[int, int]:
+    main_img = load_image(main_image)
+    sub_img = load_image(subimage)
+    result = matchTemplate(main_img, sub_img, TM_CCOEFF_NORMED)
+    return np.unravel_index(result.argmax(), result.shape)
+
+
+def get_menu_position(
+    menu_item: str, model: str, screenshot: ImageSource, exhaustive=False
+) -> int:
     if (menu_data := MENU_SUPPORT.get(model, None)) is None:
         raise Exception(f"{model} is not supported for menu auto-navigation")
-    if (icon := find_subimage_file(menu_item, "icons", model)) == "":
+    if (icon := get_template_bank(model).icon(menu_item)) is None:
         raise Exception(f"{menu_item} is not a valid menu item.")
-    row, col = get_coords(icon, screenshot_path)
+    if exhaustive:
+        row, col = get_coords(icon.color, screenshot)
+    else:
+        row, col = locate_icon(icon, menu_data, load_image(screenshot))
     # ic(menu_item)
     # ic((col, row))
 
@@ -66,15 +221,167 @@ def get_menu_position(menu_item: str, model: str, screenshot_path: str) -> int:
         return -1
 
 
-def get_list_position(list_item: str, model: str, screenshot_path: str) -> int:
-    if model not in MENU_SUPPORT:
+def locate_icon_match(
+    icon: Template, menu_data: dict, screen: np.ndarray
+) -> Tuple[float, int, int]:
+    """Correlation, x, y of an icon, searching only where the menu grid can
+    put it."""
+    h, w = icon.color.shape[:2]
+    grid = menu_data["coordinates"]
+    roi = screen[: grid["rows"][-1] + h, : grid["columns"][-1] + w]
+    return pyramid_match(roi, icon.color, pyrDown(roi), icon.small_color)
+
+
+def locate_icon(icon: Template, menu_data: dict, screen: np.ndarray) -> Tuple[int, int]:
+    """Row, column of an icon."""
+    _, x, y = locate_icon_match(icon, menu_data, screen)
+    return y, x
+
+
+def locate_label(
+    variants: Iterable[Template], menu_data: dict, screen: np.ndarray, first=""
+) -> Match:
+    """Best match of any font size of a list label, searching only the rows
+    the list can put it in.
+
+    Args:
+        first (str, optional): Font size to try before the others. If it
+        matches with FONT_CONFIDENCE the rest are skipped. Defaults to "".
+    """
+    variants = sorted(variants, key=lambda t: t.variant != first)
+    bottom = menu_data["list_heights"][-1] + max(t.gray.shape[0] for t in variants)
+    gray = cvtColor(screen[:bottom], COLOR_BGR2GRAY)
+    # * both passes match edges, the coarse one just on a halved copy of them
+    edges = Canny(gray, 50, 200)
+    small = pyrDown(edges)
+
+    winner = Match(0, "", 0, 0)
+    for template in variants:
+        best, x, y = pyramid_match(edges, template.edges, small, template.small_edges)
+        if best > winner.correlation:
+            winner = Match(best, template.variant, x, y)
+        if template.variant == first and best >= FONT_CONFIDENCE:
+            break
+    return winner
+
+
+class FontMemory(JSONStore):
+    """Font size last seen on each phone, saved between runs so list lookups
+    can try it first."""
+
+    def __init__(self, path: Path = FONT_SIZES_FILE) -> None:
+        super().__init__(path)
+
+    def get(self, device: str) -> str:
+        with self._lock:
+            return self._data.get(device.upper(), "")
+
+    def remember(self, device: str, font: str) -> None:
+        with self._lock:
+            if self._data.get(device.upper(), "") != font:
+                self._data[device.upper()] = font
+                self._unsaved = True
+
+
+_font_memory: FontMemory = None
+_font_memory_lock = threading.Lock()
+
+
+def get_font_memory() -> FontMemory:
+    """The font sizes in the user folder, loaded on first use."""
+    global _font_memory
+    with _font_memory_lock:
+        if _font_memory is None:
+            _font_memory = FontMemory()
+            atexit.register(_font_memory.save)
+        return _font_memory
+
+
+def is_dialog(menu_data: dict, screen: np.ndarray) -> bool:
+    """A bright dialog box over a dimmed screen, going by brightness alone."""
+    x0, y0, x1, y1 = menu_data["dialog"]
+    gray = cvtColor(screen, COLOR_BGR2GRAY)
+    band = menu_data["coordinates"]["rows"][1] // 2
+    dimmed = np.concatenate((gray[:band].ravel(), gray[-band:].ravel())).mean()
+    return gray[y0:y1, x0:x1].mean() - dimmed > DIALOG_CONTRAST
+
+
+def classify_screen(
+    model: str, screenshot: ImageSource, device="", fonts: FontMemory = None
+) -> str:
+    """Which of SCREEN_STATES a phone is showing, so navigation can start from
+    there instead of from home.
+
+    Args:
+        device (str, optional): Name of the phone, to try its font size first.
+        Defaults to "".
+
+    Returns:
+        str: One of SCREEN_STATES
+    """
+    if (menu_data := MENU_SUPPORT.get(model, None)) is None:
+        raise Exception(f"{model} is not supported for menu auto-navigation")
+    bank = get_template_bank(model)
+    screen = load_image(screenshot)
+    fonts = fonts if fonts is not None else get_font_memory()
+    first = fonts.get(device) if device else ""
+
+    if is_dialog(menu_data, screen):
+        # * brightness is only a hint, the reset list has to show behind it
+        behind = bank.label(menu_data["states"]["confirm"]).values()
+        if (
+            locate_label(behind, menu_data, screen, first).correlation
+            >= FONT_CONFIDENCE
+        ):
+            return "confirm"
+    icon = bank.icon(menu_data["states"]["applications"])
+    if locate_icon_match(icon, menu_data, screen)[0] >= ICON_CONFIDENCE:
+        return "applications"
+    for state in ("admin_settings", "reset_settings"):
+        label = bank.label(menu_data["states"][state])
+        match = locate_label(label.values(), menu_data, screen, first)
+        if match.correlation >= FONT_CONFIDENCE:
+            if device:
+                fonts.remember(device, match.variant)
+            return state
+    return "unknown"
+
+
+def get_list_position(
+    list_item: str,
+    model: str,
+    screenshot: ImageSource,
+    exhaustive=False,
+    device="",
+    fonts: FontMemory = None,
+) -> int:
+    """
+    Args:
+        exhaustive (bool, optional): Search the whole screenshot with every
+        font size. Defaults to False.
+
+        device (str, optional): Name of the phone, so the font size found on it
+        is remembered and tried first next time. Defaults to "".
+
+        fonts (FontMemory, optional): Defaults to get_font_memory().
+    """
+    if (menu_data := MENU_SUPPORT.get(model, None)) is None:
         raise Exception(f"Cisco {model} not supported for list auto-navigation")
 
-    sub_images_dir: str = find_subimage_folder(list_item, "menus", model)
-    x, y, fontsize = guess_best_coords(sub_images_dir, screenshot_path)
+    if not (variants := get_template_bank(model).label(list_item)):
+        raise Exception(f"{list_item} is not a valid list item.")
+    if exhaustive:
+        x, y = best_edge_match(variants.values(), imread_edges(screenshot))[2:]
+    else:
+        fonts = fonts if fonts is not None else get_font_memory()
+        first = fonts.get(device) if device else ""
+        match = locate_label(
+            variants.values(), menu_data, load_image(screenshot), first
+        )
+        if device and match.correlation >= FONT_CONFIDENCE:
+            fonts.remember(device, match.variant)
+        x, y = match.x, match.y
 
-    # menu_img_file = find_subimage_file(entry, "menus", model)
-    # y, x = get_coords(menu_img_file, screenshot_path)
     # ic(list_item)
     # ic((x, y, fontsize))
 
@@ -86,38 +393,6 @@ def get_list_position(list_item: str, model: str, screenshot_path: str) -> int:
         raise Exception(f"Could not find list item '{list_item}'")
 
 
-def find_subimage_folder(wanted: str, image_type: str, model: str) -> str:
-    if (menu_data := MENU_SUPPORT.get(model, None)) is None:
-        raise Exception(f"Cisco {model} does not have subimage files")
-    if (img_folder := menu_data.get(image_type, None)) is None:
-        raise Exception(f"{image_type} is not a valid image type for Cisco {model}")
-    possible_dirs: list[Path] = [
-        dir for dir in Path(img_folder).iterdir() if dir.is_dir()
-    ]
-
-    wanted_stem = wanted.lower().replace(" ", "_")
-    for folder in possible_dirs:
-        if wanted_stem == folder.stem:
-            return str(folder.resolve())
-    else:
-        return ""
-
-
-def find_subimage_file(wanted: str, image_type: str, model: str) -> str:
-    if (menu_data := MENU_SUPPORT.get(model, None)) is None:
-        raise Exception(f"Cisco {model} does not have subimage files")
-    if (img_folder := menu_data.get(image_type, None)) is None:
-        raise Exception(f"{image_type} is not a valid image type for Cisco {model}")
-    possible_files: list[Path] = list(Path(img_folder).glob("**/*"))
-
-    wanted_stem = wanted.lower().replace(" ", "_")
-    for filepath in possible_files:
-        if wanted_stem == filepath.stem:
-            return str(filepath.resolve())
-    else:
-        return ""
-
-
 menu_data_8800_standard: dict = {
     "icons": str(ICONS_DIR / "8800"),
     "menus": str(MENUS_DIR / "8800"),
@@ -126,6 +401,16 @@ menu_data_8800_standard: dict = {
         "rows": (0, 90, 210, 350),
     },
     "list_heights": (100, 175, 250, 315, 400),
+    # middle of a confirmation dialog (left, top, right, bottom)
+    "dialog": (300, 200, 500, 280),
+    # what only each screen shows: an icon for applications, labels for lists
+    # and for confirm, the list item left showing above the dialog
+    "states": {
+        "applications": "admin_settings",
+        "admin_settings": "reset_settings",
+        "reset_settings": "reset_device",
+        "confirm": "all_settings",
+    },
 }
 
 MENU_SUPPORT: dict = {
@@ -1,5 +1,5 @@
 from ciscoreset.configs import ROOT_DIR
-from collections import defaultdict
+from collections import namedtuple
 import requests
 import requests.auth
 import requests.adapters
@@ -9,7 +9,10 @@ from html import escape
 from time import sleep
 from pathlib import Path
 import re
-from .keys import KEY_SUPPORT, get_range
+from .keys import KEY_SUPPORT, KEY_TABLES, KEY_BATCH_DELAY, find_invalid_key
+from .vision import decode_image
+from .settle import SETTLE_MODES, FIXED_SETTLE, wait_for_settle
+import numpy as np
 
 # from icecream import ic
 
@@ -32,91 +35,243 @@ class ProgramError(Exception):
     pass
 
 
+class CGIError(ProgramError):
+    def __init__(self, *args, item=None) -> None:
+        super().__init__(*args)
+        self.item: ResponseItem = item
+
+
+class InvalidKeyError(ProgramError):
+    def __init__(self, *args, key="") -> None:
+        super().__init__(*args)
+        self.key = key
+
+
+ResponseItem = namedtuple("ResponseItem", ["url", "status", "data"])
+
+
 r_ip = re.compile(r"^((25[0-5]|(2[0-4]|1\d|[1-9]|)\d)(\.(?!$)|$)){4}$")
 
 
+USER_AGENT = "Mozilla/5.0 (X11; CrOS x86_64 12871.102.0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/81.0.4044.141 Safari/537.36"
+
+
+def create_session(
+    username: str,
+    password: str,
+    pool_size=4,
+    keep_alive=True,
+    retries=5,
+    backoff_factor=0.1,
+) -> requests.Session:
+    """Builds a session whose connection pool can be shared by every request
+    made to a single phone.
+
+    Args:
+        username (str): Username for HTTP basic auth, blank to disable auth
+
+        password (str): Password for HTTP basic auth
+
+        pool_size (int, optional): Max connections kept open to the phone. Defaults to 4.
+
+        keep_alive (bool, optional): Reuse connections between requests. Defaults to True.
+
+        retries (int, optional): Read retries before giving up on a request. Defaults to 5.
+
+        backoff_factor (float, optional): Backoff between retries. Defaults to 0.1.
+
+    Returns:
+        requests.Session: Session with pooled adapters mounted
+    """
+    session = requests.Session()
+    if username:
+        session.auth = requests.auth.HTTPBasicAuth(username, password)
+    session.headers.update({"User-Agent": USER_AGENT})
+    if not keep_alive:
+        session.headers.update({"Connection": "close"})
+
+    retry_strat = Retry(
+        read=retries,
+        backoff_factor=backoff_factor,
+        total=retries + 1,
+    )  # ! default methods only, a retried CGI/Execute POST would press keys twice
+    # * pool_block keeps worker threads from opening more sockets than the
+    # * phone can handle, they wait for a free connection instead
+    session.mount(
+        "http://",
+        requests.adapters.HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=retry_strat,
+            pool_block=True,
+        ),
+    )
+    session.mount(
+        "https://",
+        HTTPSAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=retry_strat,
+            pool_block=True,
+        ),
+    )
+    return session
+
+
 class XMLPhone:
-    def __init__(self, ip_addr: str, username: str, password: str, model: str) -> None:
+    def __init__(
+        self,
+        ip_addr: str,
+        username: str,
+        password: str,
+        model: str,
+        pool_size=4,
+        keep_alive=True,
+        retries=5,
+        settle="adaptive",
+        batch_delay: float = None,
+        port=80,
+    ) -> None:
         ip_addr = ip_addr.removeprefix("http://")
         if not r_ip.match(ip_addr):
             raise Exception(f"{ip_addr} is not a valid IP address")
         if model not in KEY_SUPPORT:
             raise Exception(f"Phone model '{model}' is not supported by this program.")
+        if settle not in SETTLE_MODES:
+            raise Exception(f"'{settle}' is not a valid settle mode {SETTLE_MODES}")
         self.ip: str = ip_addr
         self.username: str = username
         self.password: str = password
         self.model = model
+        self.port = port
+        self.settle = settle
+        if batch_delay is None:
+            batch_delay = KEY_BATCH_DELAY.get(model, 0.0)
+        self.batch_delay: float = batch_delay
+        self.__last_frame: bytes = b""
+        self.__keys_sent = False
+
+        # * one long-lived pool per phone, shared by every command and screenshot
+        self.session: requests.Session = create_session(
+            username,
+            password,
+            pool_size=pool_size,
+            keep_alive=keep_alive,
+            retries=retries,
+        )
 
-    def send_key(self, key: str) -> None:
-        if verify_keys(self.model, [key]):
-            if not key.startswith("Key:"):
-                key = "Key:" + key
-            send_xml(self.ip, self.username, self.password, [key])
-
-    def send_keys(self, keys: list[str]) -> None:
-        if verify_keys(self.model, keys):
-            key_payloads = defaultdict(list)
-            for i, key in enumerate(keys):
-                if not key.startswith("Key:"):
-                    good_key = "Key:" + key
-                else:
-                    good_key = key
-                # * distribute keys three at a time (XML max payload)
-                key_payloads[str(i // 3)].append(good_key)
-            for payload in key_payloads.values():
-                send_xml(self.ip, self.username, self.password, payload)
-        else:
-            print(f"Bad key(s) in {keys}")
+    def __enter__(self):
+        return self
 
-    def dial_number(self, phone_number: str) -> None:
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        self.session.close()
+
+    def _send_xml(self, commands: list[str]) -> list[ResponseItem]:
+        self.__keys_sent = True
+        return send_xml(
+            self.ip,
+            self.username,
+            self.password,
+            commands,
+            self.session,
+            port=self.port,
+        )
+
+    def send_key(self, key: str) -> ResponseItem:
+        items = self.send_keys([key])
+        return items[0] if items else None
+
+    def send_keys(
+        self, keys: list[str], delay: float = None, fail_fast=True
+    ) -> list[ResponseItem]:
+        """Sends keys in order, three per request (XML max payload), back to back
+        over the phone's kept-alive connection.
+
+        Args:
+            keys (list[str]): Keys to press. Works with 'Key:' or without.
+
+            delay (float, optional): Seconds between requests. Defaults to the
+            model's entry in KEY_BATCH_DELAY.
+
+            fail_fast (bool, optional): Stop at the first item the phone reports
+            as failed, raising CGIError. Defaults to True.
+
+        Returns:
+            list[ResponseItem]: What the phone reported for each key
+        """
+        check_keys(self.model, keys)
+        if delay is None:
+            delay = self.batch_delay
+
+        payloads = batch_keys(keys)
+        results: list[ResponseItem] = []
+        for i, payload in enumerate(payloads):
+            if i and delay:
+                sleep(delay)
+            items = self._send_xml(payload)
+            if fail_fast:
+                raise_for_items(items)
+            results += items
+        return results
+
+    def dial_number(self, phone_number: str) -> list[ResponseItem]:
         if phone_number:
-            send_xml(self.ip, self.username, self.password, [f"Dial:{phone_number}"])
+            return self._send_xml([f"Dial:{phone_number}"])
+        return []
+
+    def _fetch_screenshot(self) -> bytes:
+        try:
+            recv = self.session.get(
+                f"http://{self.ip}:{self.port}/CGI/Screenshot", timeout=10
+            )
+        except requests.RequestException as error:
+            raise ProgramError(error)
+
+        if recv.status_code != 200:
+            raise Exception("Issue downloading screenshot: " + str(recv))
+        return recv.content
+
+    def get_screenshot_bytes(self) -> bytes:
+        if self.settle == "fixed":
+            sleep(FIXED_SETTLE)
+            frame = self._fetch_screenshot()
+        else:
+            # * only wait for a redraw if something could have changed the screen
+            previous = self.__last_frame if self.__keys_sent else b""
+            frame = wait_for_settle(self._fetch_screenshot, self.model, previous)
+        self.__last_frame = frame
+        self.__keys_sent = False
+        return frame
+
+    def get_screenshot(self) -> np.ndarray:
+        return decode_image(self.get_screenshot_bytes())
 
     def download_screenshot(self, filepath="") -> str:
-        sleep(0.75)
         if not filepath:
             filepath = ROOT_DIR / "tmp" / "screenshot.bmp"
         elif filepath[-4:] != ".bmp":
             filepath += ".bmp"
 
-        p = Path(filepath)
-        if not p.parent.exists():
-            p.parent.mkdir(parents=True)
-
-        # request_options: dict = {
-        #     "url": f"http://{self.ip}/CGI/Screenshot",
-        #     "auth": requests.auth.HTTPBasicAuth(self.username, self.password),
-        #     "headers": {
-        #         "User-Agent": "Mozilla/5.0 (X11; CrOS x86_64 12871.102.0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/81.0.4044.141 Safari/537.36"
-        #     },
-        # }
-
-        with requests.Session() as s:
-            s.auth = requests.auth.HTTPBasicAuth(self.username, self.password)
-            s.headers = "Mozilla/5.0 (X11; CrOS x86_64 12871.102.0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/81.0.4044.141 Safari/537.36"
-            retry_strat = Retry(
-                read=5,
-                backoff_factor=0.1,
-                total=6,
-            )
-            s.mount("http://", requests.adapters.HTTPAdapter(max_retries=retry_strat))
+        return save_screenshot(self.get_screenshot_bytes(), filepath)
 
-            # ic("sending screenshot request")
-            recv = s.get(f"http://{self.ip}/CGI/Screenshot", stream=True, timeout=10)
-            if recv.status_code != 200:
-                raise Exception("Issue downloading screenshot: " + str(recv))
 
-            # ic("opening file")
-            # byte_data: bytes = recv.content
-            with p.open("wb") as p_file:
-                for chunk in recv.iter_content(chunk_size=1024 * 1200):
-                    p_file.write(chunk)
-            # ic(len(byte_data))
+def save_screenshot(data: bytes, filepath) -> str:
+    p = Path(filepath)
+    p.parent.mkdir(parents=True, exist_ok=True)  # * phones may save at once
+    p.write_bytes(data)
 
-        if not p.is_file():
-            raise FileNotFoundError(f'Could not find "{str(p)}"')
+    if not p.is_file():
+        raise FileNotFoundError(f'Could not find "{str(p)}"')
 
-        return str(p)
+    return str(p)
+
+
+def batch_keys(keys: list[str], size=3) -> list[list[str]]:
+    good_keys = [k if k.startswith("Key:") else "Key:" + k for k in keys]
+    return [good_keys[i : i + size] for i in range(0, len(good_keys), size)]
 
 
 def verify_keys(model: str, keys: list[str]) -> bool:
@@ -130,40 +285,19 @@ def verify_keys(model: str, keys: list[str]) -> bool:
     Returns:
         bool: False if a key or the device model is not supported, True otherwise
     """
-    if (key_pack := KEY_SUPPORT.get(model, None)) is None:
-        print(f"Model '{model}' is not supported at this time")
+    if model not in KEY_TABLES:
         return False
-    else:
-        for key in keys:
-            key_action = key.removeprefix("Key:")
-
-            # check to see if it's a numeric option
-            if any([c.isnumeric() for c in key_action]):
-                key_word = "".join([c for c in key_action if not c.isnumeric()])
-                key_num = int("".join([c for c in key_action if c.isnumeric()]))
-                for valid_key in key_pack["numeric"]:
-                    if valid_key.startswith(key_word):
-                        # match found, check range
-                        lower, upper = get_range(valid_key)
-                        if key_num > upper or key_num < lower:
-                            print(
-                                f"Key:{key_action} is not within valid range ({lower}, {upper})"
-                            )
-                            return False
-                        else:
-                            break  # meets criteria
-                    else:
-                        pass  # not match, keep looking
-                else:
-                    print(
-                        f"Key:{key_action} is not a valid numeric key for Cisco {model}"
-                    )
-                    return False
-            elif key_action not in key_pack["standard"]:  # non-numeric, simple search
-                print(f"Key:{key_action} is not a valid key for Cisco {model}")
-                return False
-        else:  # all checks passed
-            return True
+    return find_invalid_key(model, keys) == ""
+
+
+def check_keys(model: str, keys: list[str]) -> None:
+    """Same as `verify_keys`, but raises InvalidKeyError naming the bad key."""
+    if model not in KEY_TABLES:
+        raise InvalidKeyError(f"Model '{model}' is not supported at this time")
+    if bad_key := find_invalid_key(model, keys):
+        raise InvalidKeyError(
+            f"{bad_key} is not a valid key for Cisco {model}", key=bad_key
+        )
 
 
 # r_url = re.compile(
@@ -184,7 +318,58 @@ def verify_keys(model: str, keys: list[str]) -> bool:
 #         return True
 
 
-def send_xml(ip_addr: str, username: str, password: str, commands: list[str]):
+def build_execute_xml(commands: list[str]) -> str:
+    xml = '<?xml version="1.0" encoding="UTF-8"?>' "<CiscoIPPhoneExecute>"
+
+    for url in commands:
+        xml += '<ExecuteItem URL="' + escape(url) + '" Priority="' + "0" + '" />'
+
+    xml += "</CiscoIPPhoneExecute>"
+    return xml
+
+
+def parse_execute_response(content_type: str, content: bytes):
+    if content_type[0:8] != "text/xml":
+        raise ProgramError("Unexpected Content-Type: " + content_type)
+
+    try:
+        document = etree.fromstring(content)
+    except etree.XMLSyntaxError as error:
+        raise ProgramError(error)
+
+    if document.tag == "CiscoIPPhoneError":
+        number = document.get("Number")
+
+        raise ProgramError("Error: " + cgi_errors.get(number, f"{number}"))
+
+    return document
+
+
+def response_items(document) -> list[ResponseItem]:
+    return [
+        ResponseItem(
+            element.get("URL", ""), element.get("Status", "0"), element.get("Data", "")
+        )
+        for element in document.findall("ResponseItem")
+    ]
+
+
+def raise_for_items(items: list[ResponseItem]) -> None:
+    for item in items:
+        if item.status != "0":
+            raise CGIError(
+                f"{item.url} failed with status {item.status}: {item.data}", item=item
+            )
+
+
+def send_xml(
+    ip_addr: str,
+    username: str,
+    password: str,
+    commands: list[str],
+    session: requests.Session = None,
+    port=80,
+) -> list[ResponseItem]:
     # cancel operation if there's an invalid url
     # if not verify_urls(commands):
     #     return None
@@ -192,14 +377,8 @@ def send_xml(ip_addr: str, username: str, password: str, commands: list[str]):
     # ? used as legacy for original arguments
     certificate = None
     timeout = 10
-    port = 80
 
-    xml = '<?xml version="1.0" encoding="UTF-8"?>' "<CiscoIPPhoneExecute>"
-
-    for url in commands:
-        xml += '<ExecuteItem URL="' + escape(url) + '" Priority="' + "0" + '" />'
-
-    xml += "</CiscoIPPhoneExecute>"
+    xml = build_execute_xml(commands)
 
     if username != "":
         auth = requests.auth.HTTPBasicAuth(username, password)
@@ -208,10 +387,13 @@ def send_xml(ip_addr: str, username: str, password: str, commands: list[str]):
 
     scheme = "https" if certificate else "http"
 
-    try:
+    # * callers without their own pool get a throwaway session, as before
+    owns_session = session is None
+    if owns_session:
         session = requests.Session()
         session.mount("https://", HTTPSAdapter())
 
+    try:
         response = session.post(
             f"{scheme}://{ip_addr}:{port}/CGI/Execute",
             timeout=timeout,
@@ -223,24 +405,11 @@ def send_xml(ip_addr: str, username: str, password: str, commands: list[str]):
 
     except requests.RequestException as error:
         raise ProgramError(error)
-
-    if response.headers["Content-Type"][0:8] != "text/xml":
-        raise ProgramError(
-            "Unexpected Content-Type: " + response.headers["Content-Type"]
-        )
-
-    try:
-        document = etree.fromstring(response.content)
-    except etree.XMLSyntaxError as error:
-        raise ProgramError(error)
-
-    if document.tag == "CiscoIPPhoneError":
-        number = document.get("Number")
-
-        raise ProgramError("Error: " + cgi_errors.get(number, f"{number}"))
-
-    for element in document.findall("ResponseItem"):
-        url = element.get("URL")
-        data = element.get("Data", "")
-
-        # print(f"{url}: {data}")
+    finally:
+        if owns_session:
+            session.close()
+
+    document = parse_execute_response(
+        response.headers["Content-Type"], response.content
+    )
+    return response_items(document)
@@ -0,0 +1,201 @@
+from ciscoreset.configs import ROOT_DIR
+from ciscoreset.xml import (
+    USER_AGENT,
+    ProgramError,
+    r_ip,
+    check_keys,
+    batch_keys,
+    raise_for_items,
+    response_items,
+    ResponseItem,
+    build_execute_xml,
+    parse_execute_response,
+    save_screenshot,
+)
+from ciscoreset.vision import decode_image
+from ciscoreset.settle import SETTLE_MODES, FIXED_SETTLE, async_wait_for_settle
+from ciscoreset.keys import KEY_SUPPORT, KEY_BATCH_DELAY
+from ciscoreset.reachability import async_tcp_probe
+from typing import Any, Awaitable, Iterable
+import numpy as np
+import asyncio
+import aiohttp
+
+
+def create_client_session(
+    limit=100, limit_per_host=4, timeout=10
+) -> aiohttp.ClientSession:
+    """Builds a session that many AsyncXMLPhones can share.
+
+    Args:
+        limit (int, optional): Max open sockets across all phones. Defaults to 100.
+
+        limit_per_host (int, optional): Max open sockets to a single phone. Defaults to 4.
+
+        timeout (int, optional): Total seconds allowed per request. Defaults to 10.
+
+    Returns:
+        aiohttp.ClientSession: Session with a bounded, keep-alive connector
+    """
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host),
+        timeout=aiohttp.ClientTimeout(total=timeout),
+        headers={"User-Agent": USER_AGENT},
+    )
+
+
+async def gather_bounded(aws: Iterable[Awaitable], limit=50) -> list[Any]:
+    """Runs awaitables concurrently with at most `limit` of them in flight.
+
+    Exceptions are returned in place of results so that one bad phone
+    doesn't cancel the rest.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def bounded(aw: Awaitable) -> Any:
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*[bounded(aw) for aw in aws], return_exceptions=True)
+
+
+class AsyncXMLPhone:
+    def __init__(
+        self,
+        ip_addr: str,
+        username: str,
+        password: str,
+        model: str,
+        session: aiohttp.ClientSession = None,
+        limit: asyncio.Semaphore = None,
+        settle="adaptive",
+        batch_delay: float = None,
+        port=80,
+    ) -> None:
+        ip_addr = ip_addr.removeprefix("http://")
+        if not r_ip.match(ip_addr):
+            raise Exception(f"{ip_addr} is not a valid IP address")
+        if model not in KEY_SUPPORT:
+            raise Exception(f"Phone model '{model}' is not supported by this program.")
+        if settle not in SETTLE_MODES:
+            raise Exception(f"'{settle}' is not a valid settle mode {SETTLE_MODES}")
+        self.ip: str = ip_addr
+        self.username: str = username
+        self.password: str = password
+        self.model = model
+        self.port = port
+        self.settle = settle
+        if batch_delay is None:
+            batch_delay = KEY_BATCH_DELAY.get(model, 0.0)
+        self.batch_delay: float = batch_delay
+        self.__last_frame: bytes = b""
+        self.__keys_sent = False
+
+        # * a session passed in is shared with other phones and isn't ours to close
+        self.__owns_session = session is None
+        self.__session: aiohttp.ClientSession = session
+        self.__limit = limit
+        if username:
+            self.__auth = aiohttp.BasicAuth(username, password)
+        else:
+            self.__auth = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self) -> None:
+        if self.__owns_session and self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self.__session is None:
+            self.__session = create_client_session()
+        return self.__session
+
+    async def _request(self, method: str, path: str, **kwargs) -> tuple[str, bytes]:
+        if self.__limit is not None:
+            async with self.__limit:
+                return await self.__request(method, path, **kwargs)
+        return await self.__request(method, path, **kwargs)
+
+    async def __request(self, method: str, path: str, **kwargs) -> tuple[str, bytes]:
+        try:
+            async with self.session.request(
+                method,
+                f"http://{self.ip}:{self.port}{path}",
+                auth=self.__auth,
+                **kwargs,
+            ) as resp:
+                resp.raise_for_status()
+                return resp.headers.get("Content-Type", ""), await resp.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            raise ProgramError(error)
+
+    async def _send_xml(self, commands: list[str]) -> list[ResponseItem]:
+        self.__keys_sent = True
+        content_type, content = await self._request(
+            "POST", "/CGI/Execute", data={"XML": build_execute_xml(commands)}
+        )
+        return response_items(parse_execute_response(content_type, content))
+
+    async def send_key(self, key: str) -> ResponseItem:
+        items = await self.send_keys([key])
+        return items[0] if items else None
+
+    async def send_keys(
+        self, keys: list[str], delay: float = None, fail_fast=True
+    ) -> list[ResponseItem]:
+        check_keys(self.model, keys)
+        if delay is None:
+            delay = self.batch_delay
+
+        results: list[ResponseItem] = []
+        for i, payload in enumerate(batch_keys(keys)):
+            if i and delay:
+                await asyncio.sleep(delay)
+            items = await self._send_xml(payload)
+            if fail_fast:
+                raise_for_items(items)
+            results += items
+        return results
+
+    async def dial_number(self, phone_number: str) -> list[ResponseItem]:
+        if phone_number:
+            return await self._send_xml([f"Dial:{phone_number}"])
+        return []
+
+    async def _fetch_screenshot(self) -> bytes:
+        _, content = await self._request("GET", "/CGI/Screenshot")
+        return content
+
+    async def get_screenshot_bytes(self) -> bytes:
+        if self.settle == "fixed":
+            await asyncio.sleep(FIXED_SETTLE)
+            frame = await self._fetch_screenshot()
+        else:
+            previous = self.__last_frame if self.__keys_sent else b""
+            frame = await async_wait_for_settle(
+                self._fetch_screenshot, self.model, previous
+            )
+        self.__last_frame = frame
+        self.__keys_sent = False
+        return frame
+
+    async def get_screenshot(self) -> np.ndarray:
+        return decode_image(await self.get_screenshot_bytes())
+
+    async def download_screenshot(self, filepath="") -> str:
+        if not filepath:
+            filepath = ROOT_DIR / "tmp" / "screenshot.bmp"
+        elif filepath[-4:] != ".bmp":
+            filepath += ".bmp"
+
+        return save_screenshot(await self.get_screenshot_bytes(), filepath)
+
+    async def is_reachable(self, timeout=3) -> bool:
+        return await async_tcp_probe(self.ip, self.port, timeout)
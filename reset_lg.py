@@ -1,51 +1,55 @@
-from typing import Tuple
-from ciscoreset import CUCM, get_credentials
-from time import sleep
+from ciscoreset import get_cucm, get_credentials
+from ciscoreset.lg_reset import (
+    JOURNAL_FILE,
+    LINE_STAGGER,
+    GroupResult,
+    LineGroupResetRunner,
+    ResetJournal,
+    select_groups,
+)
 from tqdm import tqdm
-import concurrent
+import argparse
 
 
-def reset_lines_slowly(ucm: CUCM, lines: list[Tuple[str, str]], name="") -> None:
-    try:
-        for line in tqdm(lines, desc=name, leave=False):
-            if line != lines[0]:
-                sleep(5)
-            devices: list[str] = ucm.get_dn_devices(line[0], line[1])
-            for device in devices:
-                ucm.do_device_reset(name=device)
-    except Exception as e:
-        tqdm.write(f"{name} FAILED: {e}")
-        return name
-    tqdm.write(f"{name} complete!")
-    return name
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reset every line group's phones")
+    parser.add_argument("cucm", help="CUCM server address")
+    parser.add_argument("groups", nargs="*", help="only these line groups")
+    parser.add_argument("--port", default="8443", help="AXL port")
+    parser.add_argument("--workers", type=int, default=7)
+    parser.add_argument("--stagger", type=float, default=LINE_STAGGER)
+    parser.add_argument("--journal", default=str(JOURNAL_FILE))
+    parser.add_argument(
+        "--fresh", action="store_true", help="forget the journal and start over"
+    )
+    args = parser.parse_args()
 
+    journal = ResetJournal(args.journal)
+    if args.fresh:
+        journal.clear()
+    elif journal.done:
+        print(f"Resuming, {len(journal.done)} devices already reset")
 
-if __name__ == "__main__":
-    ucm = CUCM(*get_credentials())
-    line_groups: dict = ucm.get_all_line_group_members()
-    # group_sample = [
-    #     "Facilities-Dispatch-LG",
-    #     "Redfern COVID-19 Group ALL",
-    #     "Redfern Pharmacy Group",
-    #     "Redfern-Apptmnt-LG",
-    #     "Redfern-Health-Info-Mgmt-LG",
-    #     "Sullivan-COVID-19-LG",
-    #     "Undergrad-LG",
-    # ]
-    # group_sample = [f"hunt-lab{i}" for i in range(1, 6, 1)]
-    # line_groups: dict = {
-    #     name: ucm.get_line_group_members(name) for name in group_sample
-    # }
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=7) as ex:
-        lg_futures = [
-            ex.submit(reset_lines_slowly, ucm, lg_members, lg_name)
-            for lg_name, lg_members in line_groups.items()
-        ]
-        for future in tqdm(
-            concurrent.futures.as_completed(lg_futures),
-            total=len(line_groups),
-            desc="TOTAL",
-            position=0,
-        ):
-            pass
+    ucm = get_cucm(*get_credentials(), args.cucm, port=args.port)
+    line_groups = select_groups(ucm.get_all_line_group_members(), args.groups)
+    if not args.groups:
+        ucm.get_dn_index()  # * one bulk load beats a lookup per member DN
+    runner = LineGroupResetRunner(
+        ucm, journal, workers=args.workers, stagger=args.stagger
+    )
+
+    with tqdm(total=len(line_groups), desc="TOTAL", position=0) as progress:
+
+        def report(result: GroupResult) -> None:
+            if result.error:
+                tqdm.write(f"{result.group} FAILED: {result.error}")
+            elif result.failed:
+                tqdm.write(f"{result.group} FAILED: {result.failed} device(s)")
+            else:
+                tqdm.write(f"{result.group} complete!")
+            progress.update()
+
+        runner.run(line_groups, on_result=report)
+
+    if journal.failed:
+        print(f"{len(journal.failed)} device(s) failed, run again to retry them")
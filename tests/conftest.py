@@ -0,0 +1,28 @@
+"""Every test gets its own learned-data stores, and the package's user folder
+is pointed at a temporary directory before anything is imported, so a test
+run never reads or writes real settle times, font sizes, plans or inventory."""
+import os
+import tempfile
+
+os.environ["CISCORESET_USER_DIR"] = tempfile.mkdtemp(prefix="ciscoreset-tests-")
+
+from ciscoreset import inventory, navplan, settle, vision
+from pathlib import Path
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_stores(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(
+        settle, "_settle_times", settle.SettleTimes(tmp_path / "settle_times.json")
+    )
+    monkeypatch.setattr(
+        vision, "_font_memory", vision.FontMemory(tmp_path / "font_sizes.json")
+    )
+    monkeypatch.setattr(
+        navplan, "_nav_plans", navplan.NavPlans(tmp_path / "nav_plans.json")
+    )
+    phones = inventory.Inventory(tmp_path / "inventory.sqlite3")
+    monkeypatch.setattr(inventory, "_inventory", phones)
+    yield
+    phones.close()
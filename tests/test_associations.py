@@ -0,0 +1,61 @@
+from ciscoreset.associations import AssociationManager
+from ciscoreset.simulator import SimulatedCUCM
+import concurrent.futures
+import pytest
+
+
+def test_concurrent_sessions_batch_and_restore():
+    ucm = SimulatedCUCM([], admin_devices=["SEPKEEP"])
+    manager = AssociationManager(ucm, "admin", flush_window=0.1)
+    devices = [f"SEP{i:012X}" for i in range(8)] + ["SEPKEEP"]
+
+    def session(device: str) -> None:
+        manager.acquire(device)
+        assert device in ucm.admin_devices
+        manager.release(device)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(devices)) as ex:
+        list(ex.map(session, devices))
+
+    assert ucm.admin_devices == ["SEPKEEP"]
+    assert manager.writes <= 4  # one add and one remove window, give or take
+
+
+def test_shared_device_is_refcounted():
+    ucm = SimulatedCUCM([])
+    manager = AssociationManager(ucm, "admin", flush_window=0.05)
+    manager.acquire("SEP1")
+    manager.acquire("SEP1")
+    manager.release("SEP1")
+    assert ucm.admin_devices == ["SEP1"]
+    manager.release("SEP1")
+    assert ucm.admin_devices == []
+
+
+def test_close_restores_held_devices():
+    ucm = SimulatedCUCM([])
+    manager = AssociationManager(ucm, "admin", flush_window=0.05)
+    manager.acquire("SEP1")
+    manager.close()
+    assert ucm.admin_devices == []
+
+
+def test_failed_release_raises_and_retries_later():
+    class FailingCUCM(SimulatedCUCM):
+        fail = False
+
+        def update_user_devices(self, userid: str, devices: list) -> None:
+            if self.fail:
+                raise Exception("AXL down")
+            super().update_user_devices(userid, devices)
+
+    ucm = FailingCUCM([])
+    manager = AssociationManager(ucm, "admin", flush_window=0.05)
+    manager.acquire("SEP1")
+    ucm.fail = True
+    with pytest.raises(Exception, match="AXL down"):
+        manager.release("SEP1")
+    assert ucm.admin_devices == ["SEP1"]
+    ucm.fail = False
+    manager.close()
+    assert ucm.admin_devices == []
@@ -0,0 +1,273 @@
+from ciscoreset import axl
+from ciscoreset.axl import CUCM, DNIndex, forget_cucm, get_cucm
+from collections import namedtuple
+from time import sleep
+from typing import Callable
+import concurrent.futures
+import pytest
+
+
+Column = namedtuple("Column", ["tag", "text"])
+
+
+class StubAXL:
+    """Answers AXL operations from canned handlers, remembering every call."""
+
+    def __init__(self, **operations: Callable) -> None:
+        self.operations = operations
+        self.calls: list[tuple[str, dict]] = []
+
+    def __getattr__(self, operation: str) -> Callable:
+        if operation not in self.operations:
+            raise AttributeError(operation)
+
+        def call(**kwargs):
+            self.calls.append((operation, kwargs))
+            return self.operations[operation](**kwargs)
+
+        return call
+
+
+def sql_rows(rows: list[dict]) -> dict:
+    return {"return": {"row": [[Column(k, v) for k, v in r.items()] for r in rows]}}
+
+
+@pytest.fixture
+def make_cucm(monkeypatch: pytest.MonkeyPatch) -> Callable[..., CUCM]:
+    """Builds CUCM clients around a StubAXL instead of a live server."""
+
+    def make(stub: StubAXL, **kwargs) -> CUCM:
+        def connect(self, *args, **kw) -> None:
+            self.client = stub
+
+        monkeypatch.setattr(axl.Axl, "__init__", connect)
+        monkeypatch.setattr(axl, "turn_off_serializer", lambda: None)
+        return CUCM("admin", "pw", "cucm.example", **kwargs)
+
+    return make
+
+
+DN_ROWS = [
+    {"pattern": "5001", "partition": "Phones-PT", "device": "SEPA"},
+    {"pattern": "5001", "partition": "Staging-PT", "device": "SEPB"},
+    {"pattern": "5002", "partition": "Phones-PT", "device": ""},
+]
+
+
+def dn_sql(sql: str) -> dict:
+    if "n.dnorpattern = " in sql:
+        dn = sql.split("n.dnorpattern = '")[1].split("'")[0]
+        return sql_rows([r for r in DN_ROWS if r["pattern"] == dn])
+    return sql_rows(DN_ROWS)
+
+
+def test_dn_index():
+    index = DNIndex(("Phones-PT", "Staging-PT"))
+    index.add("5001", "Staging-PT", "SEPB")
+    index.add("5001", "Phones-PT", "SEPA")
+    index.add("5001", "Phones-PT", "SEPA")
+    index.add("5002", "Phones-PT")
+    assert index.partitions_of("5001") == ["Phones-PT", "Staging-PT"]
+    assert index.devices("5001", "Phones-PT") == ["SEPA"]
+    assert index.devices("5002", "Phones-PT") == []
+    assert "5002" in index and "5003" not in index and len(index) == 2
+    assert index.covers("Staging-PT") and not index.covers("")
+
+
+def test_dn_lookups_are_lazy_until_the_index_loads(make_cucm):
+    stub = StubAXL(executeSQLQuery=lambda sql: dn_sql(sql))
+    ucm = make_cucm(stub)
+    assert ucm.get_dn_devices("5001") == ["SEPA"]
+    assert ucm.get_dn_devices("5001", "Staging-PT") == ["SEPB"]
+    assert ucm.get_dn_partition("5001") == "Phones-PT"
+    assert len(stub.calls) == 1  # * one query for the one DN, then cached
+    assert "'5001'" in stub.calls[0][1]["sql"]
+
+    assert ucm.get_dn_index().patterns() == ["5001", "5002"]
+    assert ucm.does_dn_exist("5002") and not ucm.does_dn_exist("5003")
+    assert len(stub.calls) == 2  # * the bulk load answers everything after
+
+
+def test_dn_lookup_without_sql_rights(make_cucm):
+    def refuse(sql: str) -> dict:
+        raise axl.Fault("Access denied")
+
+    lines = {("5001", "Staging-PT"): ["SEPB"]}
+    ucm = make_cucm(StubAXL(executeSQLQuery=refuse))
+    ucm.get_directory_number = lambda pattern, routePartitionName: (
+        {"return": {"line": {"associatedDevices": {"device": devices}}}}
+        if (devices := lines.get((pattern, routePartitionName))) is not None
+        else axl.Fault("Item not valid")
+    )
+    assert ucm.get_dn_devices("5001") == ["SEPB"]
+    assert ucm.get_dn_partition("5001") == "Staging-PT"
+
+
+def test_null_partition_is_not_any_partition(make_cucm):
+    asked: list[str] = []
+
+    def get_directory_number(pattern: str, routePartitionName: str) -> dict:
+        asked.append(routePartitionName)
+        return {"return": {"line": {"associatedDevices": {"device": ["SEPN"]}}}}
+
+    ucm = make_cucm(StubAXL(executeSQLQuery=lambda sql: dn_sql(sql)))
+    ucm.get_directory_number = get_directory_number
+    assert ucm.get_dn_devices("5001", "") == ["SEPN"]
+    assert asked == [""]
+
+
+def phone(name: str, model="Cisco 8841", lines=(("5001", "Phones-PT"),)) -> dict:
+    return {
+        "name": name,
+        "model": model,
+        "description": f"Desk {name}",
+        "lines": {
+            "line": [
+                {
+                    "index": str(i + 1),
+                    "dirn": {"pattern": p, "routePartitionName": {"_value_1": pt}},
+                }
+                for i, (p, pt) in reversed(list(enumerate(lines)))
+            ]
+        },
+    }
+
+
+def test_phone_record_fetched_once(make_cucm):
+    def get_phone(name: str, returnedTags: dict) -> dict:
+        if name != "SEPA":
+            raise axl.Fault("Item not valid")
+        return {"return": {"phone": phone("SEPA", lines=[("5001", "P"), ("5002", "")])}}
+
+    stub = StubAXL(getPhone=get_phone)
+    ucm = make_cucm(stub)
+    assert ucm.get_phone_model("SEPA") == "8841"
+    assert ucm.get_phone_description("SEPA") == "Desk SEPA"
+    assert ucm.get_phone_main_line("SEPA") == "5001"
+    assert ucm.get_phone_record("SEPA").lines == [("5001", "P"), ("5002", "")]
+    assert len(stub.calls) == 1
+    assert stub.calls[0][1]["returnedTags"] == axl.PHONE_RECORD_TAGS
+
+    ucm.get_phone_record("SEPA", refresh=True)
+    ucm.invalidate_phone_record("SEPA")
+    ucm.get_phone_model("SEPA")
+    assert len(stub.calls) == 3
+    with pytest.raises(Exception, match="No phone found"):
+        ucm.get_phone_model("SEPB")
+
+
+def test_phone_record_expires(make_cucm):
+    stub = StubAXL(
+        getPhone=lambda name, returnedTags: {"return": {"phone": phone(name)}}
+    )
+    ucm = make_cucm(stub, record_ttl=0)
+    ucm.get_phone_model("SEPA")
+    ucm.get_phone_model("SEPA")
+    assert len(stub.calls) == 2
+
+
+def test_iter_phones_pages(make_cucm):
+    phones = [
+        {
+            "name": f"SEP{i:012X}",
+            "model": "Cisco 8841" if i % 2 else "Cisco 7841",
+            "description": None,
+            "devicePoolName": {"_value_1": "Main-DP"},
+        }
+        for i in range(5)
+    ]
+
+    def list_phone(searchCriteria, returnedTags, first, skip) -> dict:
+        page = phones[skip : skip + first]
+        return {"return": {"phone": page} if page else None}
+
+    stub = StubAXL(listPhone=list_phone)
+    ucm = make_cucm(stub)
+    found = ucm.list_phones(device_pool="Main-DP", page_size=2)
+    assert [p.name for p in found] == [p["name"] for p in phones]
+    assert found[0] == ("SEP000000000000", "7841", "", "Main-DP")
+    assert [c[1]["skip"] for c in stub.calls] == [0, 2, 4]
+    assert stub.calls[0][1]["searchCriteria"] == {
+        "name": "%",
+        "devicePoolName": "Main-DP",
+    }
+
+    # * a full last page takes one more call to see the end
+    stub.calls.clear()
+    assert len(ucm.list_phones(model="8841", page_size=5)) == 2
+    assert [c[1]["skip"] for c in stub.calls] == [0, 5]
+
+
+LINE_GROUP_ROWS = [
+    {"linegroup": "Front-LG", "pattern": "5001", "partition": "Phones-PT"},
+    {"linegroup": "Front-LG", "pattern": "5002", "partition": ""},
+    {"linegroup": "Empty-LG", "pattern": "", "partition": ""},
+]
+LINE_GROUPS = {
+    "Front-LG": [("5001", "Phones-PT"), ("5002", "")],
+    "Empty-LG": [],
+}
+
+
+def test_line_group_members_in_one_query(make_cucm):
+    stub = StubAXL(executeSQLQuery=lambda sql: sql_rows(LINE_GROUP_ROWS))
+    ucm = make_cucm(stub)
+    assert ucm.get_all_line_group_members() == LINE_GROUPS
+    assert [c[0] for c in stub.calls] == ["executeSQLQuery"]
+
+
+def test_line_group_members_without_sql_rights(make_cucm):
+    def refuse(sql: str) -> dict:
+        raise axl.Fault("Access denied")
+
+    def get_line_group(name: str) -> dict:
+        members = [
+            {
+                "directoryNumber": {
+                    "pattern": p,
+                    "routePartitionName": {"_value_1": pt} if pt else None,
+                }
+            }
+            for p, pt in LINE_GROUPS[name]
+        ]
+        group = {"members": {"member": members} if members else None}
+        return {"return": {"lineGroup": group}}
+
+    stub = StubAXL(
+        executeSQLQuery=refuse,
+        listLineGroup=lambda searchCriteria, returnedTags: {
+            "return": {"lineGroup": [{"name": n} for n in LINE_GROUPS]}
+        },
+        getLineGroup=get_line_group,
+    )
+    ucm = make_cucm(stub)
+    assert ucm.get_all_line_group_members() == LINE_GROUPS
+    assert [c[0] for c in stub.calls].count("getLineGroup") == 2
+
+
+def test_get_cucm_shares_clients(monkeypatch: pytest.MonkeyPatch):
+    builds: list[str] = []
+
+    def connect(self, username, password, cucm_address, port="8443") -> None:
+        sleep(0.05)  # * parsing the schema is slow
+        builds.append(cucm_address)
+        self.client = StubAXL()
+
+    monkeypatch.setattr(axl.Axl, "__init__", connect)
+    monkeypatch.setattr(axl, "turn_off_serializer", lambda: None)
+    monkeypatch.setattr(axl, "_clients", {})
+    monkeypatch.setattr(axl, "_client_locks", {})
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as ex:
+        clients = list(
+            ex.map(lambda a: get_cucm("admin", "pw", a), ["CUCM.example"] * 4)
+        )
+    assert len(builds) == 1 and all(c is clients[0] for c in clients)
+    assert get_cucm("ADMIN", "pw", "cucm.example") is clients[0]
+    assert get_cucm("admin", "pw", "cucm.example", port="8444") is not clients[0]
+
+    # * a new password means a new client, and so does forgetting it
+    assert get_cucm("admin", "new", "cucm.example") is not clients[0]
+    forget_cucm("cucm.example", username="admin")
+    get_cucm("admin", "new", "cucm.example")
+    assert len(builds) == 4
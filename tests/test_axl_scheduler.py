@@ -0,0 +1,76 @@
+from ciscoreset.axl_scheduler import (
+    AIMDLimiter,
+    AXLScheduler,
+    ScheduledClient,
+    TokenBucket,
+    is_read,
+    is_throttle,
+)
+from zeep.exceptions import Fault, TransportError
+from time import monotonic
+import pytest
+
+
+def test_is_read():
+    assert is_read("getPhone") and is_read("listPhone")
+    assert is_read("executeSQLQuery")
+    assert not is_read("updateUser") and not is_read("executeSQLUpdate")
+
+
+def test_is_throttle():
+    assert is_throttle(TransportError(status_code=503))
+    assert is_throttle(Fault("Maximum AXL memory allocation consumed"))
+    # * a 503 in a fault is just data, like a DN
+    assert not is_throttle(Fault("Item not valid: DN 5503 not found"))
+    assert not is_throttle(TransportError(status_code=500))
+
+
+def test_token_bucket_paces():
+    bucket = TokenBucket(rate=20, burst=1)
+    start = monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert monotonic() - start >= 0.15
+
+
+def test_aimd_limiter():
+    limiter = AIMDLimiter(4, 1, 8)
+    limiter.acquire()
+    limiter.release(throttled=True)
+    assert limiter.limit == 2
+    limiter.acquire()
+    limiter.release()
+    assert limiter.limit == 2.5
+
+
+class Service:
+    def __init__(self, throttles: int) -> None:
+        self.throttles = throttles
+        self.calls = 0
+
+    def getPhone(self, name: str) -> str:
+        self.calls += 1
+        if self.calls <= self.throttles:
+            raise TransportError(status_code=503)
+        return name
+
+    def updateUser(self, userid: str) -> None:
+        raise Fault("Item not valid")
+
+
+def test_throttled_calls_are_retried():
+    scheduler = AXLScheduler(backoff=0.01)
+    client = ScheduledClient(Service(throttles=2), scheduler)
+    assert client.getPhone(name="SEP1") == "SEP1"
+
+    read = scheduler.metrics()["read"]
+    assert read["throttled"] == 2 and read["completed"] == 1
+    assert read["concurrency"] < 4
+
+
+def test_other_faults_are_not_retried():
+    scheduler = AXLScheduler(backoff=0.01)
+    client = ScheduledClient(Service(throttles=0), scheduler)
+    with pytest.raises(Fault):
+        client.updateUser(userid="me")
+    assert scheduler.metrics()["write"]["failed"] == 1
@@ -0,0 +1,127 @@
+from ciscoreset import fleet
+from ciscoreset.fleet import FleetReset, FleetResult, FleetTarget
+from ciscoreset.simulator import SimulatedCUCM, SimulatedPhone
+from collections import Counter
+import threading
+import pytest
+
+
+def fleet_of(sims: list[SimulatedPhone], ucm: SimulatedCUCM = None, **kwargs):
+    return FleetReset(
+        "",
+        "u",
+        "p",
+        phone_port=sims[0].port,
+        ucm=ucm or SimulatedCUCM(sims),
+        backoff=0.1,
+        **kwargs,
+    )
+
+
+def test_unreachable_phone_is_retried():
+    with SimulatedPhone(reboot=0.5) as sim:
+        sim.go_offline(0.6)  # * backoff 0.1, 0.2, 0.4: back by the last retry
+        fleet_reset = fleet_of([sim], retries=3)
+        [result] = fleet_reset.run([FleetTarget(sim.ip, "")], "network")
+    assert result.status == "ok" and result.attempts >= 2
+    assert sim.state.resets == ["network_settings"]
+
+
+def test_waits_for_rebooted_phone_on_its_port():
+    with SimulatedPhone(reboot=1.5) as sim:
+        assert sim.port != 80
+        fleet_reset = fleet_of([sim], wait_for_reboot=True, reboot_timeout=10)
+        [result] = fleet_reset.run([FleetTarget(sim.ip, "")], "device")
+    assert (result.status, result.error) == ("ok", "")
+    assert result.seconds >= 1.0  # * counted until the phone was back
+    assert sim.state.resets == ["reset_device"]
+
+
+def test_unsupported_phone_is_not_retried():
+    class OldCUCM(SimulatedCUCM):
+        def get_phone_model(self, name: str) -> str:
+            return "7945"
+
+    with SimulatedPhone() as sim:
+        ucm = OldCUCM([sim])
+        [result] = fleet_of([sim], ucm).run([FleetTarget(sim.ip, "")], "network")
+    assert (result.status, result.attempts) == ("failed", 1)
+    assert "7945" in result.error
+
+
+def test_cleanup_failure_after_confirm_is_not_retried():
+    class ReleaseFailsCUCM(SimulatedCUCM):
+        def update_user_devices(self, userid: str, devices: list) -> None:
+            if not devices:
+                raise Exception("AXL down")
+            super().update_user_devices(userid, devices)
+
+    with SimulatedPhone(reboot=0.5) as sim:
+        ucm = ReleaseFailsCUCM([sim])
+        [result] = fleet_of([sim], ucm).run([FleetTarget(sim.ip, "")], "network")
+    assert (result.status, result.attempts) == ("ok", 1)
+    assert result.error == "Reset sent, cleanup failed: AXL down"
+    assert sim.state.resets == ["network_settings"]
+
+
+def test_subnet_limit_does_not_hold_workers(monkeypatch: pytest.MonkeyPatch):
+    crowded = SimulatedPhone(name="SEP00000000000A", ip="127.0.0.1")
+    crowded.start()
+    port = crowded.port
+    sims = [crowded] + [
+        SimulatedPhone(name=f"SEP00000000000{c}", ip=ip, port=port)
+        for c, ip in (("B", "127.0.0.2"), ("C", "127.0.0.3"), ("D", "127.0.1.1"))
+    ]
+    for sim in sims[1:]:
+        sim.start()
+
+    active, peak, lock = Counter(), Counter(), threading.Lock()
+
+    class CountingConnection(fleet.PhoneConnection):
+        def __init__(self, phone_ip: str, *args, **kwargs) -> None:
+            self.subnet = fleet.subnet_of(phone_ip)
+            with lock:
+                active[self.subnet] += 1
+                peak[self.subnet] = max(peak[self.subnet], active[self.subnet])
+            try:
+                super().__init__(phone_ip, *args, **kwargs)
+            except Exception:
+                self.close_count()
+                raise
+
+        def close_count(self) -> None:
+            with lock:
+                active[self.subnet] -= 1
+
+        def close(self) -> None:
+            try:
+                super().close()
+            finally:
+                self.close_count()
+
+    monkeypatch.setattr(fleet, "PhoneConnection", CountingConnection)
+    done: list[FleetResult] = []
+    try:
+        results = fleet_of(sims, workers=2, per_subnet=1, dry_run=True).run(
+            [FleetTarget(s.ip, "") for s in sims], "network", on_result=done.append
+        )
+    finally:
+        for sim in sims:
+            sim.stop()
+
+    assert [r.status for r in results] == ["ok"] * 4
+    assert peak == {"127.0.0.0/24": 1, "127.0.1.0/24": 1}
+    # * the other subnet's phone didn't queue behind the crowded one
+    names = [r.name for r in done]
+    assert names.index("SEP00000000000D") < names.index("SEP00000000000B")
+
+
+def test_unresolved_targets_are_listed():
+    known = {"SEP00000000000A": "127.0.0.1"}
+    fleet_reset = FleetReset("", "u", "p", resolver=lambda n: known.get(n, ""))
+    targets = [
+        FleetTarget("", "SEP00000000000A"),
+        FleetTarget("", "SEP00000000000B"),
+        FleetTarget("127.0.0.2", "SEP00000000000C"),
+    ]
+    assert fleet_reset.unresolved(targets) == [targets[1]]
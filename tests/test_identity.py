@@ -0,0 +1,57 @@
+from ciscoreset.identity import (
+    IdentityCache,
+    IdentityScanner,
+    parse_identity,
+    probe_identity,
+)
+from ciscoreset.simulator import SimulatedPhone
+
+
+PAGE = (
+    b"<html><body><table>"
+    b"<tr><td><b>Host name</b></td><td><b>SEP0123456789AB</b></td></tr>"
+    b"<tr><td><b>Serial number</b></td><td><b>FCH1234A5BC</b></td></tr>"
+    b"<tr><td><b>Model number</b></td><td><b>CP-8845</b></td></tr>"
+    b"<tr><td><b>Version</b></td><td><b>sip88xx.14-1-1-0001-136</b></td></tr>"
+    b"</table></body></html>"
+)
+
+
+def test_parse_identity():
+    identity = parse_identity(PAGE)
+    assert identity.name == "SEP0123456789AB"
+    assert identity.serial == "FCH1234A5BC"
+    assert identity.model == "8845"
+    assert identity.firmware == "sip88xx.14-1-1-0001-136"
+    assert parse_identity(b"<html></html>") == ("", "", "", "")
+
+
+def test_scanner_stops_early():
+    scanner = IdentityScanner()
+    chunks = [PAGE[i : i + 16] for i in range(0, len(PAGE), 16)] + [b"x" * 100000]
+    fed = 0
+    for chunk in chunks:
+        fed += 1
+        if scanner.feed(chunk):
+            break
+    assert fed < len(chunks)
+    assert scanner.identity.name == "SEP0123456789AB"
+
+
+def test_scanner_caps_bytes():
+    scanner = IdentityScanner(max_bytes=1024)
+    assert not scanner.feed(b"x" * 1000)
+    assert scanner.feed(b"x" * 1000)
+    assert scanner.identity.name == ""
+
+
+def test_identity_cache_expires():
+    cache = IdentityCache(ttl=0)
+    cache.put("10.0.0.1:80", parse_identity(PAGE))
+    assert cache.get("10.0.0.1:80") is None
+
+
+def test_probe_simulated_phone():
+    with SimulatedPhone(model="8841", serial="FCH9999Z999") as sim:
+        identity = probe_identity(sim.url)
+    assert identity == (sim.name, "8841", "FCH9999Z999", sim.firmware)
@@ -0,0 +1,66 @@
+from ciscoreset.axl import Change
+from ciscoreset.inventory import Inventory
+from zeep.exceptions import Fault
+
+
+def phone_row(pkid: str, name: str, dn: str, description="") -> dict:
+    return {
+        "pkid": pkid,
+        "name": name,
+        "model": "Cisco 8841",
+        "description": description,
+        "dn": dn,
+        "partition": "Phones-PT",
+        "device_pool": "Main-DP",
+    }
+
+
+class FakeUCM:
+    def __init__(self) -> None:
+        self.rows = [
+            phone_row("a", "SEP000000000001", "1001", "Front Desk"),
+            phone_row("b", "SEP000000000002", "1002", "Lab 2"),
+        ]
+        self.changes: list[Change] = []
+        self.queries: list[str] = []
+
+    def list_changes(self, cursor=None):
+        if cursor is not None and cursor[0] != "q1":
+            raise Fault("Queue ID mismatch")
+        changes, self.changes = self.changes, []
+        return ("q1", "2"), changes if cursor is not None else []
+
+    def execute_sql(self, sql: str) -> list[dict]:
+        self.queries.append(sql)
+        if "d.pkid in ('c')" in sql:
+            return [r for r in self.rows if r["pkid"] == "c"]
+        return self.rows
+
+
+def test_full_then_incremental_sync(tmp_path):
+    ucm = FakeUCM()
+    inventory = Inventory(tmp_path / "inventory.sqlite3")
+    assert inventory.sync(ucm) == 2
+    assert inventory.by_dn("1001")[0].name == "SEP000000000001"
+
+    ucm.rows.append(phone_row("c", "SEP000000000003", "1003"))
+    ucm.changes = [Change("Phone", "c", "a"), Change("Phone", "b", "r")]
+    assert inventory.sync(ucm) == 1
+    assert inventory.by_name("SEP000000000003").dn == "1003"
+    assert inventory.by_name("SEP000000000002") is None
+
+
+def test_lookups_and_ips(tmp_path):
+    inventory = Inventory(tmp_path / "inventory.sqlite3")
+    inventory.sync(FakeUCM())
+    inventory.record_ip("SEP000000000001", "10.0.0.5")
+    inventory.record_ip("SEP0000000000FF", "10.0.0.6", "8845")
+
+    assert inventory.resolve_ip("SEP000000000001") == "10.0.0.5"
+    assert inventory.find("10.0.0.6")[0].model == "8845"
+    assert [r.name for r in inventory.find("front")] == ["SEP000000000001"]
+    assert inventory.find("sep000000000002")[0].dn == "1002"
+
+    # * a resync keeps IPs learned from connections
+    inventory.sync(FakeUCM(), full=True)
+    assert inventory.resolve_ip("SEP000000000001") == "10.0.0.5"
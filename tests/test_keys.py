@@ -0,0 +1,33 @@
+from ciscoreset.keys import KEY_TABLES, find_invalid_key, replace_key_shortcuts
+from ciscoreset.xml import InvalidKeyError, check_keys, verify_keys
+import pytest
+
+
+def test_key_table_expands_ranges():
+    table = KEY_TABLES["8841"]
+    assert "KeyPad0" in table.valid and "KeyPad9" in table.valid
+    assert "Line120" in table.valid and "Line121" not in table.valid
+    assert table.ranges["Soft"] == (1, 5)
+    assert table.buttons[0] == "Applications"
+
+
+def test_find_invalid_key():
+    assert find_invalid_key("8841", ["Key:NavBack", "KeyPad5", "Soft3"]) == ""
+    assert find_invalid_key("8841", ["NavBack", "KeyPad10", "Soft6"]) == "KeyPad10"
+    assert find_invalid_key("8831", ["Applications"]) == "Applications"
+
+
+def test_verify_and_check_keys():
+    assert verify_keys("8841", ["Applications"])
+    assert not verify_keys("9999", ["Applications"])
+    with pytest.raises(InvalidKeyError) as e:
+        check_keys("8841", ["Applications", "Soft9"])
+    assert e.value.key == "Soft9"
+
+
+def test_replace_key_shortcuts():
+    assert replace_key_shortcuts(["back", "5", "Soft3"], "8841") == [
+        "NavBack",
+        "KeyPad5",
+        "Soft3",
+    ]
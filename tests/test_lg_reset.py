@@ -0,0 +1,59 @@
+from ciscoreset.lg_reset import LineGroupResetRunner, ResetJournal
+
+
+class FakeUCM:
+    def __init__(self, fail=()) -> None:
+        self.lines = {"100": ["SEP1", "SEP2"], "101": ["SEP2", "SEP3"], "102": []}
+        self.fail = set(fail)
+        self.resets: list[str] = []
+
+    def get_dn_devices(self, dn: str, partition: str = None) -> list[str]:
+        if dn not in self.lines:
+            raise Exception(f"Could not look up {dn}")
+        return self.lines[dn]
+
+    def do_device_reset(self, name: str) -> dict:
+        if name in self.fail:
+            raise Exception("throttled")
+        self.resets.append(name)
+        return {"return": ""}
+
+
+GROUPS = {
+    "A": [("100", "Phones-PT"), ("102", "Phones-PT")],
+    "B": [("101", "Phones-PT")],
+}
+
+
+def test_devices_reset_once(tmp_path):
+    ucm = FakeUCM()
+    runner = LineGroupResetRunner(ucm, ResetJournal(tmp_path / "j.jsonl"), stagger=0)
+    results = runner.run(GROUPS)
+    assert sorted(ucm.resets) == ["SEP1", "SEP2", "SEP3"]
+    assert sum(r.skipped for r in results) == 1
+
+
+def test_resume_from_journal(tmp_path):
+    path = tmp_path / "j.jsonl"
+    ucm = FakeUCM(fail={"SEP3"})
+    LineGroupResetRunner(ucm, ResetJournal(path), stagger=0).run(GROUPS)
+    with path.open("a") as f:
+        f.write('{"group": "B", "dn"')  # torn write from a crash
+
+    journal = ResetJournal(path)
+    assert journal.done == {"SEP1", "SEP2"} and "SEP3" in journal.failed
+
+    ucm = FakeUCM()
+    LineGroupResetRunner(ucm, journal, stagger=0).run(GROUPS)
+    assert ucm.resets == ["SEP3"]
+    assert not ResetJournal(path).failed
+
+
+def test_failed_group_does_not_stop_the_others(tmp_path):
+    ucm = FakeUCM()
+    runner = LineGroupResetRunner(ucm, ResetJournal(tmp_path / "j.jsonl"), stagger=0)
+    results = runner.run({"Broken": [("100", ""), ("999", "")], **GROUPS})
+    by_group = {r.group: r for r in results}
+    assert by_group["Broken"].error == "Could not look up 999"
+    assert by_group["Broken"].reset == 2
+    assert by_group["B"].error == "" and sorted(ucm.resets) == ["SEP1", "SEP2", "SEP3"]
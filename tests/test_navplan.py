@@ -0,0 +1,50 @@
+from ciscoreset.navplan import NavPlans, PhonePlans
+from pathlib import Path
+
+
+def test_nav_plans_persist(tmp_path: Path):
+    plans = NavPlans(tmp_path / "plans.json")
+    plans.record("8841", "sip88xx.14-2-1", "large", {"Admin Settings": 8})
+    plans.record("8841", "sip88xx.14-2-1", "large", {"Reset Settings": 5})
+    plans.record("8841", "sip88xx.14-2-1", "tiny", {"Admin Settings": 8})
+    plans.save()
+
+    loaded = NavPlans(tmp_path / "plans.json")
+    assert loaded.get("8841", "sip88xx.14-2-1", "large") == {
+        "Admin Settings": 8,
+        "Reset Settings": 5,
+    }
+    assert sorted(loaded.fonts("8841", "sip88xx.14-2-1")) == ["large", "tiny"]
+    assert loaded.fonts("8841", "sip88xx.12-8-1") == []
+
+    loaded.forget("8841", "sip88xx.14-2-1", "tiny")
+    assert loaded.get("8841", "sip88xx.14-2-1", "tiny") == {}
+
+
+def test_bad_plans_file_is_ignored(tmp_path: Path):
+    (tmp_path / "plans.json").write_text("{not json")
+    assert NavPlans(tmp_path / "plans.json").get("8841", "x", "large") == {}
+
+
+def test_phone_plans_try_the_known_font_first(tmp_path: Path):
+    plans = NavPlans(tmp_path / "plans.json")
+    for font, pos in (("large", 3), ("tiny", 4)):
+        path = {"Admin Settings": 8, "Reset Settings": 5, "Network Setup": pos}
+        plans.record("8841", "sip88xx.14-2-1", font, path)
+
+    replay = PhonePlans(plans, "8841", "sip88xx.14-2-1", "tiny").replay("Network Setup")
+    assert replay.key == ("8841", "sip88xx.14-2-1", "tiny")
+    assert replay.keys[-2:] == ["KeyPad8", "KeyPad5"] and replay.position == 4
+    assert PhonePlans(plans, "8841", "other", "tiny").replay("Network Setup") is None
+
+    # * a guessed font that doesn't check out isn't this phone's to forget
+    guessing = PhonePlans(plans, "8841", "sip88xx.14-2-1", "")
+    assert not guessing.check(replay, "reset_settings", 3)
+    assert plans.fonts("8841", "sip88xx.14-2-1")
+    phone = PhonePlans(plans, "8841", "sip88xx.14-2-1", "tiny")
+    assert phone.check(replay, "reset_settings", 4)
+    assert not phone.check(replay, "main_menu", None)
+    assert plans.get(*replay.key) == {}
+
+    phone.record("Network Setup", {"Admin Settings": 8, "Network Setup": 2})
+    assert plans.get(*replay.key) == {"Admin Settings": 8, "Network Setup": 2}
@@ -0,0 +1,36 @@
+from ciscoreset.inventory import get_inventory
+from ciscoreset.phone_async import AsyncPhoneConnection
+from ciscoreset.simulator import SimulatedCUCM, SimulatedPhone
+import asyncio
+import pytest
+
+
+async def reset(sim: SimulatedPhone, reset_type: str, dry_run=False) -> None:
+    async with AsyncPhoneConnection(
+        sim.ip,
+        "",
+        username="u",
+        password="p",
+        phone_port=sim.port,
+        ucm=SimulatedCUCM([sim]),
+    ) as phone:
+        assert phone.device_name == sim.name
+        await phone.send_reset(reset_type, dry_run=dry_run)
+
+
+@pytest.mark.parametrize("reset_type", ["network", "security"])
+def test_async_reset_against_simulator(reset_type: str):
+    with SimulatedPhone(reboot=0.5, redraw=0.3) as sim:
+        asyncio.run(reset(sim, reset_type))
+    assert sim.state.resets == [f"{reset_type}_settings"]
+    # * the confirm dialog is waited for before its soft key goes
+    confirm = sim.history.index("Soft3")
+    assert sim.history[confirm - 1] == "Screenshot"
+
+
+def test_async_dry_run_leaves_phone_alone():
+    with SimulatedPhone(reboot=0.5) as sim:
+        asyncio.run(reset(sim, "device", dry_run=True))
+    assert sim.state.resets == []
+    assert sim.state.screen == "home"
+    assert get_inventory().resolve_ip(sim.name) == sim.ip
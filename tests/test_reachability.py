@@ -0,0 +1,59 @@
+from ciscoreset.reachability import ReachabilityMonitor, async_wait_for, tcp_probe
+from ciscoreset.simulator import SimulatedPhone
+from ciscoreset.xml import XMLPhone
+import asyncio
+import socket
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def reboot(sim: SimulatedPhone) -> None:
+    with XMLPhone(sim.ip, "u", "p", sim.model, port=sim.port) as xml:
+        xml.send_keys(["Applications", "KeyPad8", "KeyPad5", "KeyPad2", "Soft3"])
+
+
+def test_tcp_probe():
+    with SimulatedPhone() as sim:
+        assert tcp_probe(sim.ip, sim.port)
+    assert not tcp_probe("127.0.0.1", free_port())
+
+
+def test_watch_times_out():
+    monitor = ReachabilityMonitor(first_interval=0.05)
+    event = monitor.watch("127.0.0.1", free_port(), "up", timeout=0.5).result()
+    assert event.kind == "timeout"
+    assert event.seconds >= 0.5
+
+
+def test_wait_for_reboot():
+    monitor = ReachabilityMonitor(first_interval=0.05, max_interval=0.2)
+    downs = []
+    with SimulatedPhone(reboot=1.0) as sim:
+        port = sim.port
+        reboot(sim)
+        assert monitor.wait_for_reboot(sim.ip, port, 5, 5, on_down=downs.append)
+        assert sim.state.resets == ["reset_device"]
+        assert tcp_probe(sim.ip, port)
+    assert [e.kind for e in downs] == ["down"]
+
+
+def test_failing_on_down_still_waits_for_up():
+    monitor = ReachabilityMonitor(first_interval=0.05, max_interval=0.2)
+
+    def on_down(event) -> None:
+        raise RuntimeError("callback failed")
+
+    with SimulatedPhone(reboot=1.0) as sim:
+        reboot(sim)
+        future = monitor.watch_reboot(sim.ip, sim.port, 5, 5, on_down=on_down)
+        assert future.result(timeout=10).kind == "up"
+
+
+def test_async_wait_for():
+    with SimulatedPhone() as sim:
+        event = asyncio.run(async_wait_for(sim.ip, sim.port, "up", timeout=2))
+    assert event.kind == "up"
@@ -0,0 +1,58 @@
+from ciscoreset.settle import SettleTimes, wait_for_settle, DEFAULT_SETTLE_LIMIT
+from pathlib import Path
+from time import monotonic
+
+
+def frames_from(*frames: bytes):
+    queue = list(frames)
+
+    def fetch() -> bytes:
+        return queue.pop(0) if len(queue) > 1 else queue[0]
+
+    return fetch
+
+
+def changing_frames():
+    count = iter(range(1000))
+    return lambda: str(next(count)).encode()
+
+
+def test_settle_returns_first_stable_frame(tmp_path: Path):
+    times = SettleTimes(tmp_path / "settle.json")
+    fetch = frames_from(b"old", b"drawing", b"new", b"new")
+    assert wait_for_settle(fetch, "8841", previous=b"old", settle_times=times) == b"new"
+
+
+def test_settle_ignores_unchanged_screen(tmp_path: Path):
+    times = SettleTimes(tmp_path / "settle.json")
+    for _ in range(5):
+        times.record("8841", 0.1)
+    fetch = frames_from(b"old")
+    assert wait_for_settle(fetch, "8841", previous=b"old", settle_times=times) == b"old"
+
+
+def test_settle_limit_is_learned(tmp_path: Path):
+    times = SettleTimes(tmp_path / "settle.json")
+    assert times.limit("8841") == DEFAULT_SETTLE_LIMIT
+    for _ in range(10):
+        times.record("8841", 0.4)
+    assert times.limit("8841") < DEFAULT_SETTLE_LIMIT
+    times.save()
+    assert SettleTimes(tmp_path / "settle.json").limit("8841") == times.limit("8841")
+
+
+def test_settle_timeout_raises_limit(tmp_path: Path):
+    times = SettleTimes(tmp_path / "settle.json")
+    for _ in range(5):
+        times.record("8841", 0.1)
+    low = times.limit("8841")
+    for _ in range(2):
+        wait_for_settle(changing_frames(), "8841", settle_times=times)
+    assert times.limit("8841") > low
+
+
+def test_settle_unchanged_screen_stops_early(tmp_path: Path):
+    times = SettleTimes(tmp_path / "settle.json")
+    start = monotonic()
+    assert wait_for_settle(frames_from(b"old"), "8841", b"old", times) == b"old"
+    assert monotonic() - start < DEFAULT_SETTLE_LIMIT / 2
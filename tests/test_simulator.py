@@ -0,0 +1,96 @@
+from ciscoreset.phone import PhoneConnection
+from ciscoreset.navplan import NavPlans
+from ciscoreset.simulator import SimulatedCUCM, SimulatedPhone, simulated_fleet
+from ciscoreset.xml import XMLPhone, CGIError, raise_for_items
+from pathlib import Path
+import pytest
+
+
+@pytest.fixture
+def sim():
+    with SimulatedPhone(reboot=0.5) as phone:
+        yield phone
+
+
+def test_send_keys_reports_items(sim: SimulatedPhone):
+    with XMLPhone(sim.ip, "u", "p", sim.model, port=sim.port) as xml:
+        items = xml.send_keys(["NavBack", "Applications"])
+        assert [i.status for i in items] == ["0", "0"]
+        assert sim.state.screen == "applications"
+        assert xml.get_screenshot().shape == (480, 800, 3)
+
+
+def test_cgi_error_items(sim: SimulatedPhone):
+    with XMLPhone(sim.ip, "u", "p", sim.model, port=sim.port) as xml:
+        items = xml._send_xml(["Key:NotAKey"])
+        assert items[0].status != "0"
+        with pytest.raises(CGIError):
+            raise_for_items(items)
+
+
+@pytest.mark.parametrize("reset_type", ["network", "security"])
+def test_reset_against_simulator(sim: SimulatedPhone, reset_type: str):
+    ucm = SimulatedCUCM([sim])
+    with PhoneConnection(
+        sim.ip, "", username="u", password="p", phone_port=sim.port, ucm=ucm
+    ) as phone:
+        assert phone.device_name == sim.name
+        phone.send_reset(reset_type)
+    assert sim.state.resets == [f"{reset_type}_settings"]
+    assert ucm.admin_devices == []
+
+
+def test_reset_starts_from_current_screen(sim: SimulatedPhone):
+    sim.state.screen, sim.state.selected = "confirm", "reset_device"
+    ucm = SimulatedCUCM([sim])
+    with PhoneConnection(
+        sim.ip,
+        "",
+        username="u",
+        password="p",
+        phone_port=sim.port,
+        ucm=ucm,
+        blind=False,
+    ) as phone:
+        phone.send_reset("network")
+    assert sim.state.resets == ["network_settings"]
+    assert sim.state.keys == ["NavBack", "KeyPad3", "Soft3"]
+
+
+def test_nav_plan_replayed_on_identical_phone(tmp_path: Path):
+    plans = NavPlans(tmp_path / "plans.json")
+    first, second, stale = simulated_fleet(3, reboot=0.5, font="large")
+    for sim in (first, second, stale):
+        sim.start()
+    try:
+        for sim in (first, second):
+            ucm = SimulatedCUCM([sim])
+            with PhoneConnection(
+                sim.ip, "", username="u", password="p", phone_port=sim.port, ucm=ucm
+            ) as phone:
+                phone.nav_plans = plans
+                phone.send_reset("network")
+            assert sim.state.resets == ["network_settings"]
+        assert first.state.keys[:6] == ["NavBack"] * 6
+        assert second.state.keys == ["NavBack"] * 6 + [
+            "Applications",
+            "KeyPad8",
+            "KeyPad5",
+            "KeyPad3",
+            "Soft3",
+        ]
+
+        # * a plan that no longer fits is dropped and vision takes over
+        key = (stale.model, stale.firmware, "large")
+        plans.record(*key, {"Reset Settings": 2})
+        ucm = SimulatedCUCM([stale])
+        with PhoneConnection(
+            stale.ip, "", username="u", password="p", phone_port=stale.port, ucm=ucm
+        ) as phone:
+            phone.nav_plans = plans
+            phone.send_reset("network")
+        assert stale.state.resets == ["network_settings"]
+        assert plans.get(*key)["Reset Settings"] == 5
+    finally:
+        for sim in (first, second, stale):
+            sim.stop()
@@ -0,0 +1,72 @@
+from ciscoreset.axl import DNIndex, PhoneSummary
+from ciscoreset.targets import TargetSelector, TargetSelectorError
+import pytest
+
+
+class FakeUCM:
+    def __init__(self) -> None:
+        self.index = DNIndex(("Phones-PT", "Staging-PT"))
+        self.index.add("5001", "Phones-PT", "SEPA")
+        self.index.add("5002", "Phones-PT", "SEPB")
+        self.index.add("5002", "Staging-PT", "SEPC")
+        self.index.add("6001", "Phones-PT", "SEPD")
+        self.index.add("7001", "", "SEPN")  # * the null partition isn't indexed
+        self.line_group_loads = 0
+        self.dn_lookups = 0
+
+    def get_dn_index(self) -> DNIndex:
+        return self.index
+
+    def get_dn_devices(self, dn: str, partition: str = None) -> list[str]:
+        self.dn_lookups += 1
+        if partition is None:
+            partition = self.index.partitions_of(dn)[0]
+        return self.index.devices(dn, partition)
+
+    def get_all_line_group_members(self) -> dict:
+        self.line_group_loads += 1
+        return {
+            "LG1": [("5001", "Phones-PT"), ("6001", "Phones-PT")],
+            "LG2": [],
+            "LG3": [("5002", "Staging-PT"), ("7001", "")],
+        }
+
+    def get_user_devices(self, userid: str) -> list[str]:
+        return ["SEPD", "SEPE"]
+
+    def iter_phones(self, name="%", device_pool="", **kwargs):
+        for n in ("SEPA", "SEPB", "SEPC"):
+            yield PhoneSummary(n, "8841", "", "Main-DP")
+
+
+def test_dn_wildcards_and_partitions():
+    selector = TargetSelector(FakeUCM())
+    assert selector.select("dn:500X") == ["SEPA", "SEPB", "SEPC"]
+    assert selector.select("dn:5xxx@Staging-PT") == ["SEPC"]
+    assert selector.select("dn:7001@") == ["SEPN"]
+    assert selector.select("dn:7001") == []
+
+
+def test_union_exclusion_and_dedupe():
+    ucm = FakeUCM()
+    selector = TargetSelector(ucm)
+    assert selector.select("lg:LG1, user:jdoe") == ["SEPA", "SEPD", "SEPE"]
+    assert selector.select("pool:Main-DP !lg:LG1 lg:LG2") == ["SEPB", "SEPC"]
+    assert ucm.line_group_loads == 1
+    assert ucm.dn_lookups == 0  # * indexed members come out of the DN index
+
+
+def test_line_group_member_outside_the_index():
+    ucm = FakeUCM()
+    assert TargetSelector(ucm).select("lg:LG3") == ["SEPC", "SEPN"]
+    assert ucm.dn_lookups == 1
+
+
+def test_bad_terms():
+    selector = TargetSelector(FakeUCM())
+    with pytest.raises(TargetSelectorError):
+        selector.select("SEPA")
+    with pytest.raises(TargetSelectorError):
+        selector.select("mac:0011")
+    with pytest.raises(TargetSelectorError):
+        selector.select("lg:Nope")
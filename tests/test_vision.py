@@ -0,0 +1,118 @@
+from ciscoreset.simulator import (
+    APPLICATION_ICONS,
+    FONT_SIZES,
+    SCREEN_LISTS,
+    PhoneState,
+)
+from ciscoreset.vision import (
+    FontMemory,
+    classify_screen,
+    get_list_position,
+    get_menu_position,
+    get_template_bank,
+)
+from pathlib import Path
+import numpy as np
+import pytest
+import cv2
+
+
+def shifted(screen: np.ndarray, dx: int, dy: int) -> np.ndarray:
+    m = np.float32([[1, 0, dx], [0, 1, dy]])
+    size = (screen.shape[1], screen.shape[0])
+    return cv2.warpAffine(screen, m, size, borderMode=cv2.BORDER_REPLICATE)
+
+
+def test_template_bank_shared_per_image_set():
+    bank = get_template_bank("8841")
+    assert get_template_bank("8865") is bank
+    assert bank.icon("Admin Settings") is bank.icons["admin_settings"]
+    assert set(bank.label("Reset Settings")) == set(FONT_SIZES)
+
+
+def test_menu_positions():
+    state = PhoneState("SEP000000000001", "8841", "regular")
+    state.press("Applications")
+    screen = state.render()
+    for pos, icon in enumerate(APPLICATION_ICONS, start=1):
+        assert get_menu_position(icon, "8841", screen) == pos
+        assert get_menu_position(icon, "8841", screen, exhaustive=True) == pos
+
+
+@pytest.mark.parametrize("font", FONT_SIZES)
+def test_list_positions(font: str):
+    state = PhoneState("SEP000000000001", "8841", font)
+    state.screen = "reset_settings"
+    screen = state.render()
+    for pos, item in enumerate(SCREEN_LISTS["reset_settings"], start=1):
+        assert get_list_position(item, "8841", screen) == pos
+        assert get_list_position(item, "8841", screen, exhaustive=True) == pos
+    with pytest.raises(Exception):
+        get_list_position("not_an_item", "8841", screen)
+
+
+@pytest.mark.parametrize("font", FONT_SIZES)
+@pytest.mark.parametrize("dx, dy", [(3, 5), (-5, -3)])
+def test_list_positions_on_offset_screen(font: str, dx: int, dy: int):
+    # * odd offsets land between the pixels of the half-size coarse pass
+    state = PhoneState("SEP000000000001", "8841", font)
+    state.screen = "reset_settings"
+    screen = shifted(state.render(), dx, dy)
+    for pos, item in enumerate(SCREEN_LISTS["reset_settings"], start=1):
+        assert get_list_position(item, "8841", screen) == pos
+
+
+def test_scaled_screen_is_not_misread():
+    state = PhoneState("SEP000000000001", "8841", "regular")
+    state.screen = "reset_settings"
+    screen = cv2.resize(state.render(), None, fx=0.97, fy=0.97)
+    # * templates are pixel-exact, so a scaled screen is unknown, never misread
+    assert classify_screen("8841", screen) == "unknown"
+
+
+def test_font_memory_tries_remembered_font_first(tmp_path: Path):
+    fonts = FontMemory(tmp_path / "fonts.json")
+    state = PhoneState("SEP000000000001", "8841", "large")
+    state.screen = "reset_settings"
+    screen = state.render()
+
+    position = get_list_position(
+        "reset_device", "8841", screen, device="sep000000000001", fonts=fonts
+    )
+    assert position == 2
+    assert fonts.get("SEP000000000001") == "large"
+    fonts.save()
+    assert FontMemory(tmp_path / "fonts.json").get("SEP000000000001") == "large"
+
+    # * a stale memory costs a full sweep, then gets corrected
+    fonts.remember("SEP000000000001", "tiny")
+    position = get_list_position(
+        "reset_device", "8841", screen, device="SEP000000000001", fonts=fonts
+    )
+    assert position == 2
+    assert fonts.get("SEP000000000001") == "large"
+
+
+@pytest.mark.parametrize(
+    "screen, state",
+    [
+        ("home", "unknown"),
+        ("applications", "applications"),
+        ("admin_settings", "admin_settings"),
+        ("reset_settings", "reset_settings"),
+        ("confirm", "confirm"),
+    ],
+)
+def test_classify_screen(screen: str, state: str):
+    phone = PhoneState("SEP000000000001", "8841", "small")
+    phone.screen, phone.selected = screen, "reset_device"
+    assert classify_screen("8841", phone.render()) == state
+
+
+def test_bright_box_alone_is_not_a_dialog():
+    # * a light wallpaper or another app's popup mustn't be taken for the
+    # * reset dialog, backing out of it would undo navigation
+    phone = PhoneState("SEP000000000001", "8841", "regular")
+    screen = phone.render() // 2
+    cv2.rectangle(screen, (150, 140), (650, 340), (250, 250, 250), -1)
+    assert classify_screen("8841", screen) == "unknown"
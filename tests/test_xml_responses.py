@@ -0,0 +1,24 @@
+from ciscoreset.xml import (
+    CGIError,
+    batch_keys,
+    parse_execute_response,
+    raise_for_items,
+    response_items,
+)
+import pytest
+
+
+def test_batch_keys():
+    assert batch_keys(["NavBack"] * 4) == [["Key:NavBack"] * 3, ["Key:NavBack"]]
+
+
+def test_response_items():
+    body = (
+        b'<CiscoIPPhoneResponse><ResponseItem URL="Key:Soft3" Data="" Status="0"/>'
+        b'<ResponseItem URL="Key:Soft9" Data="Bad key" Status="6"/></CiscoIPPhoneResponse>'
+    )
+    items = response_items(parse_execute_response("text/xml", body))
+    assert [i.status for i in items] == ["0", "6"]
+    with pytest.raises(CGIError) as e:
+        raise_for_items(items)
+    assert e.value.item.url == "Key:Soft9"